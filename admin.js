@@ -1,19 +1,24 @@
 // admin.js: 검색, 상세보기 및 부스 남은 횟수 증가
 
-async function search(query) {
+async function search(query, cursor) {
   const q = encodeURIComponent(query);
-  const res = await fetch(`/api/students?search=${q}`);
+  // 검색어가 없으면 전체 목록을 페이지 단위로 조회 (next_cursor로 다음 페이지)
+  const url = cursor ? `/api/students?cursor=${encodeURIComponent(cursor)}` : `/api/students?search=${q}`;
+  const res = await fetch(url);
   const j = await res.json();
   return j;
 }
 
-function renderResults(data) {
+function renderResults(data, append) {
   const t = document.getElementById('results');
-  t.innerHTML = '';
-  if (!data.success || data.data.length === 0) {
+  const oldMore = document.getElementById('moreBtn');
+  if (oldMore) oldMore.remove();
+  if (!append) t.innerHTML = '';
+  if (!append && (!data.success || data.data.length === 0)) {
     t.innerHTML = '<div style="color:var(--muted)">검색 결과가 없습니다.</div>';
     return;
   }
+  if (!data.success) return;
   const list = document.createElement('div');
   data.data.forEach(s => {
     const hasGold = (s.booths || []).some(b => b.isGolden);
@@ -32,12 +37,25 @@ function renderResults(data) {
   });
   t.appendChild(list);
 
-  document.querySelectorAll('.viewBtn').forEach(b=>{
+  list.querySelectorAll('.viewBtn').forEach(b=>{
     b.addEventListener('click', async (e)=>{
       const id = e.target.dataset.id;
       await loadDetail(id);
     });
   });
+
+  // 전체 목록의 다음 페이지
+  if (data.next_cursor) {
+    const more = document.createElement('button');
+    more.id = 'moreBtn';
+    more.className = 'btn-secondary';
+    more.textContent = '더 보기';
+    more.addEventListener('click', async ()=>{
+      const r = await search('', data.next_cursor);
+      renderResults(r, true);
+    });
+    t.appendChild(more);
+  }
 }
 
 async function loadDetail(id) {
@@ -76,8 +94,10 @@ async function loadDetail(id) {
       <button id="payBtn" style="padding:8px 12px;border-radius:8px;background:#00ffd1;border:none;color:#001324;font-weight:700;">결제 추가</button>
       <button id="deleteBtn" style="padding:8px 12px;border-radius:8px;background:#ff6b6b;border:none;color:#001324;font-weight:700;">삭제</button>
     </div>
+    <div id="ledger" style="margin-top:12px;"></div>
   </div>`;
   d.innerHTML = html;
+  loadLedger(s.id);
 
   // 결제 추가 버튼
   const payBtn = document.getElementById('payBtn');
@@ -87,7 +107,7 @@ async function loadDetail(id) {
       const amt = parseInt(val);
       if (isNaN(amt) || amt <= 0) { alert('올바른 금액을 입력하세요'); return; }
       try {
-        const res = await fetch(`/api/students/${s.id}/add-payment`, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ amount: amt }) });
+        const res = await postJsonWithRetry(`/api/students/${s.id}/add-payment`, { amount: amt });
         const j = await res.json();
         if (!j.success) { alert('결제 추가에 실패했습니다: '+ (j.message || '오류')); return; }
         await loadDetail(s.id);
@@ -132,18 +152,119 @@ async function loadDetail(id) {
   });
 }
 
-async function adjust(id, booth_number, delta) {
+// 원장 이력 (최근 것부터)
+const LEDGER_KINDS = { order: '등록', redeem: '사용', adjust: '조정', payment: '결제', opening: '기존 잔액', opening_used: '기존 사용', merge: '중복 병합', merge_used: '중복 병합 사용', delete: '삭제' };
+async function loadLedger(id) {
+  const el = document.getElementById('ledger');
   try {
-    const res = await fetch(`/api/students/${id}/adjust`, {
-      method: 'POST',
-      headers: { 'Content-Type':'application/json' },
-      body: JSON.stringify({ booth_number, delta })
+    const res = await fetch(`/api/students/${id}/ledger`);
+    const j = await res.json();
+    if (!j.success) { el.innerHTML = ''; return; }
+    let html = `<h4>이력${j.consistent ? '' : ' <span style="color:#ff7a7a">(잔액 불일치)</span>'}</h4><div class="stats-panel"><table>
+      <tr><th>시각</th><th>구분</th><th>부스</th><th>횟수</th><th>금액</th><th>처리</th></tr>`;
+    j.data.slice(-30).reverse().forEach(e => {
+      const t = new Date(e.created_at * 1000).toLocaleString();
+      html += `<tr><td>${t}</td><td>${LEDGER_KINDS[e.kind] || e.kind}</td><td>${e.booth_number ?? ''}</td>
+        <td>${e.delta || ''}</td><td>${e.amount ? formatNumber(e.amount) : ''}</td><td>${e.actor || ''}</td></tr>`;
     });
+    el.innerHTML = html + '</table></div>';
+  } catch (err) { console.error(err); el.innerHTML = ''; }
+}
+
+async function adjust(id, booth_number, delta) {
+  try {
+    const res = await postJsonWithRetry(`/api/students/${id}/adjust`, { booth_number, delta });
     const j = await res.json();
     if (!j.success) alert('업데이트 실패: '+ (j.message || '오류'));
+    else loadStats();
   } catch (err) { console.error(err); alert('요청 중 오류'); }
 }
 
+// 대시보드 집계: 총매출, 학생 수, 부스별 발급/사용/남은 횟수, 가장 최근 분의 신규 등록 수
+function formatNumber(n) { return (n || 0).toString().replace(/\B(?=(\d{3})+(?!\d))/g, ','); }
+
+async function loadStats() {
+  const el = document.getElementById('stats');
+  try {
+    const res = await fetch('/api/stats');
+    const j = await res.json();
+    if (!j.success) { el.style.display = 'none'; return; }
+    const s = j.data;
+    const last = s.signups_per_minute[s.signups_per_minute.length - 1];
+    const rows = s.booths.map(b => `
+      <tr><td>부스 ${b.number}</td><td>${formatNumber(b.holders)}</td><td>${formatNumber(b.issued)}</td>
+      <td>${formatNumber(b.redeemed)}</td><td>${formatNumber(b.remaining)}</td><td>${b.golden}</td><td>${b.derived}</td></tr>`).join('');
+    el.innerHTML = `
+      <div class="stats-totals">
+        <span>총매출 ${formatNumber(s.revenue)}원</span><span>학생 ${formatNumber(s.students)}명</span>
+        ${last ? `<span style="color:var(--muted)">신규 등록 ${last.minute} · ${last.count}명/분</span>` : ''}
+      </div>
+      <table>
+        <tr><th>부스</th><th>보유 학생</th><th>발급</th><th>사용</th><th>남음</th><th>골든</th><th>파생</th></tr>
+        ${rows}
+      </table>`;
+  } catch (err) { console.error(err); }
+}
+
+// QR 이용권 사용: 바코드 스캐너(키보드 입력 + Enter) 또는 카메라(BarcodeDetector 지원 브라우저)로 읽은 토큰을 차감
+const scanBooth = document.getElementById('scanBooth');
+const scanToken = document.getElementById('scanToken');
+scanBooth.value = localStorage.getItem('scanBooth') || '';
+scanBooth.addEventListener('change', () => localStorage.setItem('scanBooth', scanBooth.value));
+
+async function redeemToken(token) {
+  const el = document.getElementById('scanResult');
+  const booth_number = Number(scanBooth.value);
+  if (!booth_number) { el.className = 'scan-result error'; el.textContent = '부스 번호를 먼저 입력하세요.'; return; }
+  try {
+    const res = await postJsonWithRetry('/api/redeem', { token, booth_number });
+    const j = await res.json();
+    if (!j.success) { el.className = 'scan-result error'; el.textContent = j.message || '사용 실패'; return; }
+    el.className = 'scan-result ok';
+    el.textContent = `${j.data.name} (${j.data.student_number}) · 부스 ${j.data.booth_number} 남은 횟수 ${j.data.remaining}회`;
+    loadStats();
+  } catch (err) { console.error(err); el.className = 'scan-result error'; el.textContent = '요청 중 오류'; }
+}
+
+scanToken.addEventListener('keydown', (e) => {
+  if (e.key !== 'Enter' || !scanToken.value.trim()) return;
+  redeemToken(scanToken.value.trim());
+  scanToken.value = '';
+});
+
+if ('BarcodeDetector' in window && navigator.mediaDevices) {
+  const cameraBtn = document.getElementById('scanCamera');
+  cameraBtn.style.display = '';
+  cameraBtn.addEventListener('click', async () => {
+    const video = document.getElementById('scanVideo');
+    if (video.srcObject) {
+      video.srcObject.getTracks().forEach(t => t.stop());
+      video.srcObject = null; video.style.display = 'none';
+      return;
+    }
+    try {
+      video.srcObject = await navigator.mediaDevices.getUserMedia({ video: { facingMode: 'environment' } });
+    } catch (err) { console.error(err); alert('카메라를 사용할 수 없습니다.'); return; }
+    video.style.display = 'block';
+    await video.play();
+    const detector = new BarcodeDetector({ formats: ['qr_code'] });
+    let last = '', lastAt = 0;
+    const tick = async () => {
+      if (!video.srcObject) return;
+      try {
+        const codes = await detector.detect(video);
+        // 같은 QR이 계속 비치는 동안 다시 보내지 않음 (어차피 서버가 옛 버전으로 거절)
+        if (codes.length && (codes[0].rawValue !== last || Date.now() - lastAt > 3000)) {
+          last = codes[0].rawValue; lastAt = Date.now();
+          await redeemToken(last);
+        }
+      } catch (err) { console.error(err); }
+      setTimeout(tick, 300);
+    };
+    tick();
+  });
+}
+
 document.getElementById('adminSearch').addEventListener('click', async ()=>{
   const q = document.getElementById('adminQuery').value.trim();
   const r = await search(q);
@@ -152,6 +273,7 @@ document.getElementById('adminSearch').addEventListener('click', async ()=>{
 
 // 초기 로드: 전체 일부 로딩 (최신 20개)
 (async ()=>{
+  loadStats();
   const r = await search('');
   renderResults(r);
 })();
\ No newline at end of file
@@ -0,0 +1,26 @@
+// api.js: 키오스크(index.html)와 관리자 화면(admin.html)이 함께 쓰는 쓰기 요청 도우미
+
+// 요청마다 Idempotency-Key를 붙여 전송하고, 네트워크 오류/5xx/처리 중(409+Retry-After)/요청 과다(429)면 같은 키로 재시도
+// (서버가 같은 키의 첫 응답을 돌려주므로 재시도해도 중복 저장/결제되지 않음)
+function newIdempotencyKey() {
+  if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+  return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+}
+
+async function postJsonWithRetry(url, body, retries = 2) {
+  const key = newIdempotencyKey();
+  let lastRes = null, lastErr = null;
+  for (let attempt = 0; attempt <= retries; attempt++) {
+    let retryAfter = 0;
+    try {
+      lastRes = await fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json', 'Idempotency-Key': key }, body: JSON.stringify(body) });
+      retryAfter = Number(lastRes.headers.get('Retry-After')) || 0;
+      const busy = (lastRes.status === 409 || lastRes.status === 429) && retryAfter;
+      if (lastRes.status < 500 && !busy) return lastRes;
+    } catch (err) { lastErr = err; }
+    // 서버가 Retry-After를 주면 따르되 키오스크가 너무 오래 멈추지 않도록 5초까지만 기다림
+    if (attempt < retries) await new Promise(r => setTimeout(r, Math.max(500 * (attempt + 1), Math.min(retryAfter, 5) * 1000)));
+  }
+  if (lastRes) return lastRes;
+  throw lastErr;
+}
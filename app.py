@@ -1,9 +1,64 @@
-from flask import Flask, request, jsonify, send_from_directory
-from flask_cors import CORS
-import sqlite3
+import time
+_startup_started = time.perf_counter()   # 워커 시작 시간 측정 (모듈 끝에서 보고)
+
+import base64
+import contextlib
+import csv
+import functools
+import gzip
+import hashlib
+import io
+import json
+import math
+import mimetypes
 import os
+import queue
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
 from datetime import datetime
 
+from flask import Flask, Response, abort, g, request, jsonify, send_from_directory, stream_with_context
+from flask import json as flask_json
+from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None    # Windows 개발 서버: 파일 잠금 없이 단일 프로세스로 가정
+try:
+    import brotli
+except ImportError:
+    brotli = None   # 없으면 정적 파일은 gzip만
+
+import booth_db
+from booth_catalog import BOOTH_CATALOG_PATH, OrderError, booth_catalog, expand_catalog_order, load_booth_catalog
+from booth_db import (DATABASE_READ_URL, DB_PATH, SQLITE_MODE, _pools, adapt_sql, dict_cursor, execute_many,
+                      get_conn, get_pool, int_or_none, pool_key, select_in)
+from booth_ledger import (LEDGER_ISSUE_KINDS, LEDGER_LIMIT_DEFAULT, LEDGER_LIMIT_MAX, current_actor, init_ledger,
+                          ledger_row_to_dict, order_ledger_events, record_ledger, replay_ledger)
+from booth_metrics import TimedJSONProvider, metrics, render_metrics, request_metrics
+from booth_qr import parse_qr_token, qr_token, sign_qr_token
+from booth_stats import init_stats, read_stats, rebuild_stats, shard_stats
+from booth_tickets import init_ticket_events, invalidate_ticket_by_id, publish_ticket_changes, ticket_cache
+
+# 켜고 끄는 기능: 꺼진 기능의 모듈은 import하지 않습니다 (워커 시작 시간과 메모리에서 빠짐)
+WRITE_BEHIND = os.getenv('WRITE_BEHIND', 'False').lower() in ('1', 'true', 'yes')
+ADMISSION_CONTROL = os.getenv('ADMISSION_CONTROL', 'True').lower() in ('1', 'true', 'yes')
+RATE_LIMIT = os.getenv('RATE_LIMIT', 'True').lower() in ('1', 'true', 'yes')
+PROFILER = os.getenv('PROFILER', 'True').lower() in ('1', 'true', 'yes')
+if DATABASE_READ_URL:
+    from booth_replica import READ_PIN_COOKIE, READ_YOUR_WRITES_SECONDS, ReadReplica
+if WRITE_BEHIND:
+    from booth_journal import WriteBehindJournal
+if ADMISSION_CONTROL or RATE_LIMIT:
+    from booth_admission import ADMISSION_CLASSES, ADMISSION_MAX_INFLIGHT, ADMISSION_ROUTES, AdmissionController
+if PROFILER:
+    from booth_profiler import RequestProfiler
+
 app = Flask(__name__)
 # Configure CORS: allow all by default (dev), or restrict via ALLOWED_ORIGINS env var (comma-separated)
 allowed = os.getenv('ALLOWED_ORIGINS')
@@ -12,31 +67,830 @@ if allowed:
     CORS(app, resources={r"/api/*": {"origins": origins}})
 else:
     CORS(app)  # CORS 허용 (development)
+if TimedJSONProvider is not None:
+    app.json_provider_class = TimedJSONProvider
+    app.json = TimedJSONProvider(app)
+
+
+# --- 메트릭 ---
+# 레지스트리와 /metrics 합산은 booth_metrics.py. 여기서는 요청 훅과 워커별 상태 값(게이지)을 채웁니다.
+def worker_gauges():
+    """워커별 현재 상태 값 (합산해서 보여줌): 커넥션 풀, SSE, 수락 제어, 티켓 캐시, 쓰기 지연 저널."""
+    gauges = []
+    pool = _pools.get(pool_key())
+    if pool is not None:
+        snap = pool.snapshot()
+        for state in ('in_use', 'idle'):
+            gauges.append(['booth_db_pool_connections', [['state', state]], snap[state]])
+        gauges.append(['booth_db_pool_timeouts_total', [], snap['timeouts']])
+    if read_replica is not None:
+        replica = read_replica.snapshot()
+        if replica['lag_seconds'] is not None:
+            gauges.append(['booth_db_replica_lag_seconds', [], replica['lag_seconds']])
+        for item in replica['reads']:
+            gauges.append(['booth_db_reads_total', [['target', item['target']], ['reason', item['reason']]], item['count']])
+    sse = ticket_broker.snapshot()
+    gauges.append(['booth_sse_connections', [], sse['connections']])
+    gauges.append(['booth_sse_rejected_total', [], sse['rejected']])
+    if admission is not None:
+        adm = admission.snapshot()
+        for cls, count in adm['inflight'].items():
+            gauges.append(['booth_admission_inflight', [['class', cls]], count])
+        for item in adm['shed']:
+            gauges.append(['booth_admission_shed_total', [['class', item['class']], ['reason', item['reason']]], item['count']])
+    if profiler is not None:
+        gauges.append(['booth_profiler_captures_total', [], profiler.captured])
+    cache = ticket_cache.snapshot()
+    for name in ('hits', 'misses', 'invalidations', 'errors'):
+        gauges.append([f'booth_ticket_cache_{name}_total', [], cache[name]])
+    if write_behind is not None:
+        wb = write_behind.status()
+        gauges.append(['booth_write_behind_enqueued_total', [], wb['enqueued']])
+        if wb['drainer']:
+            # 저널은 서버 전체가 공유하므로 반영 담당 워커만 보고 (합산 시 중복 방지)
+            gauges.append(['booth_write_behind_depth', [], wb['depth']])
+            gauges.append(['booth_write_behind_lag_seconds', [], wb['lag_seconds']])
+            gauges.append(['booth_write_behind_applied_total', [], wb['applied']])
+            gauges.append(['booth_write_behind_errors_total', [], wb['errors']])
+    return gauges
+
+
+metrics.gauges = worker_gauges
+
+
+@app.before_request
+def start_request_timer():
+    if request.path.startswith('/api/'):
+        g._request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('_request_started', None)
+    if started is None:
+        return response
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    status = str(response.status_code)
+    metrics.inc('booth_http_requests_total', (('endpoint', endpoint), ('method', request.method), ('status', status)))
+    metrics.observe('booth_http_request_duration_seconds', (('endpoint', endpoint), ('status', status)), time.perf_counter() - started)
+    m = request_metrics()
+    labels = (('endpoint', endpoint),)
+    metrics.observe('booth_request_db_seconds', labels, m['db'])
+    metrics.observe('booth_request_serialize_seconds', labels, m['serialize'])
+    metrics.observe('booth_request_rows', labels, m['rows'])
+    metrics.inc('booth_db_rows_total', labels, m['rows'])
+    metrics.flush()
+    return response
+
+
+# --- DB 연결 ---
+# 커넥션 풀과 쿼리 헬퍼는 booth_db.py
+@app.teardown_appcontext
+def release_db_conns(exc):
+    # 예외 등으로 close()되지 않은 연결을 풀에 반납
+    for conn in g.pop('_db_conns', []):
+        conn.close()
+
+
+# 읽기 복제본 라우팅 (DATABASE_READ_URL이 있을 때만, 규칙과 지연 측정은 booth_replica.py)
+read_replica = ReadReplica(DATABASE_READ_URL) if DATABASE_READ_URL else None
+
+
+def get_read_conn(track_request=True):
+    """읽기 전용 요청용 연결: 가능하면 복제본, 아니면 주 DB. 반환값: (conn, engine) - conn.role로 구분"""
+    if read_replica is None:
+        return get_conn(track_request)
+    reason = read_replica.unusable_reason()
+    if reason is None:
+        try:
+            conn, engine = get_conn(track_request, role='replica')
+            read_replica.count('replica', 'ok')
+            return conn, engine
+        except Exception as e:
+            read_replica.mark_down(e)
+            reason = 'down'
+    read_replica.count('primary', reason)
+    return get_conn(track_request)
+
+
+@app.after_request
+def pin_writer_to_primary(response):
+    # 쓰기에 성공한 클라이언트는 잠시 주 DB에서 읽음 (read-your-writes)
+    if (read_replica is not None and request.method in ('POST', 'PUT', 'PATCH', 'DELETE')
+            and request.path.startswith('/api/') and response.status_code < 400):
+        response.set_cookie(READ_PIN_COOKIE, str(int(time.time() + READ_YOUR_WRITES_SECONDS) + 1),
+                            max_age=int(READ_YOUR_WRITES_SECONDS) + 1, httponly=True, samesite='Lax')
+    return response
+
+
+# --- 부스 이용권 (student_booths) ---
+# 프론트엔드 부스 플래그와 student_booths 컬럼 대응: (API 키, 컬럼, bool 여부)
+BOOTH_FLAGS = (
+    ('isGolden', 'is_golden', True),
+    ('goldenFrom', 'golden_from', False),
+    ('derived', 'derived', True),
+    ('derivedFrom', 'derived_from', False),
+)
+
+# 같은 (학생, 부스)가 이미 있으면 남은 횟수를 더하고, 들어온 플래그가 있으면 갱신
+UPSERT_BOOTH_SQL = '''
+    INSERT INTO student_booths (student_id, booth_number, name, price, remaining, issued,
+                                is_golden, golden_from, derived, derived_from)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (student_id, booth_number) DO UPDATE SET
+        remaining = student_booths.remaining + excluded.remaining,
+        issued = student_booths.issued + excluded.issued,
+        is_golden = COALESCE(excluded.is_golden, student_booths.is_golden),
+        golden_from = COALESCE(excluded.golden_from, student_booths.golden_from),
+        derived = COALESCE(excluded.derived, student_booths.derived),
+        derived_from = COALESCE(excluded.derived_from, student_booths.derived_from)
+'''
+
+
+
+def booth_params(student_id, booth):
+    """API 형식의 부스 dict를 UPSERT_BOOTH_SQL 파라미터로 변환합니다."""
+    remaining = int(booth.get('remaining', 0) or 0)
+    flags = []
+    for key, _column, is_bool in BOOTH_FLAGS:
+        if key not in booth:
+            flags.append(None)
+        elif is_bool:
+            flags.append(bool(booth[key]))
+        else:
+            flags.append(int_or_none(booth[key]))
+    return (student_id, int(booth['number']), booth.get('name'), int_or_none(booth.get('price')),
+            remaining, remaining, *flags)
+
+
+def booth_row_to_dict(row):
+    booth = {
+        'number': row['booth_number'],
+        'name': row['name'],
+        'price': row['price'],
+        'remaining': row['remaining']
+    }
+    for key, column, is_bool in BOOTH_FLAGS:
+        if row[column] is not None:
+            booth[key] = bool(row[column]) if is_bool else row[column]
+    return booth
+
+
+def load_booths(cursor, engine, student_ids):
+    """학생 id 목록의 부스 정보를 {student_id: [booth, ...]}로 한 번에 조회합니다. (dict_cursor 필요)"""
+    booths = {sid: [] for sid in student_ids}
+    ids = list(booths)
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        marks = ', '.join('?' * len(chunk))
+        cursor.execute(adapt_sql(engine, f'SELECT * FROM student_booths WHERE student_id IN ({marks}) ORDER BY student_id, id'), chunk)
+        for row in cursor.fetchall():
+            booths[row['student_id']].append(booth_row_to_dict(row))
+    return booths
+
+
+def student_row_to_dict(row, booths):
+    return {
+        'id': row['id'],
+        'student_number': row['student_number'],
+        'phone': row['phone'],
+        'name': row['name'],
+        'booths': booths,
+        'total_price': row['total_price'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'version': row['version']
+    }
+
+
+def init_student_booths(conn, cursor, engine):
+    """student_booths 테이블/인덱스를 만들고, 기존 students.booths(JSON) 값을 옮깁니다."""
+    if engine == 'sqlite':
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS student_booths (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                booth_number INTEGER NOT NULL,
+                name TEXT,
+                price INTEGER,
+                remaining INTEGER NOT NULL DEFAULT 0,
+                issued INTEGER NOT NULL DEFAULT 0,
+                is_golden INTEGER,
+                golden_from INTEGER,
+                derived INTEGER,
+                derived_from INTEGER
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS student_booths (
+                id SERIAL PRIMARY KEY,
+                student_id INTEGER NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                booth_number INTEGER NOT NULL,
+                name TEXT,
+                price INTEGER,
+                remaining INTEGER NOT NULL DEFAULT 0,
+                issued INTEGER NOT NULL DEFAULT 0,
+                is_golden BOOLEAN,
+                golden_from INTEGER,
+                derived BOOLEAN,
+                derived_from INTEGER
+            )
+        ''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_student_booths_student_booth ON student_booths (student_id, booth_number)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_booths_booth ON student_booths (booth_number)')
+    conn.commit()
+
+    # 기존 JSON 컬럼 → student_booths (옮긴 레코드는 booths를 '[]'로 비워 다시 옮기지 않음)
+    cursor.execute("SELECT id, booths FROM students WHERE booths <> '[]'")
+    rows = cursor.fetchall()
+    if not rows:
+        return
+    for student_id, raw in rows:
+        try:
+            booths = json.loads(raw) if isinstance(raw, str) else (raw or [])
+        except Exception:
+            booths = []
+        params = [booth_params(student_id, b) for b in booths
+                  if isinstance(b, dict) and int_or_none(b.get('number')) is not None]
+        if params:
+            cursor.executemany(adapt_sql(engine, UPSERT_BOOTH_SQL), params)
+        cursor.execute(adapt_sql(engine, "UPDATE students SET booths = '[]' WHERE id = ?"), (student_id,))
+    conn.commit()
+    print(f'부스 정보 마이그레이션 완료: {len(rows)} 레코드')
+
+
+class DuplicateStudentsError(RuntimeError):
+    pass
+
+
+def find_duplicate_students(cursor, engine):
+    """같은 학번의 레코드가 여러 개인 학번 목록. 반환: [{'student_number', 'keep', 'records': [...]}] (최신 레코드를 keep)"""
+    cursor.execute('''
+        SELECT student_number FROM students
+        WHERE student_number IS NOT NULL
+        GROUP BY student_number HAVING COUNT(*) > 1
+        ORDER BY student_number
+    ''')
+    duplicates = []
+    for (student_number,) in cursor.fetchall():
+        cursor.execute(adapt_sql(engine, 'SELECT id, name, phone, total_price, created_at FROM students WHERE student_number = ? ORDER BY created_at DESC, id DESC'), (student_number,))
+        records = [{'id': r[0], 'name': r[1], 'phone': r[2], 'total_price': r[3], 'created_at': str(r[4])} for r in cursor.fetchall()]
+        duplicates.append({'student_number': student_number, 'keep': records[0]['id'], 'records': records})
+    return duplicates
+
+
+def init_unique_student_number(conn, cursor, engine):
+    """students.student_number에 UNIQUE 인덱스를 만듭니다 (save_student upsert의 기준).
+    예전 버전에서 같은 학번으로 여러 레코드가 생긴 DB는 자동으로 병합하지 않고 목록을 출력한 뒤 중단합니다.
+    python app.py dedupe-students로 확인하고 --apply로 병합한 다음 다시 마이그레이션하세요."""
+    duplicates = find_duplicate_students(cursor, engine)
+    if duplicates:
+        for d in duplicates:
+            print(f"중복 학번 {d['student_number']}: " + ', '.join(f"ID {r['id']}({r['name']}, {r['created_at']}, {r['total_price']}원)" for r in d['records']))
+        raise DuplicateStudentsError(f'같은 학번의 레코드가 있는 학번 {len(duplicates)}개 때문에 마이그레이션을 중단합니다. '
+                                     'python app.py dedupe-students --apply로 최신 레코드에 병합한 뒤 다시 실행하세요.')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_students_student_number ON students (student_number)')
+    conn.commit()
+
 
-# 데이터베이스 파일 경로
-DB_PATH = 'student.db'
-
-# 데이터베이스 초기화 및 DB 연결 헬퍼
-import urllib.parse
-
-def get_conn():
-    """지원 DB에 따라 sqlite 또는 postgres 연결을 반환합니다. 반환값: (conn, engine)
-    engine: 'sqlite' or 'postgres'"""
-    db_url = os.getenv('DATABASE_URL')
-    if db_url and db_url.startswith('postgres'):
-        import psycopg2
-        # psycopg2가 설치되어야 함 (requirements.txt에 포함)
-        conn = psycopg2.connect(db_url, sslmode='require')
-        return conn, 'postgres'
+def merge_duplicate_students(conn, cursor, engine, duplicates):
+    """find_duplicate_students 결과대로 예전 레코드의 이용권/금액을 최신 레코드에 합치고 지웁니다.
+    옮긴 값은 원장에 merge/merge_used(이용권)와 merge(금액) 이벤트로, 지운 레코드는 delete로 남깁니다."""
+    if engine == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booth_ledger'")
     else:
-        conn = sqlite3.connect(DB_PATH)
-        return conn, 'sqlite'
+        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_name = 'booth_ledger'")
+    if cursor.fetchone() is None:
+        # 원장 도입 전 버전의 DB: 병합 전 잔액을 opening으로 먼저 남김 (booth_ledger 마이그레이션은 이후 그대로 건너뜀)
+        init_ledger(conn, cursor, engine)
+    for d in duplicates:
+        sn, keep_id = d['student_number'], d['keep']
+        events = []
+        for record in d['records'][1:]:
+            old_id = record['id']
+            cursor.execute(adapt_sql(engine, '''
+                SELECT booth_number, name, price, remaining, issued, is_golden, golden_from, derived, derived_from
+                FROM student_booths WHERE student_id = ? ORDER BY id
+            '''), (old_id,))
+            rows = cursor.fetchall()
+            if rows:
+                cursor.executemany(adapt_sql(engine, UPSERT_BOOTH_SQL), [(keep_id, *r) for r in rows])
+            for booth_number, _name, _price, remaining, issued, *_flags in rows:
+                events.append((keep_id, sn, booth_number, 'merge', issued, 0, 'dedupe'))
+                if remaining != issued:
+                    events.append((keep_id, sn, booth_number, 'merge_used', remaining - issued, 0, 'dedupe'))
+            events.append((keep_id, sn, None, 'merge', 0, record['total_price'] or 0, 'dedupe'))
+            events.append((old_id, sn, None, 'delete', 0, 0, 'dedupe'))
+            cursor.execute(adapt_sql(engine, 'UPDATE students SET total_price = total_price + ? WHERE id = ?'), (record['total_price'] or 0, keep_id))
+            cursor.execute(adapt_sql(engine, 'DELETE FROM student_booths WHERE student_id = ?'), (old_id,))
+            cursor.execute(adapt_sql(engine, 'DELETE FROM students WHERE id = ?'), (old_id,))
+        record_ledger(cursor, engine, events)
+        print(f"중복 학번 병합: {sn} ({len(d['records'])}건 → ID {keep_id})")
+    conn.commit()
+
+
+# --- 관리자 검색 인덱스 ---
+# sqlite: FTS5 trigram 테이블(students_fts)을 트리거로 students와 동기화
+# postgres: pg_trgm GIN 인덱스로 name/student_number LIKE '%..%' 가속
+# trigram은 3글자 이상에만 쓰이므로 2글자 검색어(두 글자 이름 등)는 이름 bigram 인덱스로 찾습니다
+# (sqlite: student_name_bigrams 테이블, postgres: student_name_bigrams(name) 식 GIN 인덱스).
+# 숫자 검색어는 student_number 인덱스의 범위(접두사) 조회와 전화번호(하이픈/공백 제외) 검색을 합칩니다.
+# 그 밖의 검색어는 예전처럼 이름과 학번 모두에서 찾습니다.
+SEARCH_LIMIT_DEFAULT = 50
+SEARCH_LIMIT_MAX = 200
+SEARCH_BIGRAM_MAX_NAME = 64   # sqlite bigram 인덱스에 넣는 이름 길이 (search_positions 행 수)
+PHONE_DIGITS_SQL = "replace(replace(phone, '-', ''), ' ', '')"
+_search_mode = None   # 'fts5' | 'trgm' | 'like'
+
+
+def init_search_index(conn, cursor, engine):
+    """엔진에 맞는 검색 인덱스를 만들고 사용할 검색 방식을 반환합니다. 지원되지 않으면 'like'."""
+    global _search_mode
+    if engine == 'sqlite':
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'")
+            exists = cursor.fetchone() is not None
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS students_fts
+                USING fts5(name, student_number, content='students', content_rowid='id', tokenize='trigram')
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+                    INSERT INTO students_fts (rowid, name, student_number) VALUES (new.id, new.name, new.student_number);
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+                    INSERT INTO students_fts (students_fts, rowid, name, student_number) VALUES ('delete', old.id, old.name, old.student_number);
+                END
+            ''')
+            # 총액 등 다른 컬럼 갱신 시에는 인덱스를 건드리지 않음
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF name, student_number ON students BEGIN
+                    INSERT INTO students_fts (students_fts, rowid, name, student_number) VALUES ('delete', old.id, old.name, old.student_number);
+                    INSERT INTO students_fts (rowid, name, student_number) VALUES (new.id, new.name, new.student_number);
+                END
+            ''')
+            if not exists:
+                cursor.execute("INSERT INTO students_fts (students_fts) VALUES ('rebuild')")
+            conn.commit()
+            _search_mode = 'fts5'
+        except sqlite3.OperationalError as e:
+            # FTS5/trigram 미지원 sqlite 빌드
+            conn.rollback()
+            print('FTS5 검색 인덱스를 사용할 수 없어 LIKE 검색을 사용합니다:', e)
+            _search_mode = 'like'
+    else:
+        try:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_name_trgm ON students USING gin (name gin_trgm_ops)')
+            conn.commit()
+            _search_mode = 'trgm'
+        except Exception as e:
+            # 확장 설치 권한이 없는 경우 등
+            conn.rollback()
+            print('pg_trgm 인덱스를 사용할 수 없어 LIKE 검색을 사용합니다:', e)
+            _search_mode = 'like'
+    return _search_mode
+
+
+def init_student_number_search(conn, cursor, engine):
+    """pg_trgm을 쓰는 경우 학번에도 trigram 인덱스를 만듭니다 (name OR student_number LIKE를 인덱스로 처리)."""
+    if engine == 'postgres' and get_search_mode(cursor, engine) == 'trgm':
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_number_trgm ON students USING gin (student_number gin_trgm_ops)')
+    conn.commit()
+
+
+def init_search_short_terms(conn, cursor, engine):
+    """2글자 이름 검색용 bigram 인덱스와 숫자 검색어용 전화번호 인덱스를 만듭니다."""
+    mode = get_search_mode(cursor, engine)
+    if engine == 'sqlite':
+        cursor.execute('CREATE TABLE IF NOT EXISTS search_positions (n INTEGER PRIMARY KEY)')
+        cursor.executemany('INSERT OR IGNORE INTO search_positions (n) VALUES (?)', [(n,) for n in range(1, SEARCH_BIGRAM_MAX_NAME)])
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS student_name_bigrams (
+                bigram TEXT NOT NULL,
+                student_id INTEGER NOT NULL,
+                PRIMARY KEY (bigram, student_id)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_student_name_bigrams_student ON student_name_bigrams (student_id)')
+        insert_bigrams = '''
+            INSERT OR IGNORE INTO student_name_bigrams (bigram, student_id)
+            SELECT substr(lower(new.name), n, 2), new.id FROM search_positions WHERE n < length(new.name);
+        '''
+        cursor.execute(f'CREATE TRIGGER IF NOT EXISTS student_name_bigrams_ai AFTER INSERT ON students BEGIN {insert_bigrams} END')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS student_name_bigrams_ad AFTER DELETE ON students BEGIN
+                DELETE FROM student_name_bigrams WHERE student_id = old.id;
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS student_name_bigrams_au AFTER UPDATE OF name ON students BEGIN
+                DELETE FROM student_name_bigrams WHERE student_id = old.id;
+                {insert_bigrams}
+            END
+        ''')
+        cursor.execute('''
+            INSERT OR IGNORE INTO student_name_bigrams (bigram, student_id)
+            SELECT substr(lower(s.name), p.n, 2), s.id FROM students s JOIN search_positions p ON p.n < length(s.name)
+        ''')
+        if mode == 'fts5':
+            # 전화번호 trigram 인덱스 (숫자만 저장해 '1234'로 010-1234-5678을 찾음)
+            cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS students_phone_fts USING fts5(phone, tokenize='trigram')")
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS students_phone_fts_ai AFTER INSERT ON students BEGIN
+                    INSERT INTO students_phone_fts (rowid, phone) VALUES (new.id, {PHONE_DIGITS_SQL.replace('phone', 'new.phone')});
+                END
+            ''')
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS students_phone_fts_ad AFTER DELETE ON students BEGIN
+                    DELETE FROM students_phone_fts WHERE rowid = old.id;
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS students_phone_fts_au AFTER UPDATE OF phone ON students BEGIN
+                    UPDATE students_phone_fts SET phone = {PHONE_DIGITS_SQL.replace('phone', 'new.phone')} WHERE rowid = new.id;
+                END
+            ''')
+            cursor.execute('DELETE FROM students_phone_fts')
+            cursor.execute(f'INSERT INTO students_phone_fts (rowid, phone) SELECT id, {PHONE_DIGITS_SQL} FROM students')
+    else:
+        cursor.execute('''
+            CREATE OR REPLACE FUNCTION student_name_bigrams(text) RETURNS text[]
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+                SELECT COALESCE(array_agg(DISTINCT substr(lower($1), i, 2)), '{}') FROM generate_series(1, char_length($1) - 1) AS i
+            $$
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_name_bigrams ON students USING gin (student_name_bigrams(name))')
+        if mode == 'trgm':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS idx_students_phone_trgm ON students USING gin (({PHONE_DIGITS_SQL}) gin_trgm_ops)')
+    conn.commit()
+
+
+def get_search_mode(cursor, engine):
+    """search_index 마이그레이션이 정한 검색 방식. 이 프로세스에서 마이그레이션하지 않았다면 인덱스 존재 여부로 판단합니다."""
+    global _search_mode
+    if _search_mode is None:
+        if engine == 'sqlite':
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'students_fts'")
+            _search_mode = 'fts5' if cursor.fetchone() else 'like'
+        else:
+            cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'idx_students_name_trgm'")
+            _search_mode = 'trgm' if cursor.fetchone() else 'like'
+    return _search_mode
+
+
+def escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
 
 
-def init_db():
+def search_students(cursor, engine, term, limit):
+    """이름/학번/전화번호 검색 결과 행을 최신순으로 최대 limit개 반환합니다 (dict_cursor 필요)."""
+    mode = get_search_mode(cursor, engine)
+    if term.isdigit():
+        # 학번 접두사: '123' → '123' <= student_number < '124' (인덱스 범위 조회) + 전화번호에 포함
+        upper = term[:-1] + chr(ord(term[-1]) + 1)
+        like = f'%{term}%'
+        if len(term) < 3 or mode == 'like':
+            # 1~2자리 숫자는 대부분의 전화번호에 들어 있어 created_at 순서로 훑어도 limit에서 곧 멈춤
+            cursor.execute(adapt_sql(engine, f'''
+                SELECT * FROM students WHERE (student_number >= ? AND student_number < ?) OR {PHONE_DIGITS_SQL} LIKE ?
+                ORDER BY created_at DESC, id DESC LIMIT ?
+            '''), (term, upper, like, limit))
+            return cursor.fetchall()
+        if mode == 'fts5':
+            phone_ids, phone_param = 'SELECT rowid FROM students_phone_fts WHERE students_phone_fts MATCH ?', f'"{term}"'
+        else:
+            phone_ids, phone_param = f'SELECT id FROM students WHERE {PHONE_DIGITS_SQL} LIKE ?', like
+        # 두 인덱스 조회 결과를 합친 뒤 정렬 (OR 한 번으로 쓰면 sqlite가 created_at 순서로 전체를 훑을 수 있음)
+        cursor.execute(adapt_sql(engine, f'''
+            SELECT * FROM students WHERE id IN (
+                SELECT id FROM students WHERE student_number >= ? AND student_number < ?
+                UNION {phone_ids}
+            )
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        '''), (term, upper, phone_param, limit))
+        return cursor.fetchall()
+
+    if len(term) == 2:
+        # 2글자: 이름 bigram 인덱스 (trigram 인덱스로는 찾을 수 없는 길이)
+        if engine == 'sqlite':
+            sql = 'SELECT * FROM students WHERE id IN (SELECT student_id FROM student_name_bigrams WHERE bigram = ?)'
+        else:
+            sql = 'SELECT * FROM students WHERE student_name_bigrams(name) @> ARRAY[?]::text[]'
+        cursor.execute(adapt_sql(engine, sql + ' ORDER BY created_at DESC, id DESC LIMIT ?'), (term.lower(), limit))
+        return cursor.fetchall()
+
+    if mode == 'fts5' and len(term) >= 3:
+        # trigram 토큰화는 3글자 이상부터 인덱스 사용
+        phrase = '"' + term.replace('"', '""') + '"'
+        cursor.execute('''
+            SELECT s.* FROM students_fts f JOIN students s ON s.id = f.rowid
+            WHERE students_fts MATCH ?
+            ORDER BY s.created_at DESC, s.id DESC LIMIT ?
+        ''', (phrase, limit))
+        return cursor.fetchall()
+
+    # pg_trgm 인덱스(name, student_number)는 두 LIKE를 BitmapOr로 직접 가속. 1글자 검색어는 created_at 인덱스 순서로 훑으며 limit에서 중단
+    like = f"%{escape_like(term)}%"
+    cursor.execute(adapt_sql(engine, """
+        SELECT * FROM students WHERE name LIKE ? ESCAPE '\\' OR student_number LIKE ? ESCAPE '\\'
+        ORDER BY created_at DESC, id DESC LIMIT ?
+    """), (like, like, limit))
+    return cursor.fetchall()
+
+
+# --- Idempotency-Key ---
+# 클라이언트가 재시도할 때 같은 Idempotency-Key를 보내면 처음 응답을 그대로 돌려주고 쓰기는 다시 실행하지 않습니다.
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', str(24 * 3600)))   # 키 보관 시간(초)
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '20000'))
+IDEMPOTENCY_PENDING_TIMEOUT = 30   # 이 시간(초)이 지나도록 '처리 중'이면 중단된 요청으로 보고 재실행 허용
+_idempotency_stores = 0
+
+
+def init_idempotency_keys(conn, cursor, engine):
+    real = 'REAL' if engine == 'sqlite' else 'DOUBLE PRECISION'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            status_code INTEGER,
+            response_body TEXT,
+            created_at {real} NOT NULL,
+            expires_at {real} NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at)')
+    conn.commit()
+
+
+def _claim_idempotency_key(cursor, engine, key, now):
+    """키를 '처리 중'으로 선점합니다. 선점했으면 None, 아니면 저장된 (status_code, body, created_at)."""
+    cursor.execute(adapt_sql(engine, '''
+        INSERT INTO idempotency_keys (key, status_code, response_body, created_at, expires_at)
+        VALUES (?, NULL, NULL, ?, ?)
+        ON CONFLICT (key) DO NOTHING
+        RETURNING key
+    '''), (key, now, now + IDEMPOTENCY_TTL))
+    if cursor.fetchone():
+        return None
+    # 만료됐거나 오래 '처리 중'으로 남은 키는 다시 선점
+    cursor.execute(adapt_sql(engine, '''
+        UPDATE idempotency_keys SET status_code = NULL, response_body = NULL, created_at = ?, expires_at = ?
+        WHERE key = ? AND (expires_at < ? OR (status_code IS NULL AND created_at < ?))
+        RETURNING key
+    '''), (now, now + IDEMPOTENCY_TTL, key, now, now - IDEMPOTENCY_PENDING_TIMEOUT))
+    if cursor.fetchone():
+        return None
+    cursor.execute(adapt_sql(engine, 'SELECT status_code, response_body, created_at FROM idempotency_keys WHERE key = ?'), (key,))
+    row = cursor.fetchone()
+    return (row['status_code'], row['response_body'], row['created_at']) if row else None
+
+
+def _store_idempotent_response(key, response):
+    global _idempotency_stores
     conn, engine = get_conn()
-    cursor = conn.cursor()
+    cursor = dict_cursor(conn, engine)
+    if response.status_code >= 500:
+        # 서버 오류는 저장하지 않고 키를 풀어 재시도가 다시 실행되도록 함
+        cursor.execute(adapt_sql(engine, 'DELETE FROM idempotency_keys WHERE key = ?'), (key,))
+    else:
+        cursor.execute(adapt_sql(engine, 'UPDATE idempotency_keys SET status_code = ?, response_body = ? WHERE key = ?'),
+                       (response.status_code, response.get_data(as_text=True), key))
+        _idempotency_stores += 1
+        if _idempotency_stores % 200 == 0:
+            # 만료된 키 정리 + 개수 상한 유지 (오래된 것부터 삭제)
+            now = time.time()
+            cursor.execute(adapt_sql(engine, 'DELETE FROM idempotency_keys WHERE expires_at < ?'), (now,))
+            cursor.execute(adapt_sql(engine, '''
+                DELETE FROM idempotency_keys WHERE key IN (
+                    SELECT key FROM idempotency_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+            ''' if engine == 'sqlite' else '''
+                DELETE FROM idempotency_keys WHERE key IN (
+                    SELECT key FROM idempotency_keys ORDER BY created_at DESC OFFSET ?
+                )
+            '''), (IDEMPOTENCY_MAX_KEYS,))
+    conn.commit()
+    conn.close()
+
+
+def idempotent(func):
+    """Idempotency-Key 헤더가 있으면 같은 키의 첫 응답을 재사용합니다 (키는 메서드+경로별로 구분)."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        client_key = request.headers.get('Idempotency-Key')
+        if not client_key:
+            return func(*args, **kwargs)
+        if len(client_key) > 200:
+            return jsonify({'success': False, 'message': 'Idempotency-Key가 너무 깁니다.'}), 400
+        key = f'{request.method} {request.path} {client_key}'
+
+        conn, engine = get_conn()
+        cursor = dict_cursor(conn, engine)
+        stored = _claim_idempotency_key(cursor, engine, key, time.time())
+        conn.commit()
+        conn.close()
+        if stored is not None:
+            status_code, body, _created_at = stored
+            if status_code is None:
+                resp = jsonify({'success': False, 'message': '같은 요청을 처리하고 있습니다. 잠시 후 다시 시도해주세요.'})
+                resp.status_code = 409
+                resp.headers['Retry-After'] = '1'
+                return resp
+            resp = app.response_class(body, status=status_code, mimetype='application/json')
+            resp.headers['Idempotent-Replayed'] = 'true'
+            return resp
+
+        try:
+            response = app.make_response(func(*args, **kwargs))
+        except Exception:
+            _store_idempotent_response(key, app.response_class('', status=500))
+            raise
+        _store_idempotent_response(key, response)
+        return response
+    return wrapper
+
 
+# --- 실시간 티켓 갱신 (SSE) ---
+# 티켓을 바꾸는 쓰기(save/batch/adjust/payment/delete)는 같은 트랜잭션에서 ticket_events에 학번을 기록합니다.
+# 워커마다 구독자가 있을 때만 폴러 스레드 하나가 이 테이블을 읽어(구독자 수와 무관하게 워커당 쿼리 1개)
+# 해당 학번 구독자들에게 새 티켓 JSON을 한 번만 조회해서 나눠 줍니다.
+SSE_MAX_CONNECTIONS = int(os.getenv('SSE_MAX_CONNECTIONS', '4'))   # 워커당 동시 스트림 상한 (gthread 스레드 수보다 작게)
+SSE_MAX_DURATION = float(os.getenv('SSE_MAX_DURATION', '300'))       # 스트림 최대 유지 시간(초), 이후 브라우저가 재연결
+SSE_POLL_INTERVAL = float(os.getenv('SSE_POLL_INTERVAL', '0.5'))
+SSE_KEEPALIVE = 15            # 이 시간(초) 동안 변경이 없으면 주석 줄을 보내 연결 유지
+SSE_RETRY_MS = 3000           # 끊긴 뒤 브라우저 재연결 대기
+SSE_EVENT_LOOKBACK = 5        # 늦게 커밋된 이벤트를 놓치지 않도록 이 시간(초)만큼 겹쳐서 읽음
+class TicketBroker:
+    """워커 내 구독 관리: 학번 -> 구독자 큐. 큐에는 가장 최근 티켓 JSON 하나만 남깁니다.
+    ticket_events 폴링은 구독자가 있을 때, 그리고 티켓 캐시를 쓰는 동안(watch_cache) 돕니다."""
+
+    def __init__(self, max_subscribers):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._subs = {}
+        self._count = 0
+        self._watch_cache = False
+        self._thread = None
+        self._stats = {'rejected': 0, 'delivered': 0, 'polls': 0, 'errors': 0}
+
+    def subscribe(self, student_number, q=None):
+        """구독 큐를 반환합니다. 상한에 걸리면 None.
+        q: get_nowait/put_nowait가 있는 1칸 큐 (asgi.py는 이벤트 루프에서 기다릴 수 있는 큐를 넘김)"""
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                self._stats['rejected'] += 1
+                return None
+            if q is None:
+                q = queue.Queue(maxsize=1)
+            self._subs.setdefault(student_number, set()).add(q)
+            self._count += 1
+            self._ensure_thread()
+        return q
+
+    def watch_cache(self):
+        """다른 워커/서버의 쓰기로 바뀐 학번을 티켓 캐시에서 지우도록 폴링을 계속 돌립니다 (캐시가 오래될 수 있는 시간의 상한)."""
+        if self._watch_cache and self._thread is not None:
+            return
+        with self._lock:
+            self._watch_cache = True
+            self._ensure_thread()
+
+    def _ensure_thread(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='ticket-events', daemon=True)
+            self._thread.start()
+
+    def unsubscribe(self, student_number, q):
+        with self._lock:
+            subs = self._subs.get(student_number)
+            if subs and q in subs:
+                subs.discard(q)
+                self._count -= 1
+                if not subs:
+                    del self._subs[student_number]
+
+    def _deliver(self, student_number, body):
+        with self._lock:
+            targets = list(self._subs.get(student_number, ()))
+        for q in targets:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(body)
+            except queue.Full:
+                pass
+        self._stats['delivered'] += len(targets)
+
+    def _poll(self, seen):
+        conn, engine = get_conn(track_request=False)
+        try:
+            cursor = dict_cursor(conn, engine)
+            since = time.time() - SSE_EVENT_LOOKBACK
+            cursor.execute(adapt_sql(engine, 'SELECT id, student_number, created_at FROM ticket_events WHERE created_at > ?'), (since,))
+            rows = cursor.fetchall()
+            conn.rollback()
+        finally:
+            conn.close()
+        changed = set()
+        for row in rows:
+            if row['id'] not in seen:
+                seen[row['id']] = row['created_at']
+                changed.add(row['student_number'])
+        for event_id in [i for i, created in seen.items() if created <= since]:
+            del seen[event_id]
+        return changed
+
+    def _run(self):
+        seen = {}
+        first = True
+        while True:
+            with self._lock:
+                if self._count == 0 and not self._watch_cache:
+                    self._thread = None
+                    return
+            try:
+                changed = self._poll(seen)
+                self._stats['polls'] += 1
+                # 다른 워커의 쓰기일 수 있으므로 이 워커의 캐시도 비움
+                for student_number in changed:
+                    ticket_cache.invalidate(student_number)
+                if first:
+                    # 구독 시점의 티켓은 스트림 시작 때 이미 보냄
+                    changed, first = set(), False
+                for student_number in changed:
+                    with self._lock:
+                        if student_number not in self._subs:
+                            continue
+                    with app.app_context():
+                        _, body = load_ticket(student_number, track_request=False, replica=False)
+                    self._deliver(student_number, body)
+            except Exception as e:
+                self._stats['errors'] += 1
+                print('티켓 이벤트 폴링 오류:', e)
+            time.sleep(SSE_POLL_INTERVAL)
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self._stats)
+            data.update({'connections': self._count, 'max': self.max_subscribers,
+                         'student_numbers': len(self._subs), 'polling': self._thread is not None,
+                         'watch_cache': self._watch_cache})
+        return data
+
+
+ticket_broker = TicketBroker(SSE_MAX_CONNECTIONS)
+
+
+# --- 쓰기 지연(write-behind) 저널 ---
+# WRITE_BEHIND=1이면 save-student는 주문을 로컬 저널에 기록하고 바로 202로 응답합니다 (저널과 반영 스레드는 booth_journal.py).
+# 반영한 티켓은 같은 트랜잭션에서 write_behind_applied에 기록하므로, 커밋 직후 죽어도 두 번 반영되지 않습니다.
+WRITE_BEHIND_PATH = os.getenv('WRITE_BEHIND_PATH', 'write_behind.db')
+
+def init_write_behind(conn, cursor, engine):
+    real = 'REAL' if engine == 'sqlite' else 'DOUBLE PRECISION'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS write_behind_applied (
+            ticket TEXT PRIMARY KEY,
+            student_id INTEGER,
+            applied_at {real} NOT NULL
+        )
+    ''')
+    conn.commit()
+
+
+write_behind = None   # WRITE_BEHIND이면 start_worker()에서 엶
+
+
+def open_write_behind():
+    """저널을 열고 남은 주문 반영을 시작합니다 (재시작 전 접수된 주문 복구 포함)."""
+    global write_behind
+    if not WRITE_BEHIND or write_behind is not None:
+        return
+    try:
+        journal = WriteBehindJournal(WRITE_BEHIND_PATH, apply_journal_orders)
+    except Exception as e:
+        print('쓰기 지연 저널을 열 수 없어 바로 저장합니다:', e)
+        return
+    journal.start()
+    write_behind = journal
+
+
+# --- 스키마 마이그레이션 ---
+# 스키마 변경은 번호가 붙은 마이그레이션으로 한 번만 실행하고 schema_migrations에 기록합니다.
+# 배포 시에는 gunicorn.conf.py의 on_starting 훅(python app.py migrate)이 워커를 띄우기 전에 실행하므로
+# 워커는 시작할 때(start_worker) 버전만 확인합니다 (DDL/ALTER를 워커마다 다시 실행하지 않음).
+# 각 마이그레이션은 이미 적용된 DB에서도 안전하므로 schema_migrations 도입 전 DB는 처음 한 번 모두 다시 확인합니다.
+# 새 스키마 변경은 기존 항목을 고치지 말고 MIGRATIONS 끝에 새 번호로 추가하세요.
+SCHEMA_AUTO_MIGRATE = os.getenv('SCHEMA_AUTO_MIGRATE', 'True').lower() in ('1', 'true', 'yes')  # 워커 시작 시 스키마가 오래됐으면 직접 마이그레이션
+SCHEMA_LOCK_ID = 20250501   # postgres advisory lock 번호 (동시에 두 프로세스가 마이그레이션하지 않도록)
+
+
+def migrate_students(conn, cursor, engine):
     if engine == 'sqlite':
         # student_number 컬럼을 포함한 테이블 생성 (마이그레이션을 대비해 안전하게 추가)
         cursor.execute('''
@@ -47,7 +901,8 @@ def init_db():
                 name TEXT NOT NULL,
                 booths TEXT NOT NULL,
                 total_price INTEGER NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         conn.commit()
@@ -57,6 +912,15 @@ def init_db():
         if 'student_number' not in cols:
             cursor.execute("ALTER TABLE students ADD COLUMN student_number TEXT")
             conn.commit()
+        # 레코드 버전 (티켓이 바뀔 때마다 +1, ETag에 사용)
+        if 'version' not in cols:
+            cursor.execute("ALTER TABLE students ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+            conn.commit()
+        # 마지막 변경 시각 (created_at은 최초 등록 시각으로 유지)
+        if 'updated_at' not in cols:
+            cursor.execute("ALTER TABLE students ADD COLUMN updated_at DATETIME")
+            cursor.execute("UPDATE students SET updated_at = created_at")
+            conn.commit()
     else:
         # postgres 용 테이블 생성 (JSONB 사용)
         cursor.execute('''
@@ -67,32 +931,143 @@ def init_db():
                 name TEXT NOT NULL,
                 booths JSONB NOT NULL,
                 total_price INTEGER NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         conn.commit()
         # 컬럼 추가가 필요한 경우 안전하게 추가
         cursor.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS student_number TEXT")
+        cursor.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1")
+        cursor.execute("SELECT 1 FROM information_schema.columns WHERE table_name = 'students' AND column_name = 'updated_at'")
+        if not cursor.fetchone():
+            cursor.execute("ALTER TABLE students ADD COLUMN updated_at TIMESTAMP")
+            cursor.execute("UPDATE students SET updated_at = created_at")
+            cursor.execute("ALTER TABLE students ALTER COLUMN updated_at SET DEFAULT CURRENT_TIMESTAMP")
         conn.commit()
 
-    cursor.close()
-    conn.close()
-    print('데이터베이스 초기화 완료')
 
-# 데이터베이스 초기화: import 시 또는 프로덕션(wsgi)에서도 안전하게 실행
-try:
-    init_db()
-except Exception as e:
-    print('데이터베이스 초기화 중 오류:', e)
+def migrate_students_created_at_index(conn, cursor, engine):
+    # 목록 조회(키셋 페이지네이션)용 인덱스
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_created_at ON students (created_at, id)')
+    conn.commit()
+
+
+MIGRATIONS = [
+    (1, 'students', migrate_students),
+    (2, 'student_booths', init_student_booths),
+    (3, 'unique_student_number', init_unique_student_number),
+    (4, 'students_created_at_index', migrate_students_created_at_index),
+    (5, 'search_index', init_search_index),
+    (6, 'idempotency_keys', init_idempotency_keys),
+    (7, 'ticket_events', init_ticket_events),
+    (8, 'stats', init_stats),
+    (9, 'booth_ledger', init_ledger),
+    (10, 'write_behind_applied', init_write_behind),
+    (11, 'stats_shards', shard_stats),
+    (12, 'student_number_search', init_student_number_search),
+    (13, 'search_short_terms', init_search_short_terms),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+@contextlib.contextmanager
+def schema_lock(conn, cursor, engine):
+    """마이그레이션 동안 다른 프로세스의 마이그레이션을 막습니다."""
+    if engine == 'postgres':
+        cursor.execute('SELECT pg_advisory_lock(%s)', (SCHEMA_LOCK_ID,))
+        try:
+            yield
+        finally:
+            conn.rollback()
+            cursor.execute('SELECT pg_advisory_unlock(%s)', (SCHEMA_LOCK_ID,))
+            conn.commit()
+        return
+    if fcntl is None:
+        yield   # fcntl이 없는 환경(Windows 개발 서버)은 단일 프로세스로 가정
+        return
+    with open(DB_PATH + '.migrate.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+def schema_version(cursor, engine):
+    """적용된 마지막 마이그레이션 번호 (schema_migrations가 없으면 0)."""
+    if engine == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_migrations'")
+    else:
+        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_name = 'schema_migrations'")
+    if cursor.fetchone() is None:
+        return 0
+    cursor.execute('SELECT MAX(version) FROM schema_migrations')
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(target=None):
+    """적용되지 않은 마이그레이션을 순서대로 실행합니다 (target이 있으면 그 번호까지). 반환: 실행한 마이그레이션 수"""
+    conn, engine = get_conn(track_request=False)
+    cursor = conn.cursor()
+    ran = 0
+    try:
+        with schema_lock(conn, cursor, engine):
+            real = 'REAL' if engine == 'sqlite' else 'DOUBLE PRECISION'
+            cursor.execute(f'''
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at {real} NOT NULL,
+                    duration {real}
+                )
+            ''')
+            conn.commit()
+            cursor.execute('SELECT version FROM schema_migrations')
+            applied = {row[0] for row in cursor.fetchall()}
+            for version, name, func in MIGRATIONS:
+                if version in applied or (target is not None and version > target):
+                    continue
+                started = time.perf_counter()
+                func(conn, cursor, engine)
+                elapsed = time.perf_counter() - started
+                cursor.execute(adapt_sql(engine, 'INSERT INTO schema_migrations (version, name, applied_at, duration) VALUES (?, ?, ?, ?)'),
+                               (version, name, time.time(), elapsed))
+                conn.commit()
+                applied.add(version)
+                ran += 1
+                print(f'마이그레이션 {version:03d} {name}: {elapsed * 1000:.0f}ms')
+            if engine == 'sqlite' and SQLITE_MODE == 'tuned':
+                # 쿼리 플래너 통계 갱신 (큰 테이블도 빨리 끝나도록 표본 수 제한)
+                cursor.execute('PRAGMA analysis_limit=400')
+                cursor.execute('PRAGMA optimize')
+                conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    print(f'데이터베이스 스키마 버전 {max(applied, default=0)} (이번에 {ran}개 적용)')
+    return ran
+
+
+def ensure_schema():
+    """워커 시작 시: 스키마 버전만 확인하고, 오래됐으면 SCHEMA_AUTO_MIGRATE일 때만 마이그레이션합니다."""
+    conn, engine = get_conn(track_request=False)
+    try:
+        cursor = conn.cursor()
+        current = schema_version(cursor, engine)
+    finally:
+        conn.close()
+    if current >= SCHEMA_VERSION:
+        return
+    if not SCHEMA_AUTO_MIGRATE:
+        print(f'경고: 데이터베이스 스키마가 오래되었습니다 (현재 {current}, 필요 {SCHEMA_VERSION}). python app.py migrate를 실행하세요.')
+        return
+    migrate()
+
 
 # 정적 파일 제공 (HTML 파일)
 @app.route('/')
 def index():
-    return send_from_directory('.', 'index.html')
+    return serve_static('index.html')
 
 # --- Admin auth helper ---
-import functools
-from flask import g
 
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD')
 
@@ -103,162 +1078,495 @@ def require_admin(func):
         if not ADMIN_PASSWORD:
             return func(*args, **kwargs)
         # Check header
-        req_pw = request.headers.get('X-ADMIN-PASSWORD') or request.args.get('admin_password')
-        if not req_pw or req_pw != ADMIN_PASSWORD:
+        if not is_admin_request():
             return jsonify({'success': False, 'message': '관리자 권한이 필요합니다.'}), 401
         return func(*args, **kwargs)
     return wrapper
 
+# --- 요청 수락 제어 (admission control) ---
+# /api/* 요청을 부류로 나눠 IP별 토큰 버킷(429)과 워커 안의 동시 처리 자리(503)로 거릅니다 (규칙은 booth_admission.py).
+# 앞단 프록시 수: X-Forwarded-For에서 클라이언트 IP를 읽음. Render(환경변수 RENDER가 설정됨)에서는 기본 1
+PROXY_HOPS = int(os.getenv('PROXY_HOPS', '1' if os.getenv('RENDER') else '0'))
+
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+
+admission = (AdmissionController(ADMISSION_CLASSES, ADMISSION_MAX_INFLIGHT, ADMISSION_CONTROL, RATE_LIMIT)
+             if ADMISSION_CONTROL or RATE_LIMIT else None)
+
+
+def is_admin_request():
+    if not ADMIN_PASSWORD:
+        return True
+    req_pw = request.headers.get('X-ADMIN-PASSWORD') or request.args.get('admin_password')
+    return bool(req_pw) and req_pw == ADMIN_PASSWORD
+
+
+def request_class():
+    """현재 요청의 부류. 인증 없는 관리자 경로 요청은 공개 부류로 셉니다 (어차피 401)."""
+    rule = request.url_rule.rule if request.url_rule else None
+    method = 'GET' if request.method == 'HEAD' else request.method
+    cls = ADMISSION_ROUTES.get((method, rule))
+    if cls is None:
+        cls = 'lookup' if rule == '/api/students' and request.args.get('student_number') else 'admin'
+    if cls in ('admin', 'redeem') and not is_admin_request():
+        return 'lookup'
+    return cls
+
+
+def shed_response(cls, reason, status, retry_after, message):
+    admission.record_shed(cls, reason)
+    resp = jsonify({'success': False, 'message': message})
+    resp.status_code = status
+    resp.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return resp
+
+
+@app.before_request
+def admit_request():
+    if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+        return None
+    if admission is None:
+        return None
+    cls = request_class()
+    if RATE_LIMIT:
+        wait = admission.take_token(request.remote_addr or '-', cls)
+        if wait:
+            return shed_response(cls, 'rate_limited', 429, wait, '요청이 너무 많습니다. 잠시 후 다시 시도해주세요.')
+    if ADMISSION_CONTROL:
+        waited = admission.acquire(cls)
+        if waited is None:
+            return shed_response(cls, 'overloaded', 503, 1, '서버가 혼잡합니다. 잠시 후 다시 시도해주세요.')
+        g._admission_class = cls
+        metrics.observe('booth_admission_wait_seconds', (('class', cls),), waited)
+    return None
+
+
+@app.teardown_request
+def release_admission(exc):
+    cls = g.pop('_admission_class', None)
+    if cls is not None:
+        admission.release(cls)
+
+# 수락 제어 상태 (부류별 처리 중 요청, 거절 수)
+@app.route('/api/admission-stats', methods=['GET'])
+@require_admin
+def admission_stats():
+    data = admission.snapshot() if admission is not None else {'enabled': False, 'rate_limit': False}
+    return jsonify({'success': True, 'data': data})
+
+# 커넥션 풀 상태 (풀 크기 조정용)
+@app.route('/api/pool-stats', methods=['GET'])
+@require_admin
+def pool_stats():
+    data = get_pool().snapshot()
+    if read_replica is not None:
+        data['replica'] = read_replica.snapshot()
+    return jsonify({'success': True, 'data': data})
+
+# 공개 티켓 조회 캐시 상태
+@app.route('/api/cache-stats', methods=['GET'])
+@require_admin
+def cache_stats():
+    return jsonify({'success': True, 'data': ticket_cache.snapshot()})
+
+# Prometheus 메트릭 (모든 워커 합산)
+@app.route('/metrics', methods=['GET'])
+@require_admin
+def metrics_endpoint():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+profiler = RequestProfiler() if PROFILER else None
+
+
+@app.before_request
+def start_request_profile():
+    if not request.path.startswith('/api/') or request.method == 'OPTIONS':
+        return
+    if profiler is None:
+        return
+    config = profiler.current()
+    if config is None:
+        return
+    state = profiler.start(config, request.url_rule.rule if request.url_rule else None)
+    if state is not None:
+        g._profile = state
+        g._profile_started = time.perf_counter()
+
+
+@app.after_request
+def stop_request_profile(response):
+    state = g.get('_profile')
+    if state is not None:
+        # cProfile은 켠 스레드에서 꺼야 하므로 뷰 직후에 멈춤 (스트리밍 본문은 스택 샘플링/SQL만 이어서 기록)
+        profiler.stop_profile(state)
+        state['status'] = response.status_code
+    return response
+
+
+@app.teardown_request
+def finish_request_profile(exc):
+    state = g.pop('_profile', None)
+    if state is None:
+        return
+    try:
+        profiler.finish(state, time.perf_counter() - g.pop('_profile_started'), state.get('status', 500))
+        profiler.flush()
+    except Exception as e:
+        print('프로파일 처리 오류:', e)
+
+# 프로파일러 상태 / 설정: {"mode": "cprofile"|"sample", "sample_rate": 0.1, "route": "/api/students", "slow_ms": 500, "duration": 300}
+# {"enabled": false}면 끔 (PROFILER_SLOW_MS 기본값도 끔)
+@app.route('/api/profiler', methods=['GET', 'POST'])
+@require_admin
+def profiler_settings():
+    if profiler is None:
+        return jsonify({'success': False, 'message': '프로파일러가 꺼져 있습니다 (PROFILER=0).'}), 404
+    if request.method == 'POST':
+        try:
+            profiler.configure(request.json or {})
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'message': f'잘못된 프로파일러 설정입니다: {e}'}), 400
+    return jsonify({'success': True, 'data': profiler.snapshot()})
+
+# 프로파일 기록 내려받기 (모든 워커, 최신 순): ?endpoint=/api/students&reason=slow&limit=20 / DELETE로 비움
+@app.route('/api/profiler/captures', methods=['GET', 'DELETE'])
+@require_admin
+def profiler_captures():
+    if profiler is None:
+        return jsonify({'success': False, 'message': '프로파일러가 꺼져 있습니다 (PROFILER=0).'}), 404
+    if request.method == 'DELETE':
+        profiler.clear()
+        return jsonify({'success': True, 'message': '프로파일 기록을 비웠습니다.'})
+    records = profiler.records()
+    if request.args.get('endpoint'):
+        records = [r for r in records if r['endpoint'] == request.args['endpoint']]
+    if request.args.get('reason'):
+        records = [r for r in records if r['reason'] == request.args['reason']]
+    limit = int_or_none(request.args.get('limit'))
+    if limit:
+        records = records[:limit]
+    resp = jsonify({'success': True, 'data': records})
+    resp.headers['Content-Disposition'] = f'attachment; filename=profiles-{datetime.now().strftime("%Y%m%d-%H%M%S")}.json'
+    return resp
+
+# --- 정적 파일: 내용 해시 ETag, 장기 캐시, 사전 압축 ---
+# HTML/JS/CSS는 처음 요청될 때(또는 파일이 바뀌었을 때) 한 번 읽어 내용 해시와 gzip/brotli 압축본을 메모리에 만들어 둡니다.
+# HTML 안의 로컬 js/css 참조는 ?v=<해시>를 붙여 내보내므로, 해시가 맞는 요청은 1년 캐시(immutable)로 응답합니다.
+# HTML과 해시 없는 요청은 no-cache + ETag로 매번 재검증(304)합니다. brotli 패키지가 없으면 gzip만 사용합니다.
+# STATIC_FILES에 있는 프론트엔드 파일만 내보냅니다 (같은 디렉터리의 DB, .env, 저널, 키 파일 등은 404).
+STATIC_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_FILES = frozenset((
+    'index.html', 'admin.html', 'myticket.html',
+    'script.js', 'admin.js', 'myticket.js', 'api.js', 'qr.js',
+    'style.css',
+))
+STATIC_COMPRESSIBLE = ('.html', '.js', '.css')
+ASSET_REF_RE = re.compile(r'''(src|href)="([\w./-]+\.(?:js|css))"''')
+_static_assets = {}
+_static_lock = threading.Lock()
+
+
+def _compress_variants(body):
+    variants = {'gzip': gzip.compress(body, 9)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(body, quality=11)
+    # 압축해도 작아지지 않으면 보내지 않음
+    return {k: v for k, v in variants.items() if len(v) < len(body)}
+
+
+def get_static_asset(path):
+    """압축/해시 대상 정적 파일이면 {'version', 'body', 'variants', 'mimetype'}, 아니면 None."""
+    if path not in STATIC_FILES or not path.endswith(STATIC_COMPRESSIBLE):
+        return None
+    full = os.path.join(STATIC_ROOT, path)
+    try:
+        mtime = os.path.getmtime(full)
+    except OSError:
+        return None
+    asset = _static_assets.get(path)
+    if asset is not None and asset['mtime'] == mtime:
+        return asset
+    with open(full, 'rb') as f:
+        body = f.read()
+    if path.endswith('.html'):
+        # 참조하는 js/css에 내용 해시를 붙여 브라우저가 바뀐 파일만 새로 받게 함
+        def versioned(m):
+            ref = get_static_asset(m.group(2))
+            return m.group(0) if ref is None else f'{m.group(1)}="{m.group(2)}?v={ref["version"]}"'
+        body = ASSET_REF_RE.sub(versioned, body.decode('utf-8')).encode('utf-8')
+    asset = {
+        'mtime': mtime,
+        'version': hashlib.md5(body).hexdigest()[:12],
+        'body': body,
+        'variants': _compress_variants(body),
+        'mimetype': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+    }
+    with _static_lock:
+        _static_assets[path] = asset
+    return asset
+
+
+def serve_static(path):
+    if path not in STATIC_FILES:
+        abort(404)
+    asset = get_static_asset(path)
+    if asset is None:
+        return send_from_directory(STATIC_ROOT, path)
+    etag = f'W/"{asset["version"]}"'
+    immutable = not path.endswith('.html') and request.args.get('v') == asset['version']
+    headers = {
+        'ETag': etag,
+        'Vary': 'Accept-Encoding',
+        'Cache-Control': 'public, max-age=31536000, immutable' if immutable else 'no-cache',
+    }
+    if request.if_none_match.contains_weak(asset['version']):
+        return Response(status=304, headers=headers)
+    body = asset['body']
+    for encoding in ('br', 'gzip'):
+        if encoding in asset['variants'] and encoding in request.accept_encodings:
+            body = asset['variants'][encoding]
+            headers['Content-Encoding'] = encoding
+            break
+    mimetype = asset['mimetype']
+    if mimetype.startswith('text/') or mimetype == 'application/javascript':
+        mimetype += '; charset=utf-8'
+    return Response(body, headers=headers, content_type=mimetype)
+
+
 @app.route('/<path:path>')
 def static_files(path):
-    return send_from_directory('.', path)
+    return serve_static(path)
+
+# --- 등록(주문) 처리: save-student / save-students/batch 공용 ---
+
+# 부스 이름에서 이용 횟수 찾기: 3회, 2회, 1회 또는 [3회], [1인]
+INITIAL_USES_RE = re.compile(r"(\d+)회|\[(\d+)회\]|(\d+)인|\[(\d+)인\]")
+STUDENT_NUMBER_RE = re.compile(r'^\d{5}$')
+SAVE_BATCH_MAX = int(os.getenv('SAVE_BATCH_MAX', '200'))
+
+
+
+
+# 부스별 초기 남은 횟수 계산 (카탈로그가 없을 때)
+def parse_initial_uses(booth):
+    # booth는 {number, name, price}
+    name = booth.get('name') or ''
+    m = INITIAL_USES_RE.search(name)
+    if m:
+        for g in m.groups():
+            if g and g.isdigit():
+                return int(g)
+    # 특별 케이스: PASS 명칭에 따라 기본값 변경(없으면 1)
+    if 'SUPER' in name.upper() or 'SUPERPASS' in name.upper():
+        return 1
+    return 1
+
+
+def merge_booth_lists(existing, incoming):
+    """병합 규칙: 동일 번호의 부스가 있으면 remaining 증가(들어온 플래그로 갱신), 없으면 추가."""
+    by_number = {b['number']: b for b in existing}
+    for pb in incoming:
+        eb = by_number.get(pb['number'])
+        if eb is None:
+            eb = dict(pb)
+            existing.append(eb)
+            by_number[eb['number']] = eb
+            continue
+        eb['remaining'] = int(eb.get('remaining', 0)) + int(pb.get('remaining', 0))
+        for k in ('isGolden', 'goldenFrom', 'derived', 'derivedFrom'):
+            if k in pb:
+                eb[k] = pb[k]
+    return existing
+
+
+def validate_student_order(data):
+    """save-student 요청 본문을 검증해 저장할 주문을 만듭니다. 잘못된 입력이면 OrderError.
+    반환: {'phone', 'name', 'student_number', 'booths'(remaining 포함), 'total_price'}"""
+    if not isinstance(data, dict):
+        raise OrderError('필수 정보가 누락되었습니다.')
+    phone = data.get('phone')
+    name = data.get('name')
+    student_number = data.get('student_number')
+    booths = data.get('booths')
+    total_price = data.get('totalPrice')
+
+    # 입력 검증
+    if not phone or not name or not booths or len(booths) == 0 or not student_number:
+        raise OrderError('필수 정보가 누락되었습니다.')
+
+    # 학번(5자리) 검증
+    if not STUDENT_NUMBER_RE.match(str(student_number)):
+        raise OrderError('학번은 숫자 5자리여야 합니다.')
+
+    # 부스 번호 검증 (student_booths.booth_number는 정수)
+    if not isinstance(booths, list) or any(not isinstance(b, dict) or int_or_none(b.get('number')) is None for b in booths):
+        raise OrderError('부스 번호가 올바르지 않습니다.')
+
+    catalog = booth_catalog.get()
+    if catalog is not None:
+        # 이름/가격/이용 횟수/총액은 서버 카탈로그 기준
+        processed_booths, total_price = expand_catalog_order(catalog, booths)
+        return {
+            'phone': phone,
+            'name': name,
+            'student_number': str(student_number),
+            'booths': processed_booths,
+            'total_price': total_price
+        }
+
+    # 보관할 부스 정보에 remaining 추가
+    processed_booths = []
+    for b in booths:
+        pb = {
+            'number': int(b.get('number')),
+            'name': b.get('name'),
+            'price': b.get('price'),
+            'remaining': parse_initial_uses(b)
+        }
+        # 프론트엔드에서 전달할 수 있는 추가 플래그 보존 (isGolden, derived 등)
+        for optional_key in ('isGolden','derived','derivedFrom','goldenFrom'):
+            if optional_key in b:
+                pb[optional_key] = b.get(optional_key)
+        processed_booths.append(pb)
+    # 한 요청 안에 같은 번호가 중복되면 하나로 합침
+    processed_booths = merge_booth_lists([], processed_booths)
+
+    # 총액 보장
+    if total_price is None:
+        try:
+            total_price = sum(int(b.get('price', 0)) for b in processed_booths)
+        except Exception:
+            total_price = 0
+    if int_or_none(total_price) is None:
+        raise OrderError('총액이 올바르지 않습니다.')
+
+    return {
+        'phone': phone,
+        'name': name,
+        'student_number': str(student_number),
+        'booths': processed_booths,
+        'total_price': int(total_price)
+    }
+
+
+
+def apply_student_order(cursor, engine, order):
+    """주문 하나를 저장 또는 기존 학번 레코드에 병합합니다 (커밋은 호출자). 반환: (student_id, merged)
+    레코드가 삽입과 갱신 사이에 삭제된 경우 (None, True)."""
+    # student_number UNIQUE 인덱스 기준으로 삽입하고, 이미 있으면 총액만 원자적으로 증가
+    cursor.execute(adapt_sql(engine, '''
+        INSERT INTO students (student_number, phone, name, booths, total_price)
+        VALUES (?, ?, ?, '[]', ?)
+        ON CONFLICT (student_number) DO NOTHING
+        RETURNING id
+    '''), (order['student_number'], order['phone'], order['name'], order['total_price']))
+    inserted = cursor.fetchone()
+    if inserted:
+        student_id, merged = inserted['id'], False
+    else:
+        cursor.execute(adapt_sql(engine, 'UPDATE students SET total_price = total_price + ?, updated_at = CURRENT_TIMESTAMP, version = version + 1 WHERE student_number = ? RETURNING id'), (order['total_price'], order['student_number']))
+        existing = cursor.fetchone()
+        if not existing:
+            return None, True
+        student_id, merged = existing['id'], True
+
+    # 병합 로직: 동일 번호의 부스가 있으면 remaining 증가(플래그 갱신), 없으면 추가
+    execute_many(cursor, engine, UPSERT_BOOTH_SQL, [booth_params(student_id, pb) for pb in order['booths']])
+    record_ledger(cursor, engine, order_ledger_events(student_id, order))
+    return student_id, merged
+
+
+def apply_student_orders(cursor, engine, orders):
+    """학번별로 이미 병합된 주문 목록을 여러 행 upsert로 적용합니다 (커밋은 호출자).
+    반환: {student_number: (student_id, merged)}"""
+    numbers = [o['student_number'] for o in orders]
+    existing = {row['student_number'] for row in select_in(cursor, engine, 'SELECT student_number FROM students WHERE student_number IN ({marks})', numbers)}
+    execute_many(cursor, engine, '''
+        INSERT INTO students (student_number, phone, name, booths, total_price)
+        VALUES (?, ?, ?, '[]', ?)
+        ON CONFLICT (student_number) DO UPDATE SET
+            total_price = students.total_price + excluded.total_price,
+            updated_at = CURRENT_TIMESTAMP,
+            version = students.version + 1
+    ''', [(o['student_number'], o['phone'], o['name'], o['total_price']) for o in orders])
+    ids = {row['student_number']: row['id'] for row in select_in(cursor, engine, 'SELECT id, student_number FROM students WHERE student_number IN ({marks})', numbers)}
+    execute_many(cursor, engine, UPSERT_BOOTH_SQL,
+                 [booth_params(ids[o['student_number']], pb) for o in orders for pb in o['booths']])
+    record_ledger(cursor, engine, [e for o in orders for e in order_ledger_events(ids[o['student_number']], o)])
+    return {sn: (ids[sn], sn in existing) for sn in numbers}
+
+
+def apply_journal_orders(cursor, engine, orders):
+    """쓰기 지연 저널의 주문(저널 순서)을 학번별로 병합해 적용합니다 (save-students/batch와 같은 규칙)."""
+    merged = {}
+    for order in orders:
+        sn = order['student_number']
+        if sn in merged:
+            merge_booth_lists(merged[sn]['booths'], order['booths'])
+            merged[sn]['total_price'] += order['total_price']
+        else:
+            merged[sn] = order
+    return apply_student_orders(cursor, engine, list(merged.values()))
+
 
 # 학생 데이터 저장 API
 @app.route('/api/save-student', methods=['POST'])
+@idempotent
 def save_student():
     try:
-        data = request.json
-        phone = data.get('phone')
-        name = data.get('name')
-        student_number = data.get('student_number')
-        booths = data.get('booths')
-        total_price = data.get('totalPrice')
-
-        # 입력 검증
-        import re
-        if not phone or not name or not booths or len(booths) == 0 or not student_number:
+        try:
+            order = validate_student_order(request.json)
+        except OrderError as e:
             return jsonify({
                 'success': False,
-                'message': '필수 정보가 누락되었습니다.'
+                'message': str(e)
             }), 400
+        order['actor'] = current_actor('kiosk')
 
-        # 학번(5자리) 검증
-        if not re.match(r'^\d{5}$', str(student_number)):
+        if write_behind is not None:
+            # 쓰기 지연 모드: 저널에 기록(fsync)한 뒤 바로 응답, DB 반영은 백그라운드에서
+            ticket = write_behind.append(order)
+            print(f'학생 데이터 접수: 티켓 {ticket}, 학번: {order["student_number"]}, 금액: {order["total_price"]}')
             return jsonify({
-                'success': False,
-                'message': '학번은 숫자 5자리여야 합니다.'
-            }), 400
-
-        # 부스별 초기 남은 횟수 계산
-        def parse_initial_uses(booth):
-            # booth는 {number, name, price}
-            name = booth.get('name','')
-            # 찾는 패턴: 3회, 2회, 1회 또는 [3회], [1인]
-            m = re.search(r"(\d+)회|\[(\d+)회\]|(\d+)인|\[(\d+)인\]", name)
-            if m:
-                for g in m.groups():
-                    if g and g.isdigit():
-                        return int(g)
-            # 특별 케이스: PASS 명칭에 따라 기본값 변경(없으면 1)
-            if 'SUPER' in name.upper() or 'SUPERPASS' in name.upper():
-                return 1
-            return 1
-
-        # 보관할 부스 정보에 remaining 추가
-        processed_booths = []
-        for b in booths:
-            remaining = parse_initial_uses(b)
-            pb = {
-                'number': b.get('number'),
-                'name': b.get('name'),
-                'price': b.get('price'),
-                'remaining': remaining
-            }
-            # 프론트엔드에서 전달할 수 있는 추가 플래그 보존 (isGolden, derived 등)
-            for optional_key in ('isGolden','derived','derivedFrom','goldenFrom'):
-                if optional_key in b:
-                    pb[optional_key] = b.get(optional_key)
-            processed_booths.append(pb)
-
-        # 부스 정보를 JSON 문자열로 변환
-        import json
-        booths_json = json.dumps(processed_booths, ensure_ascii=False)
-
-        # 총액 보장
-        if total_price is None:
-            try:
-                total_price = sum(int(b.get('price', 0)) for b in processed_booths)
-            except Exception:
-                total_price = 0
+                'success': True,
+                'queued': True,
+                'message': '접수되었습니다. 잠시 후 티켓에 반영됩니다.',
+                'ticket': ticket,
+                'total_price': order['total_price']
+            }), 202
 
         # 데이터베이스에 저장 또는 병합 (같은 학번의 기존 레코드가 있으면 remaining만 증가)
         conn, engine = get_conn()
-        # 최근 레코드를 찾아 병합
-        if engine == 'sqlite':
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            cursor.execute('SELECT id, booths, total_price FROM students WHERE student_number = ? ORDER BY created_at DESC LIMIT 1', (student_number,))
-            existing = cursor.fetchone()
-        else:
-            import psycopg2.extras
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cursor.execute('SELECT id, booths, total_price FROM students WHERE student_number = %s ORDER BY created_at DESC LIMIT 1', (student_number,))
-            existing = cursor.fetchone()
-
-        if existing:
-            existing_id = existing['id'] if engine != 'sqlite' else existing[0]
-            existing_booths = []
-            try:
-                existing_booths = json.loads(existing['booths'] if engine != 'sqlite' else existing[1])
-            except Exception:
-                existing_booths = []
-            existing_total = (existing['total_price'] if engine != 'sqlite' else existing[2]) or 0
-
-            # 병합 로직: 동일 번호의 부스가 있으면 remaining 증가, 없으면 추가
-            for pb in processed_booths:
-                matched = False
-                for eb in existing_booths:
-                    if eb.get('number') == pb.get('number'):
-                        eb['remaining'] = int(eb.get('remaining', 0)) + int(pb.get('remaining', 0))
-                        # incoming에 황금/파생 플래그가 있으면 보존/갱신
-                        for k in ('isGolden','goldenFrom','derived','derivedFrom'):
-                            if k in pb:
-                                eb[k] = pb[k]
-                        matched = True
-                        break
-                if not matched:
-                    existing_booths.append(pb)
-
-            new_total = existing_total + total_price
-            booths_json = json.dumps(existing_booths, ensure_ascii=False)
-            if engine == 'sqlite':
-                cursor.execute('UPDATE students SET booths = ?, total_price = ?, created_at = CURRENT_TIMESTAMP WHERE id = ?', (booths_json, new_total, existing_id))
-            else:
-                cursor.execute('UPDATE students SET booths = %s, total_price = %s, created_at = CURRENT_TIMESTAMP WHERE id = %s', (booths_json, new_total, existing_id))
-            conn.commit()
-            student_id = existing_id
+        cursor = dict_cursor(conn, engine)
+        student_id, merged = apply_student_order(cursor, engine, order)
+        if student_id is None:
+            conn.rollback()
             conn.close()
+            return jsonify({'success': False, 'message': '동시에 변경된 레코드입니다. 다시 시도해주세요.'}), 409
+        publish_ticket_changes(cursor, engine, [order['student_number']])
+        conn.commit()
+        conn.close()
+        ticket_cache.invalidate(order['student_number'])
 
-            print(f'학생 데이터 업데이트 완료: ID {student_id}, 학번: {student_number}, 추가 금액: {total_price}')
+        if merged:
+            print(f'학생 데이터 업데이트 완료: ID {student_id}, 학번: {order["student_number"]}, 추가 금액: {order["total_price"]}')
             return jsonify({
                 'success': True,
                 'message': '기존 기록에 횟수가 추가되었습니다.',
-                'id': student_id
+                'id': student_id,
+                'total_price': order['total_price']
             })
-        else:
-            if engine == 'sqlite':
-                cursor.execute('''
-                    INSERT INTO students (student_number, phone, name, booths, total_price)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (student_number, phone, name, booths_json, total_price))
-                conn.commit()
-                student_id = cursor.lastrowid
-            else:
-                cursor.execute('''
-                    INSERT INTO students (student_number, phone, name, booths, total_price)
-                    VALUES (%s, %s, %s, %s, %s) RETURNING id
-                ''', (student_number, phone, name, booths_json, total_price))
-                student_id = cursor.fetchone()['id']
-                conn.commit()
-            conn.close()
 
-            print(f'학생 데이터 저장 완료: ID {student_id}, 학번: {student_number}, 이름: {name}, 전화번호: {phone}')
-            
-            return jsonify({
-                'success': True,
-                'message': '데이터가 성공적으로 저장되었습니다.',
-                'id': student_id
-            })
+        print(f'학생 데이터 저장 완료: ID {student_id}, 학번: {order["student_number"]}, 이름: {order["name"]}, 전화번호: {order["phone"]}')
+
+        return jsonify({
+            'success': True,
+            'message': '데이터가 성공적으로 저장되었습니다.',
+            'id': student_id,
+            'total_price': order['total_price']
+        })
 
     except Exception as e:
         print(f'데이터 저장 오류: {str(e)}')
@@ -267,6 +1575,208 @@ def save_student():
             'message': f'데이터 저장 중 오류가 발생했습니다: {str(e)}'
         }), 500
 
+# 쓰기 지연 저널 상태 (대기 건수, 가장 오래된 대기 주문의 지연 시간). ?ticket= 으로 개별 접수 건 조회
+@app.route('/api/write-behind/status', methods=['GET'])
+@require_admin
+def write_behind_status():
+    try:
+        if write_behind is None:
+            return jsonify({'success': True, 'enabled': False})
+        ticket = request.args.get('ticket')
+        if ticket:
+            entry = write_behind.lookup(ticket)
+            if entry is None:
+                return jsonify({'success': False, 'message': '해당 티켓을 찾을 수 없습니다.'}), 404
+            return jsonify({'success': True, **entry})
+        return jsonify({'success': True, **write_behind.status()})
+    except Exception as e:
+        print(f'쓰기 지연 저널 상태 조회 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'상태 조회 중 오류가 발생했습니다: {str(e)}'}), 500
+
+# 학생 데이터 일괄 저장 API (키오스크 재연결/오픈 러시 시 밀린 주문 한 번에 전송)
+@app.route('/api/save-students/batch', methods=['POST'])
+@idempotent
+def save_students_batch():
+    try:
+        data = request.json
+        items = data.get('students') if isinstance(data, dict) else data
+        if not isinstance(items, list) or len(items) == 0:
+            return jsonify({'success': False, 'message': '저장할 학생 목록(students)이 필요합니다.'}), 400
+        if len(items) > SAVE_BATCH_MAX:
+            return jsonify({'success': False, 'message': f'한 번에 최대 {SAVE_BATCH_MAX}건까지 저장할 수 있습니다.'}), 400
+
+        # 전체 검증 후 같은 학번끼리 병합 (병합 규칙은 save-student와 동일)
+        results = [None] * len(items)
+        actor = current_actor('kiosk')
+        orders = {}    # student_number -> 병합된 주문
+        members = {}   # student_number -> [요청 내 index]
+        for i, item in enumerate(items):
+            try:
+                order = validate_student_order(item)
+            except OrderError as e:
+                results[i] = {'index': i, 'success': False, 'message': str(e)}
+                continue
+            order['actor'] = actor
+            sn = order['student_number']
+            if sn in orders:
+                merge_booth_lists(orders[sn]['booths'], order['booths'])
+                orders[sn]['total_price'] += order['total_price']
+            else:
+                orders[sn] = order
+            members.setdefault(sn, []).append(i)
+
+        if orders:
+            # 하나의 트랜잭션으로 적용
+            conn, engine = get_conn()
+            cursor = dict_cursor(conn, engine)
+            applied = apply_student_orders(cursor, engine, list(orders.values()))
+            publish_ticket_changes(cursor, engine, list(applied))
+            conn.commit()
+            conn.close()
+            for sn, (student_id, merged) in applied.items():
+                ticket_cache.invalidate(sn)
+                for pos, i in enumerate(members[sn]):
+                    item_merged = merged or pos > 0
+                    results[i] = {
+                        'index': i,
+                        'success': True,
+                        'id': student_id,
+                        'student_number': sn,
+                        'merged': item_merged,
+                        'message': '기존 기록에 횟수가 추가되었습니다.' if item_merged else '데이터가 성공적으로 저장되었습니다.'
+                    }
+
+        saved = sum(1 for r in results if r['success'])
+        print(f'일괄 저장 완료: {len(items)}건 중 {saved}건 저장 (학번 {len(orders)}개)')
+        return jsonify({
+            'success': True,
+            'saved': saved,
+            'failed': len(items) - saved,
+            'results': results
+        })
+
+    except Exception as e:
+        print(f'일괄 저장 오류: {str(e)}')
+        return jsonify({
+            'success': False,
+            'message': f'일괄 저장 중 오류가 발생했습니다: {str(e)}'
+        }), 500
+
+
+# --- 목록 페이지네이션 ---
+STUDENTS_PAGE_DEFAULT = 50
+STUDENTS_PAGE_MAX = 500
+STREAM_CHUNK_SIZE = 500
+
+
+def encode_page_cursor(row):
+    """마지막 행의 (created_at, id)를 불투명한 커서 문자열로 만듭니다."""
+    created_at = row['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat(sep=' ')
+    raw = json.dumps([created_at, row['id']]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_page_cursor(value):
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        created_at, last_id = json.loads(raw)
+        return str(created_at), int(last_id)
+    except Exception:
+        raise ValueError('잘못된 cursor 값입니다.')
+
+
+def keyset_query(after):
+    """created_at DESC, id DESC 순서로 after(created_at, id) 다음 행부터 조회하는 쿼리."""
+    if after:
+        return 'SELECT * FROM students WHERE (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC', list(after)
+    return 'SELECT * FROM students ORDER BY created_at DESC, id DESC', []
+
+
+def stream_students_ndjson(after):
+    """서버 측 커서에서 STREAM_CHUNK_SIZE 단위로 읽어 한 줄에 한 학생씩 내보냅니다.
+    연결은 스트림이 끝날 때(또는 클라이언트가 끊을 때) 반납합니다."""
+    conn, engine = get_read_conn(track_request=False)
+    try:
+        query, params = keyset_query(after)
+        if engine == 'sqlite':
+            cursor = dict_cursor(conn, engine)
+        else:
+            # 이름 있는 커서 = postgres 서버 측 커서 (전체 결과를 클라이언트 메모리에 올리지 않음)
+            cursor = conn.cursor(name='students_stream', cursor_factory=booth_db.psycopg2_extras.RealDictCursor)
+            cursor.itersize = STREAM_CHUNK_SIZE
+        cursor.execute(adapt_sql(engine, query), params)
+        booth_cursor = dict_cursor(conn, engine)
+        while True:
+            rows = cursor.fetchmany(STREAM_CHUNK_SIZE)
+            if not rows:
+                break
+            booths = load_booths(booth_cursor, engine, [row['id'] for row in rows])
+            for row in rows:
+                yield json.dumps(student_row_to_dict(row, booths[row['id']]), ensure_ascii=False, default=str) + '\n'
+    finally:
+        conn.close()
+
+
+def record_etag(rows):
+    """레코드 (id, version) 목록으로 만든 ETag. 부스/본문을 읽거나 직렬화하지 않고 비교할 수 있습니다."""
+    return '"v' + '-'.join(f"{row['id']}.{row['version']}" for row in rows) + '"'
+
+
+def etag_matches(etag):
+    return request.if_none_match.contains_weak(etag.strip('"'))
+
+
+def not_modified(etag):
+    return Response(status=304, headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+
+TICKET_QUERY = 'SELECT * FROM students WHERE student_number = ? ORDER BY created_at DESC'
+
+
+def load_ticket(student_number, track_request=True, if_none_match=None, replica=True):
+    """공개 학번 조회 결과를 (ETag, 학생 목록 JSON 배열 문자열)로 반환합니다.
+    캐시에 없으면 DB에서 읽어 캐시에 넣습니다 (캐시된 값은 최대 SSE_POLL_INTERVAL만큼 오래됐을 수 있음).
+    if_none_match가 현재 ETag와 같으면 본문 없이 (ETag, None).
+    replica=False면 캐시와 복제본을 거치지 않고 주 DB에서 읽습니다 (변경 알림 직후나 스트림 시작처럼 최신 값이 필요할 때)."""
+    cached = ticket_cache.get(student_number) if replica else None
+    if cached is not None and '\n' in cached:
+        etag, body = cached.split('\n', 1)
+        return etag, body
+    conn, engine = get_read_conn(track_request) if replica else get_conn(track_request)
+    # 뒤처진 복제본에서 읽은 값은 캐시하지 않음 (무효화 직후 옛 값이 TTL 동안 남지 않도록)
+    cacheable = conn.role == 'primary' or read_replica.lag == 0
+    try:
+        cursor = dict_cursor(conn, engine)
+        if if_none_match:
+            # 버전만 먼저 확인: 바뀌지 않았으면 부스 조회와 직렬화를 생략
+            cursor.execute(adapt_sql(engine, 'SELECT id, version FROM students WHERE student_number = ? ORDER BY created_at DESC'), (student_number,))
+            etag = record_etag(cursor.fetchall())
+            if if_none_match(etag):
+                return etag, None
+        cursor.execute(adapt_sql(engine, TICKET_QUERY), (student_number,))
+        rows = cursor.fetchall()
+        booths = load_booths(cursor, engine, [row['id'] for row in rows])
+    finally:
+        conn.close()
+    return render_ticket(student_number, rows, booths, cacheable)
+
+
+def render_ticket(student_number, rows, booths, cacheable=True):
+    """학번 조회 행과 {student_id: [booth, ...]}로 (ETag, JSON 배열 문자열)을 만들고 캐시에 넣습니다."""
+    # 공개 조회(마이티켓)에만 QR 이용권 토큰을 붙임 (관리자 목록/스트림/내보내기에는 없음)
+    students = [dict(student_row_to_dict(row, booths[row['id']]), qr_token=qr_token(row['id'], row['version'], booths[row['id']]))
+                for row in rows]
+    etag = record_etag(rows)
+    body = flask_json.dumps(students)
+    if cacheable:
+        ticket_cache.set(student_number, etag + '\n' + body)
+        if ticket_cache.backend is not None:
+            ticket_broker.watch_cache()
+    return etag, body
+
+
 # 학생 목록 조회 API
 @app.route('/api/students', methods=['GET'])
 def get_students():
@@ -274,153 +1784,496 @@ def get_students():
         student_number = request.args.get('student_number')
         search = request.args.get('search')
 
-        conn, engine = get_conn()
-        students = []
-        import json
-        if engine == 'sqlite':
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            if student_number:
-                # public lookup by student_number does not require admin
-                cursor.execute('SELECT * FROM students WHERE student_number = ? ORDER BY created_at DESC', (student_number,))
-            elif search:
-                # searching by name or listing requires admin
-                # enforce admin auth
-                admin_check = request.headers.get('X-ADMIN-PASSWORD') or request.args.get('admin_password')
-                if ADMIN_PASSWORD and admin_check != ADMIN_PASSWORD:
-                    conn.close()
-                    return jsonify({'success': False, 'message': '관리자 권한이 필요합니다.'}), 401
-                like = f"%{search}%"
-                cursor.execute('SELECT * FROM students WHERE name LIKE ? OR student_number LIKE ? ORDER BY created_at DESC', (like, like))
-            else:
-                # listing all - admin only
-                admin_check = request.headers.get('X-ADMIN-PASSWORD') or request.args.get('admin_password')
-                if ADMIN_PASSWORD and admin_check != ADMIN_PASSWORD:
-                    conn.close()
-                    return jsonify({'success': False, 'message': '관리자 권한이 필요합니다.'}), 401
-                cursor.execute('SELECT * FROM students ORDER BY created_at DESC')
-            rows = cursor.fetchall()
-            for row in rows:
-                booths = []
-                try:
-                    booths = json.loads(row['booths'])
-                except Exception:
-                    booths = []
-                student = {
-                    'id': row['id'],
-                    'student_number': row['student_number'],
-                    'phone': row['phone'],
-                    'name': row['name'],
-                    'booths': booths,
-                    'total_price': row['total_price'],
-                    'created_at': row['created_at']
-                }
-                students.append(student)
-            conn.close()
+        if not student_number:
+            # searching by name or listing all - admin only
+            admin_check = request.headers.get('X-ADMIN-PASSWORD') or request.args.get('admin_password')
+            if ADMIN_PASSWORD and admin_check != ADMIN_PASSWORD:
+                return jsonify({'success': False, 'message': '관리자 권한이 필요합니다.'}), 401
+
+        # 전체 목록: cursor(created_at, id) 기반 키셋 페이지네이션 / format=ndjson이면 스트리밍
+        after = None
+        limit = STUDENTS_PAGE_DEFAULT
+        if not student_number and not search:
+            try:
+                if request.args.get('cursor'):
+                    after = decode_page_cursor(request.args['cursor'])
+                limit = max(1, min(int(request.args.get('limit', STUDENTS_PAGE_DEFAULT)), STUDENTS_PAGE_MAX))
+            except ValueError as e:
+                return jsonify({'success': False, 'message': f'잘못된 페이지 요청입니다: {e}'}), 400
+
+        if student_number:
+            # public lookup by student_number does not require admin
+            etag, body = load_ticket(student_number, if_none_match=etag_matches if request.if_none_match else None)
+            if body is None or etag_matches(etag):
+                return not_modified(etag)
+            return app.response_class('{"success": true, "data": ' + body + '}', mimetype='application/json',
+                                      headers={'ETag': etag, 'Cache-Control': 'no-cache'})
+
+        if not student_number and not search and request.args.get('format') == 'ndjson':
+            return Response(stream_with_context(stream_students_ndjson(after)),
+                            mimetype='application/x-ndjson')
+
+        conn, engine = get_read_conn()
+        cursor = dict_cursor(conn, engine)
+        next_cursor = None
+        if search:
+            try:
+                limit = max(1, min(int(request.args.get('limit', SEARCH_LIMIT_DEFAULT)), SEARCH_LIMIT_MAX))
+            except ValueError:
+                limit = SEARCH_LIMIT_DEFAULT
+            rows = search_students(cursor, engine, search.strip(), limit)
         else:
-            import psycopg2.extras
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            if student_number:
-                cursor.execute('SELECT * FROM students WHERE student_number = %s ORDER BY created_at DESC', (student_number,))
-            elif search:
-                like = f"%{search}%"
-                cursor.execute('SELECT * FROM students WHERE name LIKE %s OR student_number LIKE %s ORDER BY created_at DESC', (like, like))
-            else:
-                cursor.execute('SELECT * FROM students ORDER BY created_at DESC')
+            query, params = keyset_query(after)
+            # 다음 페이지 존재 여부 확인을 위해 1개 더 조회
+            cursor.execute(adapt_sql(engine, query + ' LIMIT ?'), params + [limit + 1])
             rows = cursor.fetchall()
-            for row in rows:
-                booths = []
-                try:
-                    if isinstance(row['booths'], str):
-                        booths = json.loads(row['booths'])
-                    else:
-                        booths = row['booths']
-                except Exception:
-                    booths = []
-                student = {
-                    'id': row['id'],
-                    'student_number': row.get('student_number'),
-                    'phone': row.get('phone'),
-                    'name': row.get('name'),
-                    'booths': booths,
-                    'total_price': row.get('total_price'),
-                    'created_at': row.get('created_at')
-                }
-                students.append(student)
-            conn.close()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_page_cursor(rows[-1])
+        booths = load_booths(cursor, engine, [row['id'] for row in rows])
+        students = [student_row_to_dict(row, booths[row['id']]) for row in rows]
+        conn.close()
 
-        return jsonify({
+        result = {
             'success': True,
             'data': students
-        })
+        }
+        if not search:
+            result['next_cursor'] = next_cursor
+        return jsonify(result)
 
     except Exception as e:
         print(f'데이터 조회 오류: {str(e)}')
         return jsonify({ 'success': False, 'message': f'데이터 조회 중 오류가 발생했습니다: {str(e)}' }), 500
 
-# 단일 학생 레코드 조회
-@app.route('/api/students/<int:student_id>', methods=['GET'])
+# 부스 카탈로그 조회 (키오스크가 부스 카드/패스 규칙을 그릴 때 사용)
+@app.route('/api/booths', methods=['GET'])
+def get_booths():
+    return jsonify({'success': True, 'data': booth_catalog.as_list()})
+
+# 부스 카탈로그 다시 읽기 (이 워커는 즉시, 다른 워커는 파일 수정 시각 확인 시 반영)
+@app.route('/api/booths/reload', methods=['POST'])
 @require_admin
-def get_student(student_id):
+def reload_booths():
+    try:
+        count = booth_catalog.load()
+    except FileNotFoundError:
+        return jsonify({'success': False, 'message': f'부스 카탈로그 파일이 없습니다: {BOOTH_CATALOG_PATH}'}), 404
+    except (ValueError, TypeError) as e:
+        return jsonify({'success': False, 'message': f'부스 카탈로그가 올바르지 않아 이전 카탈로그를 유지합니다: {e}'}), 400
+    print(f'부스 카탈로그 다시 읽음: {count}개')
+    return jsonify({'success': True, 'message': f'부스 {count}개를 불러왔습니다.', 'data': booth_catalog.as_list()})
+
+# 관리자 대시보드 집계 (부스 수에만 비례, 학생 수와 무관)
+@app.route('/api/stats', methods=['GET'])
+@require_admin
+def get_stats():
+    try:
+        conn, engine = get_read_conn()
+        cursor = dict_cursor(conn, engine)
+        # since=YYYY-MM-DD HH:MM 이후의 분 단위 신규 등록 수만 (없으면 전체)
+        stats = read_stats(cursor, engine, request.args.get('since'))
+        conn.close()
+        return jsonify({'success': True, 'data': stats})
+    except Exception as e:
+        print(f'집계 조회 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'집계 조회 중 오류가 발생했습니다: {str(e)}'}), 500
+
+# 대시보드 집계 재계산
+@app.route('/api/stats/rebuild', methods=['POST'])
+@require_admin
+def rebuild_stats_endpoint():
     try:
         conn, engine = get_conn()
+        rebuild_stats(conn, conn.cursor(), engine)
+        cursor = dict_cursor(conn, engine)
+        stats = read_stats(cursor, engine)
+        conn.close()
+        return jsonify({'success': True, 'message': '집계를 다시 계산했습니다.', 'data': stats})
+    except Exception as e:
+        print(f'집계 재계산 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'집계 재계산 중 오류가 발생했습니다: {str(e)}'}), 500
+
+# 원장 조회 (관리자): booth, student_id, kind, minutes(최근 N분) 조건. 예) ?booth=3&kind=redeem&minutes=10
+@app.route('/api/ledger', methods=['GET'])
+@require_admin
+def get_ledger():
+    try:
+        clauses, params = [], []
+        for arg, column in (('booth', 'booth_number'), ('student_id', 'student_id')):
+            value = request.args.get(arg)
+            if value is not None:
+                if int_or_none(value) is None:
+                    return jsonify({'success': False, 'message': f'{arg}는 정수여야 합니다.'}), 400
+                clauses.append(f'{column} = ?')
+                params.append(int(value))
+        kind = request.args.get('kind')
+        if kind:
+            clauses.append('kind = ?')
+            params.append(kind)
+        try:
+            minutes = float(request.args.get('minutes') or 0)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'minutes는 숫자여야 합니다.'}), 400
+        if minutes > 0:
+            clauses.append('created_at >= ?')
+            params.append(time.time() - minutes * 60)
+        limit = max(1, min(int_or_none(request.args.get('limit')) or LEDGER_LIMIT_DEFAULT, LEDGER_LIMIT_MAX))
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+
+        conn, engine = get_read_conn()
+        cursor = dict_cursor(conn, engine)
+        cursor.execute(adapt_sql(engine, f'SELECT COUNT(*) AS events, COALESCE(SUM(delta), 0) AS delta, COALESCE(SUM(amount), 0) AS amount FROM booth_ledger{where}'), params)
+        summary = dict(cursor.fetchone())
+        cursor.execute(adapt_sql(engine, f'SELECT * FROM booth_ledger{where} ORDER BY created_at DESC, id DESC LIMIT ?'), params + [limit])
+        events = [ledger_row_to_dict(row) for row in cursor.fetchall()]
+        conn.close()
+        return jsonify({'success': True, 'summary': summary, 'data': events})
+    except Exception as e:
+        print(f'원장 조회 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'원장 조회 중 오류가 발생했습니다: {str(e)}'}), 500
+
+# 학생 한 명의 원장 재생 (관리자): 전체 이벤트와 원장 기준 잔액, 스냅샷과의 차이
+@app.route('/api/students/<int:student_id>/ledger', methods=['GET'])
+@require_admin
+def get_student_ledger(student_id):
+    try:
+        conn, engine = get_read_conn()
+        cursor = dict_cursor(conn, engine)
+        cursor.execute(adapt_sql(engine, 'SELECT * FROM booth_ledger WHERE student_id = ? ORDER BY id'), (student_id,))
+        events = [ledger_row_to_dict(row) for row in cursor.fetchall()]
+        if not events:
+            conn.close()
+            return jsonify({'success': False, 'message': '원장 기록이 없습니다.'}), 404
+        diffs = replay_ledger(conn, cursor, engine, [student_id], apply=False)
+        conn.close()
+        balances = {}
+        total = 0
+        for e in events:
+            total += e['amount']
+            if e['booth_number'] is not None:
+                b = balances.setdefault(e['booth_number'], {'booth_number': e['booth_number'], 'remaining': 0, 'issued': 0})
+                b['remaining'] += e['delta']
+                if e['kind'] in LEDGER_ISSUE_KINDS:
+                    b['issued'] += e['delta']
+        return jsonify({
+            'success': True,
+            'data': events,
+            'balances': {'booths': sorted(balances.values(), key=lambda b: b['booth_number']), 'total_price': total},
+            'consistent': not diffs,
+            'differences': diffs,
+        })
+    except Exception as e:
+        print(f'원장 재생 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'원장 재생 중 오류가 발생했습니다: {str(e)}'}), 500
+
+# --- 정산용 내보내기 (CSV / XLSX) ---
+# 학생의 부스 이용권 한 건당 한 줄. 서버 측 커서에서 EXPORT_CHUNK_SIZE씩 읽어 바로 내보내므로
+# 레코드 수와 관계없이 메모리 사용량이 일정합니다. XLSX는 xlsxwriter(requirements.txt)의 constant_memory 모드로 만듭니다.
+# XLSX는 zip이라 CSV처럼 바로 흘려보낼 수 없어 임시 파일에 끝까지 만든 뒤 보냅니다. 메모리는 CSV와 비슷하지만
+#   - 첫 바이트까지 전체를 만드는 시간이 걸림 (이용권 10만 줄 기준 약 12초, CSV는 수 ms)
+#   - 임시 디렉터리(TMPDIR)에 시트 XML과 완성 파일이 함께 생김 (10만 줄 기준 약 100MB, 한 줄당 약 1KB)
+#   - 만드는 동안 요청 스레드 하나와 DB 연결 하나를 씀
+# 큰 범위는 CSV를 쓰거나 from/to로 나눠 받으세요.
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = (
+    ('student_id', '학생 ID'),
+    ('student_number', '학번'),
+    ('name', '이름'),
+    ('phone', '전화번호'),
+    ('created_at', '등록 시각(UTC)'),
+    ('total_price', '학생 총 결제액'),
+    ('booth_number', '부스 번호'),
+    ('booth_name', '부스 이름'),
+    ('price', '부스 가격'),
+    ('issued', '발급 횟수'),
+    ('remaining', '남은 횟수'),
+    ('used', '사용 횟수'),
+    ('is_golden', '황금'),
+    ('golden_from', '황금 적용 패스'),
+    ('derived', '패스 포함'),
+    ('derived_from', '포함한 패스'),
+)
+EXPORT_QUERY = '''
+    SELECT s.id AS student_id, s.student_number, s.name, s.phone, s.created_at, s.total_price,
+           b.booth_number, b.name AS booth_name, b.price, b.issued, b.remaining,
+           b.is_golden, b.golden_from, b.derived, b.derived_from
+    FROM students s LEFT JOIN student_booths b ON b.student_id = s.id
+    {where}
+    ORDER BY s.id, b.booth_number
+'''
+EXPORT_SELECTED = [key for key, _ in EXPORT_COLUMNS if key != 'used']
+
+
+def parse_export_time(value):
+    """from/to 값(YYYY-MM-DD 또는 ISO 시각)을 DB의 created_at 형식으로 바꿉니다. 잘못되면 ValueError."""
+    if not value:
+        return None
+    return datetime.fromisoformat(value.strip().replace('Z', '')).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def export_filter(start, end):
+    """등록 시각 범위 조건 (from 이상, to 미만)."""
+    clauses, params = [], []
+    if start:
+        clauses.append('s.created_at >= ?')
+        params.append(start)
+    if end:
+        clauses.append('s.created_at < ?')
+        params.append(end)
+    return ('WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def export_row(row):
+    item = dict(zip(EXPORT_SELECTED, row))
+    if item['issued'] is not None and item['remaining'] is not None:
+        item['used'] = item['issued'] - item['remaining']
+    for key in ('is_golden', 'derived'):
+        item[key] = 'Y' if item[key] else ''
+    if item['created_at'] is not None:
+        item['created_at'] = str(item['created_at'])
+    return [item.get(key) for key, _ in EXPORT_COLUMNS]
+
+
+def iter_export_rows(where, params):
+    """내보낼 행을 EXPORT_CHUNK_SIZE 단위 목록으로 생성합니다. 연결은 끝날 때(또는 클라이언트가 끊을 때) 반납합니다."""
+    conn, engine = get_read_conn(track_request=False)
+    try:
         if engine == 'sqlite':
-            conn.row_factory = sqlite3.Row
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM students WHERE id = ?', (student_id,))
-            row = cursor.fetchone()
-            conn.close()
-            if not row:
-                return jsonify({ 'success': False, 'message': '학생을 찾을 수 없습니다.' }), 404
-            import json
-            booths = []
-            try:
-                booths = json.loads(row['booths'])
-            except Exception:
-                booths = []
-            student = {
-                'id': row['id'],
-                'student_number': row['student_number'],
-                'phone': row['phone'],
-                'name': row['name'],
-                'booths': booths,
-                'total_price': row['total_price'],
-                'created_at': row['created_at']
-            }
-            return jsonify({ 'success': True, 'data': student })
         else:
-            import psycopg2.extras, json
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cursor.execute('SELECT * FROM students WHERE id = %s', (student_id,))
-            row = cursor.fetchone()
-            conn.close()
-            if not row:
-                return jsonify({ 'success': False, 'message': '학생을 찾을 수 없습니다.' }), 404
-            booths = []
+            # 이름 있는 커서 = postgres 서버 측 커서
+            cursor = conn.cursor(name='students_export')
+            cursor.itersize = EXPORT_CHUNK_SIZE
+        cursor.execute(adapt_sql(engine, EXPORT_QUERY.format(where=where)), params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+            if not rows:
+                break
+            yield [export_row(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def stream_export_csv(where, params):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    buf.write('\ufeff')   # 엑셀에서 한글이 깨지지 않도록 BOM
+    writer.writerow([label for _, label in EXPORT_COLUMNS])
+    yield buf.getvalue()
+    for chunk in iter_export_rows(where, params):
+        buf.seek(0)
+        buf.truncate()
+        writer.writerows(chunk)
+        yield buf.getvalue()
+
+
+def build_export_xlsx(where, params):
+    """XLSX 파일을 임시 파일로 만들고 경로를 반환합니다 (zip 형식이라 끝까지 쓴 뒤에 보낼 수 있음, 비용은 위 설명 참고)."""
+    import xlsxwriter   # 내보내기에서만 쓰므로 워커 시작 시 import하지 않음
+    fd, path = tempfile.mkstemp(prefix='booth_export_', suffix='.xlsx')
+    os.close(fd)
+    try:
+        workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        sheet = workbook.add_worksheet('students')
+        sheet.write_row(0, 0, [label for _, label in EXPORT_COLUMNS])
+        row_index = 1
+        for chunk in iter_export_rows(where, params):
+            for values in chunk:
+                sheet.write_row(row_index, 0, values)
+                row_index += 1
+        workbook.close()
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def stream_file_and_remove(path, chunk_size=64 * 1024):
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                yield data
+    finally:
+        os.remove(path)
+
+
+# 정산용 전체 내보내기 (관리자). format=csv(기본)|xlsx, from/to=등록 시각 범위 (from 이상, to 미만, UTC)
+@app.route('/api/export', methods=['GET'])
+@require_admin
+def export_students():
+    try:
+        fmt = request.args.get('format', 'csv')
+        if fmt not in ('csv', 'xlsx'):
+            return jsonify({'success': False, 'message': 'format은 csv 또는 xlsx여야 합니다.'}), 400
+        try:
+            start = parse_export_time(request.args.get('from'))
+            end = parse_export_time(request.args.get('to'))
+        except ValueError:
+            return jsonify({'success': False, 'message': '시각 형식이 올바르지 않습니다. (예: 2025-05-01 또는 2025-05-01T09:00)'}), 400
+        where, params = export_filter(start, end)
+        filename = 'students-' + datetime.now().strftime('%Y%m%d-%H%M')
+
+        if fmt == 'xlsx':
             try:
-                if isinstance(row['booths'], str):
-                    booths = json.loads(row['booths'])
-                else:
-                    booths = row['booths']
-            except Exception:
-                booths = []
-            student = {
-                'id': row['id'],
-                'student_number': row.get('student_number'),
-                'phone': row.get('phone'),
-                'name': row.get('name'),
-                'booths': booths,
-                'total_price': row.get('total_price'),
-                'created_at': row.get('created_at')
-            }
-            return jsonify({ 'success': True, 'data': student })
+                import xlsxwriter  # noqa: F401
+            except ImportError:
+                return jsonify({'success': False, 'message': 'xlsxwriter가 설치되지 않았습니다 (pip install -r requirements.txt). format=csv를 사용하세요.'}), 501
+            path = build_export_xlsx(where, params)
+            return Response(stream_file_and_remove(path),
+                            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                            headers={'Content-Disposition': f'attachment; filename="{filename}.xlsx"',
+                                     'Content-Length': str(os.path.getsize(path)),
+                                     'Cache-Control': 'no-store'})
+
+        # Content-Length 없이 청크 단위로 전송 (chunked transfer encoding)
+        return Response(stream_export_csv(where, params), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename="{filename}.csv"',
+                                 'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+    except Exception as e:
+        print(f'내보내기 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'내보내기 중 오류가 발생했습니다: {str(e)}'}), 500
+
+# 학번 티켓 실시간 갱신 스트림 (Server-Sent Events, 공개)
+@app.route('/api/students/stream', methods=['GET'])
+def stream_ticket():
+    student_number = (request.args.get('student_number') or '').strip()
+    if not STUDENT_NUMBER_RE.match(student_number):
+        return jsonify({'success': False, 'message': '학번은 5자리 숫자여야 합니다.'}), 400
+    # 먼저 구독한 뒤 현재 티켓을 읽어야 그 사이의 변경을 놓치지 않음
+    q = ticket_broker.subscribe(student_number)
+    if q is None:
+        resp = jsonify({'success': False, 'message': '실시간 연결이 많아 잠시 후 다시 시도해주세요.'})
+        resp.status_code = 503
+        resp.headers['Retry-After'] = '30'
+        return resp
+    try:
+        _, initial = load_ticket(student_number, replica=False)
+    except Exception as e:
+        ticket_broker.unsubscribe(student_number, q)
+        print(f'티켓 스트림 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'데이터 조회 중 오류가 발생했습니다: {str(e)}'}), 500
+
+    def generate():
+        try:
+            yield f'retry: {SSE_RETRY_MS}\n\n'
+            yield 'event: ticket\ndata: {"success": true, "data": ' + initial + '}\n\n'
+            deadline = time.monotonic() + SSE_MAX_DURATION
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    body = q.get(timeout=min(SSE_KEEPALIVE, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield 'event: ticket\ndata: {"success": true, "data": ' + body + '}\n\n'
+        finally:
+            ticket_broker.unsubscribe(student_number, q)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# 단일 학생 레코드 조회
+@app.route('/api/students/<int:student_id>', methods=['GET'])
+@require_admin
+def get_student(student_id):
+    try:
+        conn, engine = get_read_conn()
+        cursor = dict_cursor(conn, engine)
+        cursor.execute(adapt_sql(engine, 'SELECT * FROM students WHERE id = ?'), (student_id,))
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return jsonify({ 'success': False, 'message': '학생을 찾을 수 없습니다.' }), 404
+        etag = record_etag([row])
+        if etag_matches(etag):
+            conn.close()
+            return not_modified(etag)
+        booths = load_booths(cursor, engine, [student_id])[student_id]
+        conn.close()
+        resp = jsonify({ 'success': True, 'data': student_row_to_dict(row, booths) })
+        resp.headers['ETag'] = etag
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
     except Exception as e:
         print(f'데이터 조회 오류: {str(e)}')
         return jsonify({ 'success': False, 'message': f'데이터 조회 중 오류가 발생했습니다: {str(e)}' }), 500
 
+# QR 이용권 사용 (부스 스캐너): {"token": "...", "booth_number": 3, "count": 1}
+@app.route('/api/redeem', methods=['POST'])
+@require_admin
+@idempotent
+def redeem_ticket():
+    try:
+        data = request.json or {}
+        try:
+            student_id, version, entitled = parse_qr_token(str(data.get('token') or ''))
+        except ValueError:
+            return jsonify({'success': False, 'message': '유효하지 않은 QR 코드입니다.'}), 400
+        booth_number = int_or_none(data.get('booth_number'))
+        count = data.get('count', 1)
+        if booth_number is None or not isinstance(count, int) or count < 1:
+            return jsonify({'success': False, 'message': '부스 번호와 1 이상의 정수 count가 필요합니다.'}), 400
+        if booth_number not in entitled:
+            return jsonify({'success': False, 'message': f'이 QR에는 부스 {booth_number} 이용권이 없습니다.'}), 409
+
+        # 한 트랜잭션: 버전이 QR과 같을 때만 버전을 올리고(동시 사용 차단) 남은 횟수를 조건부 차감
+        conn, engine = get_conn()
+        cursor = dict_cursor(conn, engine)
+        cursor.execute(adapt_sql(engine, '''
+            UPDATE students SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND version = ?
+            RETURNING student_number, name, version
+        '''), (student_id, version))
+        student = cursor.fetchone()
+        if not student:
+            conn.rollback()
+            cursor.execute(adapt_sql(engine, 'SELECT id FROM students WHERE id = ?'), (student_id,))
+            exists = cursor.fetchone()
+            conn.close()
+            if not exists:
+                return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
+            return jsonify({'success': False, 'message': '이미 사용되었거나 변경된 QR입니다. 마이티켓 화면을 새로고침해주세요.'}), 409
+        cursor.execute(adapt_sql(engine, '''
+            UPDATE student_booths SET remaining = remaining - ?
+            WHERE student_id = ? AND booth_number = ? AND remaining >= ?
+            RETURNING remaining
+        '''), (count, student_id, booth_number, count))
+        booth = cursor.fetchone()
+        if not booth:
+            conn.rollback()
+            conn.close()
+            return jsonify({'success': False, 'message': '남은 횟수가 부족합니다.'}), 409
+        student_number = student['student_number']
+        record_ledger(cursor, engine, [(student_id, student_number, booth_number, 'redeem', -count, 0, current_actor('scanner'))])
+        publish_ticket_changes(cursor, engine, [student_number])
+        conn.commit()
+        conn.close()
+        ticket_cache.invalidate(student_number)
+
+        remaining = booth['remaining']
+        return jsonify({'success': True, 'message': f'부스 {booth_number} 이용권을 사용했습니다.', 'data': {
+            'student_id': student_id,
+            'student_number': student_number,
+            'name': student['name'],
+            'booth_number': booth_number,
+            'remaining': remaining,
+            # 버전 검사로 QR 발급 이후 다른 변경이 없음이 보장되므로 DB를 다시 읽지 않고 새 토큰을 만듦
+            'qr_token': sign_qr_token(student_id, student['version'], entitled if remaining > 0 else entitled - {booth_number}),
+        }})
+    except Exception as e:
+        print(f'QR 사용 처리 오류: {str(e)}')
+        return jsonify({'success': False, 'message': f'QR 사용 처리 중 오류가 발생했습니다: {str(e)}'}), 500
+
 # 부스 남은 횟수 조정 API
 @app.route('/api/students/<int:student_id>/adjust', methods=['POST'])
 @require_admin
+@idempotent
 def adjust_student_booth(student_id):
     try:
         data = request.json
@@ -429,53 +2282,33 @@ def adjust_student_booth(student_id):
         if booth_number is None or not isinstance(delta, int):
             return jsonify({ 'success': False, 'message': '부스 번호와 정수 delta가 필요합니다.' }), 400
 
+        # 조건부 단일 UPDATE: 남은 횟수가 음수가 되는 조정은 적용하지 않음 (동시 조정에도 누락 없음)
         conn, engine = get_conn()
-        if engine == 'sqlite':
-            cursor = conn.cursor()
-            cursor.execute('SELECT booths FROM students WHERE id = ?', (student_id,))
-            row = cursor.fetchone()
-            if not row:
+        cursor = dict_cursor(conn, engine)
+        cursor.execute(adapt_sql(engine, '''
+            UPDATE student_booths SET remaining = remaining + ?
+            WHERE student_id = ? AND booth_number = ? AND remaining + ? >= 0
+            RETURNING remaining
+        '''), (delta, student_id, booth_number, delta))
+        if not cursor.fetchone():
+            conn.rollback()
+            cursor.execute(adapt_sql(engine, 'SELECT id FROM students WHERE id = ?'), (student_id,))
+            if not cursor.fetchone():
                 conn.close()
                 return jsonify({ 'success': False, 'message': '학생을 찾을 수 없습니다.' }), 404
-            import json
-            try:
-                booths = json.loads(row[0])
-            except Exception:
-                booths = []
-        else:
-            import psycopg2.extras, json
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cursor.execute('SELECT booths FROM students WHERE id = %s', (student_id,))
+            cursor.execute(adapt_sql(engine, 'SELECT remaining FROM student_booths WHERE student_id = ? AND booth_number = ?'), (student_id, booth_number))
             row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return jsonify({ 'success': False, 'message': '학생을 찾을 수 없습니다.' }), 404
-            try:
-                if isinstance(row['booths'], str):
-                    booths = json.loads(row['booths'])
-                else:
-                    booths = row['booths']
-            except Exception:
-                booths = []
-
-        updated = False
-        for b in booths:
-            if b.get('number') == booth_number:
-                new_remain = max(0, int(b.get('remaining', 0)) + delta)
-                b['remaining'] = new_remain
-                updated = True
-                break
-
-        if not updated:
             conn.close()
-            return jsonify({ 'success': False, 'message': '해당 부스를 찾을 수 없습니다.' }), 404
-
-        booths_json = json.dumps(booths, ensure_ascii=False)
-        if engine == 'sqlite':
-            cursor.execute('UPDATE students SET booths = ? WHERE id = ?', (booths_json, student_id))
-        else:
-            cursor.execute('UPDATE students SET booths = %s WHERE id = %s', (booths_json, student_id))
+            if not row:
+                return jsonify({ 'success': False, 'message': '해당 부스를 찾을 수 없습니다.' }), 404
+            return jsonify({ 'success': False, 'message': '남은 횟수가 부족합니다.', 'remaining': row['remaining'] }), 409
+        cursor.execute(adapt_sql(engine, 'UPDATE students SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ? RETURNING student_number'), (student_id,))
+        student_number = cursor.fetchone()['student_number']
+        record_ledger(cursor, engine, [(student_id, student_number, booth_number, 'redeem' if delta < 0 else 'adjust', delta, 0, current_actor('admin'))])
+        publish_ticket_changes(cursor, engine, [student_number])
         conn.commit()
+        invalidate_ticket_by_id(cursor, engine, student_id)
+        booths = load_booths(cursor, engine, [student_id])[student_id]
         conn.close()
 
         return jsonify({ 'success': True, 'message': '부스 남은 횟수가 업데이트되었습니다.', 'data': booths })
@@ -486,6 +2319,7 @@ def adjust_student_booth(student_id):
 # 결제 금액 추가 API
 @app.route('/api/students/<int:student_id>/add-payment', methods=['POST'])
 @require_admin
+@idempotent
 def add_payment(student_id):
     try:
         data = request.json
@@ -497,30 +2331,20 @@ def add_payment(student_id):
         except Exception:
             return jsonify({'success': False, 'message': 'amount는 정수여야 합니다.'}), 400
 
+        # 단일 UPDATE로 총액을 원자적으로 증가
         conn, engine = get_conn()
-        if engine == 'sqlite':
-            cursor = conn.cursor()
-            cursor.execute('SELECT total_price FROM students WHERE id = ?', (student_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
-            existing_total = row[0] or 0
-            new_total = existing_total + amount
-            cursor.execute('UPDATE students SET total_price = ?, created_at = CURRENT_TIMESTAMP WHERE id = ?', (new_total, student_id))
-        else:
-            import psycopg2.extras
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cursor.execute('SELECT total_price FROM students WHERE id = %s', (student_id,))
-            row = cursor.fetchone()
-            if not row:
-                conn.close()
-                return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
-            existing_total = row['total_price'] or 0
-            new_total = existing_total + amount
-            cursor.execute('UPDATE students SET total_price = %s, created_at = CURRENT_TIMESTAMP WHERE id = %s', (new_total, student_id))
+        cursor = dict_cursor(conn, engine)
+        cursor.execute(adapt_sql(engine, 'UPDATE students SET total_price = total_price + ?, updated_at = CURRENT_TIMESTAMP, version = version + 1 WHERE id = ? RETURNING total_price, student_number'), (amount, student_id))
+        row = cursor.fetchone()
+        if not row:
+            conn.close()
+            return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
+        new_total = row['total_price']
+        record_ledger(cursor, engine, [(student_id, row['student_number'], None, 'payment', 0, amount, current_actor('admin'))])
+        publish_ticket_changes(cursor, engine, [row['student_number']])
         conn.commit()
         conn.close()
+        ticket_cache.invalidate(row['student_number'])
         return jsonify({'success': True, 'message': '결제가 적용되었습니다.', 'total_price': new_total})
     except Exception as e:
         print(f'결제 추가 오류: {str(e)}')
@@ -532,30 +2356,117 @@ def add_payment(student_id):
 def delete_student(student_id):
     try:
         conn, engine = get_conn()
-        if engine == 'sqlite':
-            cursor = conn.cursor()
-            cursor.execute('DELETE FROM students WHERE id = ?', (student_id,))
-            if cursor.rowcount == 0:
-                conn.close()
-                return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
-        else:
-            import psycopg2.extras
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
-            cursor.execute('DELETE FROM students WHERE id = %s RETURNING id', (student_id,))
-            res = cursor.fetchone()
-            if not res:
-                conn.close()
-                return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
+        cursor = dict_cursor(conn, engine)
+        # sqlite는 외래 키 CASCADE가 기본 비활성이므로 부스 이용권을 직접 삭제
+        cursor.execute(adapt_sql(engine, 'DELETE FROM student_booths WHERE student_id = ?'), (student_id,))
+        cursor.execute(adapt_sql(engine, 'DELETE FROM students WHERE id = ? RETURNING student_number'), (student_id,))
+        res = cursor.fetchone()
+        if not res:
+            conn.close()
+            return jsonify({'success': False, 'message': '학생을 찾을 수 없습니다.'}), 404
+        # 원장 기록은 남기고 삭제 사실만 추가
+        record_ledger(cursor, engine, [(student_id, res['student_number'], None, 'delete', 0, 0, current_actor('admin'))])
+        publish_ticket_changes(cursor, engine, [res['student_number']])
         conn.commit()
         conn.close()
+        ticket_cache.invalidate(res['student_number'])
         return jsonify({'success': True, 'message': '레코드가 삭제되었습니다.'})
     except Exception as e:
         print(f'삭제 오류: {str(e)}')
         return jsonify({'success': False, 'message': f'삭제 중 오류가 발생했습니다: {str(e)}'}), 500
 
+# --- 워커 시작 ---
+# import만으로는 스키마 확인, 파일 읽기, 백그라운드 스레드 시작을 하지 않습니다
+# (migrate_sqlite_to_postgres.py나 python app.py <명령>이 app을 import해도 서버가 뜨지 않도록).
+# 서버로 실행될 때 프로세스마다 한 번 start_worker()를 부릅니다:
+# gunicorn.conf.py의 post_worker_init, asgi.py의 lifespan startup, python app.py. 그 밖의 방법으로 띄우면 첫 요청에서 부릅니다.
+_import_seconds = time.perf_counter() - _startup_started
+_worker_started = False
+_worker_start_lock = threading.Lock()
+
+
+def start_worker():
+    """스키마 확인, 부스 카탈로그 읽기, 쓰기 지연 저널 반영, 복제본 지연 측정을 시작합니다 (프로세스당 한 번)."""
+    global _worker_started
+    if _worker_started:
+        return
+    with _worker_start_lock:
+        if _worker_started:
+            return
+        started = time.perf_counter()
+        try:
+            ensure_schema()
+        except Exception as e:
+            print('데이터베이스 초기화 중 오류:', e)
+        schema_check_seconds = time.perf_counter() - started
+        load_booth_catalog()
+        open_write_behind()
+        if read_replica is not None:
+            read_replica.start()
+        _worker_started = True
+
+    # 워커 시작 시간: import + 위 준비 (스키마 확인 포함)
+    startup_seconds = _import_seconds + time.perf_counter() - started
+    metrics.observe('booth_worker_startup_seconds', (), startup_seconds)
+    print(f'워커 준비 완료 (pid {os.getpid()}): {startup_seconds * 1000:.0f}ms (스키마 확인 {schema_check_seconds * 1000:.0f}ms)')
+    if RATE_LIMIT and not PROXY_HOPS:
+        print('경고: RATE_LIMIT가 켜져 있는데 PROXY_HOPS=0입니다. 프록시(Render 등) 뒤라면 모든 클라이언트가 프록시 IP 하나의 버킷을 나눠 씁니다. PROXY_HOPS=1로 설정하세요.')
+
+
+@app.before_request
+def ensure_worker_started():
+    if not _worker_started:
+        start_worker()
+
 if __name__ == '__main__':
+    if sys.argv[1:] == ['migrate']:
+        # python app.py migrate: 스키마 마이그레이션 (배포 시 gunicorn.conf.py의 on_starting에서 실행)
+        try:
+            migrate()
+        except DuplicateStudentsError as e:
+            print(e)
+            sys.exit(1)
+        sys.exit(0)
+
+    if sys.argv[1:2] == ['dedupe-students']:
+        # python app.py dedupe-students [--apply]: 같은 학번의 중복 레코드 확인 (--apply면 최신 레코드에 병합하고 마이그레이션 계속)
+        migrate(target=2)   # students/student_booths까지만 (중복이 있으면 3번 unique_student_number가 중단됨)
+        conn, engine = get_conn()
+        cursor = conn.cursor()
+        with schema_lock(conn, cursor, engine):
+            duplicates = find_duplicate_students(cursor, engine)
+            for d in duplicates:
+                print(json.dumps(d, ensure_ascii=False))
+            apply = '--apply' in sys.argv[2:]
+            if apply and duplicates:
+                merge_duplicate_students(conn, cursor, engine, duplicates)
+        conn.close()
+        print(f'중복 학번 {len(duplicates)}개' + (' (병합함)' if apply and duplicates else ''))
+        if not apply:
+            sys.exit(1 if duplicates else 0)
+        migrate()
+        sys.exit(0)
+
     # 데이터베이스 초기화
-    init_db()
+    ensure_schema()
+
+    if sys.argv[1:] == ['rebuild-stats']:
+        # python app.py rebuild-stats: 대시보드 집계를 처음부터 다시 계산
+        conn, engine = get_conn()
+        rebuild_stats(conn, conn.cursor(), engine)
+        conn.close()
+        sys.exit(0)
+
+    if sys.argv[1:2] == ['replay-ledger']:
+        # python app.py replay-ledger [--check]: 원장으로 잔액 스냅샷을 다시 계산 (--check는 차이만 출력)
+        conn, engine = get_conn()
+        apply = '--check' not in sys.argv[2:]
+        diffs = replay_ledger(conn, dict_cursor(conn, engine), engine, apply=apply)
+        conn.close()
+        for d in diffs:
+            print(json.dumps(d, ensure_ascii=False))
+        print(f'원장과 다른 잔액 {len(diffs)}건' + (' (수정함)' if apply and diffs else ''))
+        sys.exit(1 if diffs and not apply else 0)
 
     # 플랫폼(예: Railway, Render)이 제공하는 PORT 사용
     PORT = int(os.getenv('PORT', '5000'))
@@ -569,6 +2480,8 @@ if __name__ == '__main__':
     print('서버를 종료하려면 Ctrl+C를 누르세요.')
     print('=' * 50)
 
+    start_worker()
+
     # 서버 실행
     app.run(host='0.0.0.0', port=PORT, debug=DEBUG)
  
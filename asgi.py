@@ -0,0 +1,336 @@
+"""ASGI 실행 모드 (선택): app.py의 라우트를 그대로 쓰면서 느린 I/O가 스레드를 붙잡지 않게 합니다.
+
+실행:
+    pip install -r requirements-asgi.txt   # requirements.txt + uvicorn
+    python app.py migrate
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 4
+    (또는 gunicorn -k uvicorn.workers.UvicornWorker -w 4 asgi:app)
+
+이벤트 루프에서 직접 처리하는 것은 마이티켓 실시간 갱신(SSE, /api/students/stream?student_number=) 하나뿐입니다.
+스트림을 기다리는 동안 스레드를 쓰지 않으므로 워커당 ASGI_SSE_MAX_CONNECTIONS개까지 받습니다.
+스트림도 시작할 때는 Flask 경로와 같이 요청 제한(RATE_LIMIT)과 수락 제어(lookup 부류)를 거쳐 주 DB에서 현재 티켓을 읽습니다.
+나머지 모든 요청(공개 학번 조회, 등록, 관리자 목록/수정/삭제, 차감, 내보내기, 메트릭 등)은 비동기가 아닙니다.
+공개 학번 조회도 Flask 경로로 처리하므로 수락 제어, 요청 프로파일러, 읽기 복제본/쓰기 후 주 DB 고정 쿠키가 똑같이 적용됩니다.
+요청 본문을 모두 받은 뒤 call_flask가 스레드 풀(ASGI_THREADS)에서 동기 Flask 앱을 그대로 실행하므로
+처리하는 동안 스레드 하나를 차지하고, 처리량은 gthread 모드와 같이 스레드 수에 묶입니다.
+느린 클라이언트의 업로드/다운로드만 이벤트 루프가 맡습니다.
+"""
+import asyncio
+import contextvars
+import io
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as booth
+
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', '16'))   # Flask 라우트와 SQLite 조회를 처리할 스레드 수
+ASGI_SSE_MAX_CONNECTIONS = int(os.getenv('ASGI_SSE_MAX_CONNECTIONS', '500'))   # 워커당 동시 SSE 연결 상한
+
+executor = ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix='flask')
+booth.ticket_broker.max_subscribers = ASGI_SSE_MAX_CONNECTIONS
+
+_allowed = os.getenv('ALLOWED_ORIGINS')
+ALLOWED_ORIGINS = [o.strip() for o in _allowed.split(',') if o.strip()] if _allowed else None
+
+
+async def startup():
+    # 스키마 확인, 부스 카탈로그, 쓰기 지연 저널 등 (DB를 쓰므로 스레드 풀에서)
+    await asyncio.get_running_loop().run_in_executor(executor, booth.start_worker)
+
+
+async def shutdown():
+    executor.shutdown(wait=False)
+
+
+# --- 공통 헬퍼 ---
+def header_map(scope):
+    headers = {}
+    for key, value in scope.get('headers', ()):
+        name = key.decode('latin-1').lower()
+        value = value.decode('latin-1')
+        headers[name] = headers[name] + ',' + value if name in headers else value
+    return headers
+
+
+def client_ip(scope, headers):
+    # app.py의 ProxyFix(PROXY_HOPS)와 같은 규칙: 프록시가 붙인 X-Forwarded-For의 뒤에서 PROXY_HOPS번째
+    if booth.PROXY_HOPS:
+        forwarded = [v.strip() for v in headers.get('x-forwarded-for', '').split(',') if v.strip()]
+        if len(forwarded) >= booth.PROXY_HOPS:
+            return forwarded[-booth.PROXY_HOPS]
+    client = scope.get('client')
+    return client[0] if client else '-'
+
+
+def cors_headers(headers):
+    origin = headers.get('origin')
+    if not origin:
+        return []
+    if ALLOWED_ORIGINS is None:
+        return [(b'access-control-allow-origin', b'*')]
+    if origin in ALLOWED_ORIGINS:
+        return [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    return []
+
+
+def query_param(scope, name):
+    from urllib.parse import parse_qs
+    values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get(name)
+    return values[0] if values else None
+
+
+def record(endpoint, method, status, started):
+    # Flask 쪽 record_request_metrics와 같은 이름/라벨
+    status = str(status)
+    booth.metrics.inc('booth_http_requests_total', (('endpoint', endpoint), ('method', method), ('status', status)))
+    booth.metrics.observe('booth_http_request_duration_seconds', (('endpoint', endpoint), ('status', status)),
+                          time.perf_counter() - started)
+    booth.metrics.flush()
+
+
+async def send_response(send, status, body, headers=()):
+    await send({'type': 'http.response.start', 'status': status, 'headers': list(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def send_json_error(send, status, message, headers=()):
+    body = booth.flask_json.dumps({'success': False, 'message': message}).encode()
+    await send_response(send, status, body, [(b'content-type', b'application/json'), *headers])
+
+
+def run_in_thread(func, *args):
+    """Flask/DB 코드를 스레드 풀에서 실행합니다 (호출한 곳의 contextvars를 그대로 가져감)."""
+    ctx = contextvars.copy_context()
+    return asyncio.get_running_loop().run_in_executor(executor, ctx.run, func, *args)
+
+
+async def rate_limited(scope, headers, send, cls, endpoint, started):
+    """IP별 토큰 버킷을 다 썼으면 429를 보내고 True."""
+    if not booth.RATE_LIMIT:
+        return False
+    wait = booth.admission.take_token(client_ip(scope, headers), cls)
+    if not wait:
+        return False
+    booth.admission.record_shed(cls, 'rate_limited')
+    await send_json_error(send, 429, '요청이 너무 많습니다. 잠시 후 다시 시도해주세요.',
+                          [(b'retry-after', str(max(1, int(wait + 0.999))).encode()), *cors_headers(headers)])
+    record(endpoint, scope['method'], 429, started)
+    return True
+
+
+# --- 마이티켓 실시간 갱신 (GET /api/students/stream) ---
+def load_initial_ticket(student_number):
+    """스트림 시작 시 현재 티켓 (스레드 풀에서). Flask 경로처럼 lookup 부류 자리를 받아 읽고 바로 돌려줍니다.
+    반환: 티켓 JSON, 혼잡해서 자리를 못 받으면 None"""
+    if booth.ADMISSION_CONTROL:
+        waited = booth.admission.acquire('lookup')
+        if waited is None:
+            booth.admission.record_shed('lookup', 'overloaded')
+            return None
+        booth.metrics.observe('booth_admission_wait_seconds', (('class', 'lookup'),), waited)
+    try:
+        with booth.app.app_context():
+            return booth.load_ticket(student_number, track_request=False, replica=False)[1]
+    finally:
+        if booth.ADMISSION_CONTROL:
+            booth.admission.release('lookup')
+
+
+class LoopQueue:
+    """TicketBroker가 폴링 스레드에서 넣는 최신 티켓을 이벤트 루프에서 기다리는 1칸 큐."""
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._item = None
+        self._has_item = False
+        self._event = asyncio.Event()
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._has_item:
+                raise queue.Empty
+            item, self._item, self._has_item = self._item, None, False
+            return item
+
+    def put_nowait(self, item):
+        with self._lock:
+            self._item, self._has_item = item, True
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def get(self, timeout):
+        """다음 티켓 JSON. timeout(초) 안에 없으면 asyncio.TimeoutError."""
+        while True:
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            self._event.clear()
+            try:
+                return self.get_nowait()
+            except queue.Empty:
+                pass
+            await asyncio.wait_for(self._event.wait(), timeout)
+
+
+async def stream_ticket(scope, receive, send, headers):
+    started = time.perf_counter()
+    endpoint = '/api/students/stream'
+    student_number = (query_param(scope, 'student_number') or '').strip()
+    if not booth.STUDENT_NUMBER_RE.match(student_number):
+        await send_json_error(send, 400, '학번은 5자리 숫자여야 합니다.', cors_headers(headers))
+        record(endpoint, 'GET', 400, started)
+        return
+    if await rate_limited(scope, headers, send, 'lookup', endpoint, started):
+        return
+    # 먼저 구독한 뒤 현재 티켓을 읽어야 그 사이의 변경을 놓치지 않음
+    q = booth.ticket_broker.subscribe(student_number, LoopQueue(asyncio.get_running_loop()))
+    if q is None:
+        await send_json_error(send, 503, '실시간 연결이 많아 잠시 후 다시 시도해주세요.',
+                              [(b'retry-after', b'30'), *cors_headers(headers)])
+        record(endpoint, 'GET', 503, started)
+        return
+    disconnected = asyncio.ensure_future(wait_disconnect(receive))
+    try:
+        try:
+            initial = await run_in_thread(load_initial_ticket, student_number)
+        except Exception as e:
+            print(f'티켓 스트림 오류: {str(e)}')
+            await send_json_error(send, 500, f'데이터 조회 중 오류가 발생했습니다: {str(e)}', cors_headers(headers))
+            record(endpoint, 'GET', 500, started)
+            return
+        if initial is None:
+            await send_json_error(send, 503, '서버가 혼잡합니다. 잠시 후 다시 시도해주세요.',
+                                  [(b'retry-after', b'1'), *cors_headers(headers)])
+            record(endpoint, 'GET', 503, started)
+            return
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'), *cors_headers(headers)]})
+        record(endpoint, 'GET', 200, started)
+        await send_event(send, f'retry: {booth.SSE_RETRY_MS}\n\n')
+        await send_event(send, 'event: ticket\ndata: {"success": true, "data": ' + initial + '}\n\n')
+        deadline = time.monotonic() + booth.SSE_MAX_DURATION
+        while not disconnected.done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            getter = asyncio.ensure_future(q.get(min(booth.SSE_KEEPALIVE, remaining)))
+            await asyncio.wait({getter, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not getter.done():
+                getter.cancel()
+                break
+            try:
+                body = getter.result()
+            except asyncio.TimeoutError:
+                await send_event(send, ': keepalive\n\n')
+                continue
+            await send_event(send, 'event: ticket\ndata: {"success": true, "data": ' + body + '}\n\n')
+        if not disconnected.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        disconnected.cancel()
+        booth.ticket_broker.unsubscribe(student_number, q)
+
+
+async def send_event(send, text):
+    await send({'type': 'http.response.body', 'body': text.encode(), 'more_body': True})
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+# --- 나머지 라우트: Flask 앱을 스레드 풀에서 실행 ---
+def build_environ(scope, headers, body):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client')
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+        'REMOTE_ADDR': client[0] if client else '',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+async def call_flask(scope, receive, send, headers):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    environ = build_environ(scope, headers, b''.join(chunks))
+    started = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in response_headers]
+        return lambda data: None   # Flask는 write()를 쓰지 않음
+
+    # 한 요청의 모든 단계(호출, 본문 순회, close)를 같은 Context에서 실행 (stream_with_context 등)
+    ctx = contextvars.copy_context()
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(executor, ctx.run, booth.app, environ, start_response)
+    try:
+        body_iter = iter(result)
+        chunk = await loop.run_in_executor(executor, ctx.run, next, body_iter, None)
+        await send({'type': 'http.response.start', 'status': started['status'], 'headers': started['headers']})
+        while chunk is not None:
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            chunk = await loop.run_in_executor(executor, ctx.run, next, body_iter, None)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(executor, ctx.run, result.close)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    await startup()
+                except Exception as e:
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    headers = header_map(scope)
+    if scope['method'] == 'GET' and scope['path'] == '/api/students/stream':
+        return await stream_ticket(scope, receive, send, headers)
+    return await call_flask(scope, receive, send, headers)
@@ -0,0 +1,480 @@
+"""
+API 부하 테스트 / 벤치마크
+- 목적: app.py 성능 변경 전후를 같은 조건으로 비교 (네트워크 불필요)
+- 동작: 학생 N명을 시드한 뒤 여러 스레드가 등록(save)·학번 조회(lookup)·검색(search)·
+  횟수 차감(adjust)·결제 추가(payment)를 섞어서 호출하고, 엔드포인트별
+  p50/p95/p99 지연시간, 처리량, 오류 수, 누락된 갱신(lost update) 수를 출력합니다.
+- 사용법:
+  1) 프로세스 내 Flask 테스트 클라이언트 + 임시 SQLite (기본)
+     python bench.py --students 500 --concurrency 8 --duration 20
+  2) 로컬 gunicorn 등 실행 중인 서버 대상
+     gunicorn -w 4 -b 127.0.0.1:8000 app:app
+     python bench.py --url http://127.0.0.1:8000
+  3) Postgres 호환 DB: DATABASE_URL을 설정하면 프로세스 내 모드가 해당 DB를 사용합니다
+     (벤치마크용 DB를 따로 쓰세요. 학번 90000번대 레코드를 만들고 수정합니다.)
+  4) SQLite 운영 모드 비교: --sqlite-mode default (이전 동작) / tuned (WAL, 쓰기 차례 대기)
+     워커 여러 개의 동시 쓰기는 같은 SQLITE_MODE로 gunicorn을 띄우고 --url 모드로 측정하세요.
+  5) 동기(gunicorn) / ASGI(asgi.py) 비교: 같은 워커 수로 각각 띄우고 측정 중 SSE 연결 N개를 열어 둡니다.
+     python bench.py --url http://127.0.0.1:8000 --sse 200 --server-pid <마스터 pid>
+     열린 SSE 수, 거절 수, 요청 지연, 서버 메모리(RSS, 자식 프로세스 포함)를 함께 출력합니다.
+  결과 저장/비교: --json bench_output.json, --baseline 이전결과.json
+
+주의: ADMIN_PASSWORD가 설정된 서버라면 같은 값을 환경변수로 주세요 (관리자 API 호출에 사용).
+부스: 프로세스 내 모드는 100회짜리 1번 부스만 있는 임시 카탈로그(BOOTH_CATALOG_PATH)를 씁니다.
+  --url 모드는 서버 카탈로그의 1번 부스 가격/이용 횟수로 기대값을 계산합니다 (횟수가 적으면 차감이 거절(rej)로 집계됨).
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+BENCH_BOOTH = {'number': 1, 'name': '벤치 부스 [100회]', 'price': 1000}
+USES_PER_ORDER = 100
+# 프로세스 내 모드에서 쓰는 임시 부스 카탈로그 (--url 모드는 서버의 /api/booths 값을 따름)
+BENCH_CATALOG = {'booths': [dict(BENCH_BOOTH, initial_uses=USES_PER_ORDER)]}
+FIRST_STUDENT_NUMBER = 90000
+DEFAULT_MIX = 'save=2,lookup=10,search=2,adjust=4,payment=2'
+
+
+class InProcessClient:
+    """Flask 테스트 클라이언트 (스레드마다 하나씩 생성)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, body=None, headers=None):
+        resp = self.client.open(path, method=method, json=body, headers=headers or {})
+        try:
+            data = resp.get_json(silent=True)
+        finally:
+            resp.close()
+        return resp.status_code, data
+
+
+class HttpClient:
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=dict(headers or {}))
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                return resp.status, json.loads(resp.read() or b'null')
+        except urllib.error.HTTPError as e:
+            try:
+                return e.code, json.loads(e.read() or b'null')
+            except ValueError:
+                return e.code, None
+
+
+class SseHolder:
+    """--sse: 측정하는 동안 마이티켓 실시간 연결을 열어 두고 유지합니다 (느린/오래 붙어 있는 클라이언트 흉내)."""
+
+    def __init__(self, base_url, student_numbers, count):
+        self.base_url = base_url.rstrip('/')
+        self.student_numbers = student_numbers
+        self.count = count
+        self.lock = threading.Lock()
+        self.open = 0
+        self.rejected = 0
+        self.failed = 0
+        self.stop = threading.Event()
+        self.threads = []
+
+    def _hold(self, sn):
+        try:
+            resp = urllib.request.urlopen(f'{self.base_url}/api/students/stream?student_number={sn}', timeout=30)
+        except urllib.error.HTTPError as e:
+            with self.lock:
+                if e.code == 503:
+                    self.rejected += 1
+                else:
+                    self.failed += 1
+            return
+        except OSError:
+            with self.lock:
+                self.failed += 1
+            return
+        with self.lock:
+            self.open += 1
+        try:
+            while not self.stop.is_set():
+                if not resp.readline():
+                    break
+        except OSError:
+            pass
+        finally:
+            resp.close()
+
+    def start(self):
+        for i in range(self.count):
+            t = threading.Thread(target=self._hold, args=(self.student_numbers[i % len(self.student_numbers)],), daemon=True)
+            t.start()
+            self.threads.append(t)
+        time.sleep(1.0)   # 연결이 자리 잡을 때까지
+
+    def close(self):
+        self.stop.set()
+        return {'requested': self.count, 'open': self.open, 'rejected': self.rejected, 'failed': self.failed}
+
+
+def process_rss_mb(pid):
+    """pid와 모든 자식 프로세스의 RSS 합 (MB, Linux /proc 기준)."""
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+            for tid in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{tid}/children') as f:
+                    pending.extend(int(c) for c in f.read().split())
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}   # op -> [seconds]
+        self.errors = {}      # op -> count
+        self.rejected = {}    # op -> 의도된 거절 수 (예: 남은 횟수 부족 409)
+
+    def add(self, op, seconds, ok, rejected=False):
+        with self.lock:
+            self.latencies.setdefault(op, []).append(seconds)
+            if rejected:
+                self.rejected[op] = self.rejected.get(op, 0) + 1
+            elif not ok:
+                self.errors[op] = self.errors.get(op, 0) + 1
+
+
+class Ledger:
+    """성공한 쓰기를 기준으로 학번별 기대값(남은 횟수, 총액)을 추적합니다."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.expected = {}   # student_number -> [remaining, total_price]
+        self.ids = {}        # student_number -> id
+
+    def order(self, student_number, student_id):
+        with self.lock:
+            exp = self.expected.setdefault(student_number, [0, 0])
+            exp[0] += USES_PER_ORDER
+            exp[1] += BENCH_BOOTH['price']
+            if student_id is not None:
+                # 쓰기 지연 모드(202)는 id 없이 접수됨: 반영 전이라 조정/결제 대상에서 제외
+                self.ids[student_number] = student_id
+
+    def adjust(self, student_number, delta):
+        with self.lock:
+            self.expected[student_number][0] += delta
+
+    def payment(self, student_number, amount):
+        with self.lock:
+            self.expected[student_number][1] += amount
+
+    def known(self):
+        with self.lock:
+            return list(self.ids.items())
+
+
+def admin_headers():
+    pw = os.getenv('ADMIN_PASSWORD')
+    return {'X-ADMIN-PASSWORD': pw} if pw else {}
+
+
+def sync_bench_booth(client):
+    """서버 카탈로그에서 벤치 부스의 가격/이용 횟수를 읽어 기대값 계산에 사용합니다."""
+    global USES_PER_ORDER
+    status, data = client.request('GET', '/api/booths')
+    if status != 200 or not data or not data.get('success'):
+        return
+    for booth in data['data']:
+        if booth['number'] == BENCH_BOOTH['number']:
+            if booth.get('includes'):
+                raise SystemExit(f'부스 {booth["number"]}은 패스라 벤치마크 기대값을 계산할 수 없습니다.')
+            BENCH_BOOTH.update(name=booth['name'], price=booth['price'])
+            USES_PER_ORDER = booth['initial_uses']
+            return
+    raise SystemExit(f'서버 카탈로그에 부스 {BENCH_BOOTH["number"]}이 없습니다.')
+
+
+def seed(client, count, ledger):
+    """학생 count명을 일괄 등록 API로 시드합니다."""
+    numbers = [str(FIRST_STUDENT_NUMBER + i) for i in range(count)]
+    for i in range(0, len(numbers), 200):
+        chunk = numbers[i:i + 200]
+        items = [{'phone': '010-0000-0000', 'name': f'벤치{sn}', 'student_number': sn,
+                  'booths': [BENCH_BOOTH], 'totalPrice': BENCH_BOOTH['price']} for sn in chunk]
+        status, data = client.request('POST', '/api/save-students/batch', {'students': items})
+        if status != 200 or not data or not data.get('success'):
+            raise SystemExit(f'시드 실패: HTTP {status} {data}')
+        for r in data['results']:
+            if r.get('success'):
+                ledger.order(r['student_number'], r['id'])
+
+
+SHED_STATUSES = (429, 503)   # 수락 제어가 거절한 요청 (의도된 거절로 셈)
+
+
+def run_op(op, client, ledger, rng, new_numbers):
+    """op 하나를 실행하고 (성공 여부, 의도된 거절 여부)를 반환합니다."""
+    known = ledger.known()
+    if op == 'save':
+        # 절반은 기존 학번 병합, 절반은 새 학번 등록
+        if known and rng.random() < 0.5:
+            sn = rng.choice(known)[0]
+        else:
+            sn = next(new_numbers)
+        body = {'phone': '010-0000-0000', 'name': f'벤치{sn}', 'student_number': sn,
+                'booths': [BENCH_BOOTH], 'totalPrice': BENCH_BOOTH['price']}
+        status, data = client.request('POST', '/api/save-student', body)
+        if status in (200, 202) and data and data.get('success'):
+            ledger.order(sn, data.get('id'))
+            return True, False
+        return False, status in SHED_STATUSES
+    sn, sid = rng.choice(known)
+    if op == 'lookup':
+        status, data = client.request('GET', f'/api/students?student_number={sn}')
+        return status == 200 and bool(data and data.get('data')), status in SHED_STATUSES
+    if op == 'search':
+        term = sn[:3] if rng.random() < 0.5 else '벤치' + sn[-3:]
+        status, data = client.request('GET', '/api/students?search=' + urllib.request.quote(term), headers=admin_headers())
+        return status == 200, status in SHED_STATUSES
+    if op == 'adjust':
+        status, data = client.request('POST', f'/api/students/{sid}/adjust',
+                                      {'booth_number': BENCH_BOOTH['number'], 'delta': -1}, headers=admin_headers())
+        if status == 200:
+            ledger.adjust(sn, -1)
+            return True, False
+        return False, status == 409 or status in SHED_STATUSES
+    if op == 'payment':
+        amount = rng.choice((500, 1000, 2000))
+        status, data = client.request('POST', f'/api/students/{sid}/add-payment', {'amount': amount}, headers=admin_headers())
+        if status == 200:
+            ledger.payment(sn, amount)
+            return True, False
+        return False, status in SHED_STATUSES
+    raise ValueError(op)
+
+
+def wait_for_write_behind(client, timeout=60):
+    """쓰기 지연 모드면 저널이 모두 반영될 때까지 기다립니다."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status, data = client.request('GET', '/api/write-behind/status', headers=admin_headers())
+        if status != 200 or not data or not data.get('enabled') or data.get('depth') == 0:
+            return
+        time.sleep(0.2)
+    print('경고: 쓰기 지연 저널이 제한 시간 안에 비워지지 않았습니다.')
+
+
+def verify(client, ledger):
+    """DB의 최종 값과 기대값을 비교해 누락된 갱신 수를 셉니다."""
+    lost = 0
+    checked = 0
+    with ledger.lock:
+        expected = dict(ledger.expected)
+    for sn, (remaining, total) in expected.items():
+        status, data = client.request('GET', f'/api/students?student_number={sn}')
+        rows = (data or {}).get('data') or []
+        if not rows:
+            lost += 1
+            continue
+        row = rows[0]
+        actual_remaining = sum(b.get('remaining', 0) for b in row.get('booths', []) if b.get('number') == BENCH_BOOTH['number'])
+        if actual_remaining != remaining or row.get('total_price') != total:
+            lost += 1
+        checked += 1
+    return checked, lost
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'save', 'lookup', 'search', 'adjust', 'payment'}
+    if unknown:
+        raise SystemExit(f'알 수 없는 작업: {", ".join(sorted(unknown))}')
+    return mix
+
+
+def make_report(rec, elapsed, checked, lost, label):
+    report = {'label': label, 'elapsed_seconds': round(elapsed, 3), 'checked_students': checked,
+              'lost_updates': lost, 'endpoints': {}}
+    total = 0
+    for op, values in sorted(rec.latencies.items()):
+        values.sort()
+        total += len(values)
+        report['endpoints'][op] = {
+            'requests': len(values),
+            'errors': rec.errors.get(op, 0),
+            'rejected': rec.rejected.get(op, 0),
+            'throughput_rps': round(len(values) / elapsed, 1) if elapsed else 0.0,
+            'p50_ms': round(percentile(values, 50) * 1000, 2),
+            'p95_ms': round(percentile(values, 95) * 1000, 2),
+            'p99_ms': round(percentile(values, 99) * 1000, 2),
+        }
+    report['total_requests'] = total
+    report['total_throughput_rps'] = round(total / elapsed, 1) if elapsed else 0.0
+    return report
+
+
+def print_report(report, baseline=None):
+    print('=' * 78)
+    print(f"벤치마크: {report['label']}  ({report['elapsed_seconds']}초, 총 {report['total_requests']}건, {report['total_throughput_rps']} req/s)")
+    print('=' * 78)
+    print(f"{'endpoint':<10}{'req':>8}{'err':>6}{'rej':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for op, e in report['endpoints'].items():
+        line = f"{op:<10}{e['requests']:>8}{e['errors']:>6}{e['rejected']:>6}{e['throughput_rps']:>10}{e['p50_ms']:>10}{e['p95_ms']:>10}{e['p99_ms']:>10}"
+        base = (baseline or {}).get('endpoints', {}).get(op)
+        if base and base['p95_ms']:
+            line += f"   (p95 {e['p95_ms'] / base['p95_ms']:.2f}x, req/s {e['throughput_rps'] / max(base['throughput_rps'], 0.1):.2f}x)"
+        print(line)
+    print('-' * 78)
+    print(f"누락된 갱신(lost update): {report['lost_updates']} / 검사한 학번 {report['checked_students']}")
+    if 'sse' in report:
+        sse = report['sse']
+        print(f"SSE 연결: 요청 {sse['requested']}, 열림 {sse['open']}, 거절(503) {sse['rejected']}, 실패 {sse['failed']}")
+    if 'server_rss_mb' in report:
+        print(f"서버 메모리(RSS): {report['server_rss_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='info_booth API 벤치마크')
+    parser.add_argument('--url', help='실행 중인 서버 주소 (없으면 프로세스 내 Flask 테스트 클라이언트)')
+    parser.add_argument('--students', type=int, default=300, help='시드할 학생 수')
+    parser.add_argument('--concurrency', type=int, default=8, help='동시 실행 스레드 수')
+    parser.add_argument('--duration', type=float, default=10.0, help='측정 시간(초)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'작업 비율 (기본: {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=1, help='난수 시드')
+    parser.add_argument('--label', default=None, help='결과 이름')
+    parser.add_argument('--sqlite-mode', choices=('tuned', 'default'), default=None,
+                        help='프로세스 내 모드의 SQLITE_MODE (기본: 환경변수 또는 tuned)')
+    parser.add_argument('--sse', type=int, default=0, help='--url 모드: 측정 중 열어 둘 SSE 연결 수')
+    parser.add_argument('--server-pid', type=int, help='측정 후 RSS를 잴 서버 프로세스 pid (자식 포함)')
+    parser.add_argument('--json', dest='json_path', help='결과를 JSON으로 저장할 경로')
+    parser.add_argument('--baseline', help='비교할 이전 결과 JSON')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    ops, weights = zip(*mix.items())
+
+    if args.url:
+        make_client = lambda: HttpClient(args.url)
+        label = args.label or args.url
+    else:
+        if not os.getenv('DATABASE_URL'):
+            # 매번 새 임시 SQLite 파일로 같은 조건에서 측정
+            tmpdir = tempfile.mkdtemp(prefix='bench_')
+            os.environ['SQLITE_PATH'] = os.path.join(tmpdir, 'bench.db')
+        if args.sqlite_mode:
+            os.environ['SQLITE_MODE'] = args.sqlite_mode
+        # 모든 스레드가 같은 IP로 보이므로 IP별 제한은 끔 (워커 내 동시 처리 자리 제어는 그대로)
+        os.environ.setdefault('RATE_LIMIT', 'False')
+        if not os.getenv('BOOTH_CATALOG_PATH'):
+            catalog_dir = tempfile.mkdtemp(prefix='bench_')
+            os.environ['BOOTH_CATALOG_PATH'] = os.path.join(catalog_dir, 'booths.json')
+            with open(os.environ['BOOTH_CATALOG_PATH'], 'w', encoding='utf-8') as f:
+                json.dump(BENCH_CATALOG, f, ensure_ascii=False)
+        sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+        import app as app_module
+        app_module.start_worker()
+        make_client = lambda: InProcessClient(app_module.app)
+        label = args.label or ('in-process postgres' if os.getenv('DATABASE_URL')
+                               else f"in-process sqlite ({os.getenv('SQLITE_MODE', 'tuned')})")
+
+    ledger = Ledger()
+    sync_bench_booth(make_client())
+    seed(make_client(), args.students, ledger)
+    print(f'시드 완료: 학생 {args.students}명')
+
+    sse = None
+    if args.sse:
+        if not args.url:
+            raise SystemExit('--sse는 --url 모드에서만 사용할 수 있습니다.')
+        sse = SseHolder(args.url, [sn for sn, _ in ledger.known()], args.sse)
+        sse.start()
+
+    rec = Recorder()
+    stop_at = time.perf_counter() + args.duration
+    counter = iter(range(FIRST_STUDENT_NUMBER + args.students, 100000))
+    counter_lock = threading.Lock()
+
+    def new_numbers():
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                raise SystemExit('새 학번을 모두 사용했습니다. --duration 또는 save 비율을 줄이세요.')
+            yield str(n)
+
+    def worker(idx):
+        rng = random.Random(args.seed * 1000 + idx)
+        client = make_client()
+        numbers = new_numbers()
+        while time.perf_counter() < stop_at:
+            op = rng.choices(ops, weights)[0]
+            started = time.perf_counter()
+            try:
+                ok, rejected = run_op(op, client, ledger, rng, numbers)
+            except Exception:
+                ok, rejected = False, False
+            rec.add(op, time.perf_counter() - started, ok, rejected)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+    server_rss = process_rss_mb(args.server_pid) if args.server_pid else None
+    sse_result = sse.close() if sse else None
+
+    wait_for_write_behind(make_client())
+    checked, lost = verify(make_client(), ledger)
+    report = make_report(rec, elapsed, checked, lost, label)
+    report['config'] = {'students': args.students, 'concurrency': args.concurrency,
+                        'duration': args.duration, 'mix': mix}
+    if sse_result:
+        report['sse'] = sse_result
+    if server_rss is not None:
+        report['server_rss_mb'] = server_rss
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'결과 저장: {args.json_path}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""요청 수락 제어와 IP별 요청 한도 (ADMISSION_CONTROL 또는 RATE_LIMIT가 켜져 있을 때만 app.py가 import)."""
+import os
+import threading
+import time
+
+
+# --- 요청 수락 제어 (admission control) ---
+# /api/* 요청을 부류로 나눠 두 단계로 거릅니다.
+# 1) 클라이언트 IP × 부류별 토큰 버킷: 다 쓰면 바로 429 + Retry-After
+# 2) 워커 안의 동시 처리 자리: 우선순위가 낮은 부류일수록 쓸 수 있는 자리가 적고, 자리를 기다린 시간이
+#    부류별 지연 예산을 넘으면 503 + Retry-After. 공개 조회가 몰려도 관리자 차감/결제용 자리는 항상 남습니다.
+# 자리는 도착 순서대로 나눠 주므로 한가할 때 늦게 온 요청이 먼저 기다린 요청을 앞지르지 않습니다.
+# 버킷과 자리는 워커별이며 공유하지 않습니다 (워커가 4개면 한 IP가 받는 허용량은 최대 4배, 동시 처리 자리도 워커 수 × ADMISSION_MAX_INFLIGHT).
+ADMISSION_MAX_INFLIGHT = int(os.getenv('ADMISSION_MAX_INFLIGHT', os.getenv('GUNICORN_THREADS', '8')))  # 워커당 동시 처리 자리
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv('RATE_LIMIT_MAX_CLIENTS', '20000'))   # 워커가 기억하는 (IP, 부류) 버킷 수 상한
+
+def _admission_class(name, reserve, budget, rate, burst):
+    """부류 설정. 환경변수 ADMISSION_<부류>_RESERVE(자리 수), ADMISSION_<부류>_BUDGET(초),
+    RATE_LIMIT_<부류>(초당 토큰/버스트, 0이면 제한 없음)로 조정합니다."""
+    reserve = int(os.getenv(f'ADMISSION_{name.upper()}_RESERVE', reserve))
+    budget = float(os.getenv(f'ADMISSION_{name.upper()}_BUDGET', budget))
+    spec = os.getenv(f'RATE_LIMIT_{name.upper()}')
+    if spec:
+        rate, _, burst = spec.partition('/')
+        rate = float(rate)
+        burst = float(burst or max(rate, 1))
+    return {'reserve': reserve, 'budget': budget, 'rate': rate, 'burst': burst}
+
+
+# reserve: 전체 자리 중 이 부류가 쓰지 못하는 자리 수 (작을수록 우선)
+ADMISSION_CLASSES = {
+    'redeem': _admission_class('redeem', 0, 2.0, 0, 0),      # 관리자 차감(adjust, QR redeem)/결제(add-payment)
+    'admin': _admission_class('admin', 1, 1.0, 0, 0),        # 그 밖의 관리자 요청
+    'write': _admission_class('write', 2, 0.5, 5, 20),       # 키오스크 등록
+    'lookup': _admission_class('lookup', 3, 0.25, 20, 60),   # 공개 티켓 조회, 인증 없는 요청
+}
+ADMISSION_ROUTES = {
+    ('POST', '/api/students/<int:student_id>/adjust'): 'redeem',
+    ('POST', '/api/students/<int:student_id>/add-payment'): 'redeem',
+    ('POST', '/api/redeem'): 'redeem',
+    ('POST', '/api/save-student'): 'write',
+    ('POST', '/api/save-students/batch'): 'write',
+    ('GET', '/api/booths'): 'lookup',
+    ('GET', '/api/students/stream'): 'lookup',
+}
+
+
+class AdmissionController:
+    """워커 안의 동시 처리 자리(부류별 상한)와 (IP, 부류)별 토큰 버킷."""
+
+    def __init__(self, classes, max_inflight, control=True, rate_limit=True):
+        self.classes = classes
+        self.max_inflight = max_inflight
+        self.control = control          # 동시 처리 자리 제한 (ADMISSION_CONTROL)
+        self.rate_limit = rate_limit    # IP별 토큰 버킷 (RATE_LIMIT)
+        self._cond = threading.Condition()
+        self._inflight = dict.fromkeys(classes, 0)
+        self._total = 0
+        self._waiters = []   # 자리를 기다리는 요청의 [자리 상한] (도착 순)
+        self._buckets = {}   # (ip, 부류) -> [남은 토큰, 마지막 갱신 시각]
+        self._bucket_lock = threading.Lock()
+        self._shed = {}      # (부류, 사유) -> 거절 수
+
+    def take_token(self, ip, cls):
+        """토큰 하나를 씁니다. 반환: 통과면 0, 아니면 다음 토큰까지 남은 시간(초)."""
+        conf = self.classes[cls]
+        rate = conf['rate']
+        if rate <= 0:
+            return 0
+        now = time.monotonic()
+        key = (ip, cls)
+        with self._bucket_lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= RATE_LIMIT_MAX_CLIENTS:
+                    self._prune(now)
+                bucket = self._buckets[key] = [conf['burst'], now]
+            else:
+                bucket[0] = min(conf['burst'], bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] >= 1:
+                bucket[0] -= 1
+                return 0
+            return (1 - bucket[0]) / rate
+
+    def _prune(self, now):
+        # 다시 가득 찼을 버킷은 지워도 결과가 같음. 그래도 많으면 오래된 절반을 지움
+        for key, (tokens, last) in list(self._buckets.items()):
+            conf = self.classes[key[1]]
+            if tokens + (now - last) * conf['rate'] >= conf['burst']:
+                del self._buckets[key]
+        if len(self._buckets) >= RATE_LIMIT_MAX_CLIENTS:
+            for key, _ in sorted(self._buckets.items(), key=lambda item: item[1][1])[:len(self._buckets) // 2]:
+                del self._buckets[key]
+
+    def _may_enter(self, entry):
+        # 먼저 기다리기 시작한 요청 중 지금 빈 자리를 쓸 수 있는 요청이 있으면 그 요청이 먼저 (새로 온 요청이 끼어들지 않음)
+        for other in self._waiters:
+            if other is entry:
+                break
+            if self._total < other[0]:
+                return False
+        return self._total < entry[0]
+
+    def acquire(self, cls):
+        """동시 처리 자리를 얻습니다. 지연 예산 안에 못 얻으면 None, 얻으면 기다린 시간(초).
+        자리는 도착 순서대로 받습니다 (우선순위는 부류별 상한으로만 정함)."""
+        conf = self.classes[cls]
+        entry = [max(1, self.max_inflight - conf['reserve'])]
+        started = time.monotonic()
+        with self._cond:
+            if not self._may_enter(entry):
+                self._waiters.append(entry)
+                try:
+                    while not self._may_enter(entry):
+                        remaining = started + conf['budget'] - time.monotonic()
+                        if remaining <= 0:
+                            return None
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiters = [w for w in self._waiters if w is not entry]
+                    # 뒤에서 기다리던 요청이 남은 자리를 쓸 수 있는지 다시 확인
+                    self._cond.notify_all()
+            self._total += 1
+            self._inflight[cls] += 1
+        return time.monotonic() - started
+
+    def release(self, cls):
+        with self._cond:
+            self._total -= 1
+            self._inflight[cls] -= 1
+            self._cond.notify_all()
+
+    def record_shed(self, cls, reason):
+        with self._cond:
+            self._shed[(cls, reason)] = self._shed.get((cls, reason), 0) + 1
+
+    def snapshot(self):
+        with self._cond:
+            inflight = dict(self._inflight)
+            shed = [{'class': c, 'reason': r, 'count': n} for (c, r), n in sorted(self._shed.items())]
+        return {
+            'enabled': self.control,
+            'rate_limit': self.rate_limit,
+            'max_inflight': self.max_inflight,
+            'inflight': inflight,
+            'shed': shed,
+            'clients': len(self._buckets),
+            'classes': self.classes,
+        }
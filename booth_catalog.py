@@ -0,0 +1,142 @@
+"""서버 부스 카탈로그 (booths.json)와 카탈로그 기준 주문 계산."""
+import json
+import os
+import threading
+import time
+
+from booth_db import int_or_none
+
+
+# --- 부스 카탈로그 ---
+# 부스 번호 -> 이름/가격/초기 이용 횟수/패스 규칙을 booths.json(BOOTH_CATALOG_PATH)에서 한 번 읽어 두고
+# 주문마다 번호로 바로 찾습니다. 이름/가격/총액은 클라이언트 값 대신 카탈로그로 계산합니다.
+# 파일이 바뀌면 BOOTH_CATALOG_CHECK_INTERVAL마다 수정 시각을 확인해 다시 읽습니다 (재배포 불필요).
+# 카탈로그 파일이 없으면 예전처럼 부스 이름에서 이용 횟수를 찾습니다.
+BOOTH_CATALOG_PATH = os.getenv('BOOTH_CATALOG_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'booths.json'))
+BOOTH_CATALOG_CHECK_INTERVAL = 2.0
+PASS_TYPES = ('single', 'pass')
+
+
+class OrderError(ValueError):
+    pass
+
+
+class BoothCatalog:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._booths = None      # number -> entry
+        self._mtime = None
+        self._checked = 0.0
+
+    def load(self):
+        """파일을 읽어 검증한 뒤 교체합니다. 잘못된 파일이면 ValueError (기존 카탈로그 유지)."""
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        items = data.get('booths') if isinstance(data, dict) else data
+        if not isinstance(items, list) or not items:
+            raise ValueError('booths 목록이 비어 있습니다.')
+        booths = {}
+        for item in items:
+            number = int_or_none(item.get('number'))
+            price = int_or_none(item.get('price'))
+            uses = int_or_none(item.get('initial_uses', 1))
+            pass_type = item.get('pass_type', 'single')
+            if number is None or number in booths:
+                raise ValueError(f'부스 번호가 없거나 중복되었습니다: {item.get("number")}')
+            if not item.get('name') or price is None or price < 0 or uses is None or uses < 1:
+                raise ValueError(f'부스 {number}: name, price(0 이상), initial_uses(1 이상)가 필요합니다.')
+            if pass_type not in PASS_TYPES:
+                raise ValueError(f'부스 {number}: pass_type은 {"/".join(PASS_TYPES)} 중 하나여야 합니다.')
+            includes = [int(n) for n in item.get('includes') or []]
+            booths[number] = {
+                'number': number,
+                'name': str(item['name']),
+                'price': price,
+                'initial_uses': uses,
+                'pass_type': pass_type,
+                'includes': includes,
+                'golden': bool(item.get('golden', False)),
+            }
+        for entry in booths.values():
+            missing = [n for n in entry['includes'] if n not in booths or n == entry['number']]
+            if missing:
+                raise ValueError(f'부스 {entry["number"]}: 포함 부스 번호가 올바르지 않습니다: {missing}')
+        with self._lock:
+            self._booths, self._mtime, self._checked = booths, mtime, time.monotonic()
+        return len(booths)
+
+    def get(self):
+        """현재 카탈로그(dict)를 반환합니다. 파일이 없으면 None."""
+        now = time.monotonic()
+        if now - self._checked >= BOOTH_CATALOG_CHECK_INTERVAL:
+            self._checked = now
+            try:
+                changed = os.path.getmtime(self.path) != self._mtime
+            except OSError:
+                changed = False
+            if changed:
+                try:
+                    print(f'부스 카탈로그 다시 읽음: {self.load()}개')
+                except Exception as e:
+                    print('부스 카탈로그를 다시 읽지 못해 이전 카탈로그를 사용합니다:', e)
+        return self._booths
+
+    def as_list(self):
+        booths = self.get()
+        return [booths[n] for n in sorted(booths)] if booths else []
+
+
+booth_catalog = BoothCatalog(BOOTH_CATALOG_PATH)
+
+
+def load_booth_catalog():
+    if os.path.exists(BOOTH_CATALOG_PATH):
+        booth_catalog.load()
+    else:
+        print(f'부스 카탈로그 파일이 없어 부스 이름으로 이용 횟수를 계산합니다: {BOOTH_CATALOG_PATH}')
+
+
+def expand_catalog_order(catalog, booths):
+    """선택한 부스 번호를 카탈로그로 풀어 (저장할 부스 목록, 총액)을 만듭니다.
+    패스(includes)는 포함 부스를 가격 0의 derived 항목으로 추가하고, golden이면 포함 부스를 황금으로 표시합니다
+    (script.js의 5/6/7번 처리와 같은 규칙). 클라이언트가 보낸 derived 항목은 무시하고 다시 계산합니다."""
+    selected = []
+    for b in booths:
+        if b.get('derived'):
+            continue
+        number = int(b.get('number'))
+        entry = catalog.get(number)
+        if entry is None:
+            raise OrderError(f'알 수 없는 부스 번호입니다: {number}')
+        selected.append(entry)
+    if not selected:
+        raise OrderError('필수 정보가 누락되었습니다.')
+
+    result = []
+    by_number = {}
+    total_price = 0
+    for entry in selected:
+        total_price += entry['price']
+        existing = by_number.get(entry['number'])
+        if existing is not None:
+            existing['remaining'] += entry['initial_uses']
+            continue
+        booth = {'number': entry['number'], 'name': entry['name'], 'price': entry['price'], 'remaining': entry['initial_uses']}
+        result.append(booth)
+        by_number[booth['number']] = booth
+    for entry in selected:
+        for number in entry['includes']:
+            existing = by_number.get(number)
+            if existing is None:
+                included = catalog[number]
+                booth = {'number': number, 'name': included['name'], 'price': 0, 'remaining': included['initial_uses'],
+                         'derived': True, 'derivedFrom': entry['number']}
+                if entry['golden']:
+                    booth.update(isGolden=True, goldenFrom=entry['number'])
+                result.append(booth)
+                by_number[number] = booth
+            elif entry['golden']:
+                existing.update(isGolden=True, goldenFrom=entry['number'])
+    return result, total_price
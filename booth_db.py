@@ -0,0 +1,361 @@
+"""DB 커넥션 풀과 쿼리 헬퍼 (sqlite / postgres 공용)."""
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+
+from flask import g, has_app_context
+
+from booth_metrics import TimedCursor, metrics, request_metrics
+
+# 데이터베이스 파일 경로
+DB_PATH = os.getenv('SQLITE_PATH', 'student.db')
+DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')   # 읽기 복제본: postgres://... 또는 sqlite:///경로 (booth_replica.py)
+
+# --- DB 커넥션 풀 ---
+# 워커(프로세스)마다 하나의 풀을 두고 모든 라우트가 공유합니다.
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', '5'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '5'))    # 체크아웃 대기 최대 시간(초)
+DB_POOL_RECYCLE = float(os.getenv('DB_POOL_RECYCLE', '300'))  # 이 시간 이상 유휴였던 연결은 상태 확인 후 사용
+
+# SQLite 운영 모드 (DATABASE_URL이 없을 때)
+# tuned: WAL + synchronous=NORMAL + busy_timeout + mmap + 문장 캐시, 쓰기는 BEGIN IMMEDIATE로 시작하고
+#        워커 안에서는 한 번에 하나의 쓰기 트랜잭션만 열도록 차례를 기다림 ("database is locked" 대신 대기)
+# default: 이전 동작 (롤백 저널, 지연 트랜잭션) - 비교 측정용
+SQLITE_MODE = os.getenv('SQLITE_MODE', 'tuned')
+SQLITE_BUSY_TIMEOUT = float(os.getenv('SQLITE_BUSY_TIMEOUT', '5'))               # 잠금 대기 최대 시간(초)
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))   # 메모리 매핑 읽기 크기(바이트)
+SQLITE_CACHED_STATEMENTS = 256
+SQLITE_WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """풀에서 빌려온 연결. close()를 호출하면 실제로 닫지 않고 풀에 반납합니다.
+    그 외 속성(cursor, commit, row_factory 등)은 원래 연결로 위임합니다."""
+
+    def __init__(self, pool, raw):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_raw', raw)
+        object.__setattr__(self, '_released', False)
+        object.__setattr__(self, '_holds_lane', False)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    @property
+    def role(self):
+        return self._pool.role
+
+    def __setattr__(self, name, value):
+        setattr(self._raw, name, value)
+
+    def cursor(self, *args, **kwargs):
+        hook = self._enter_write if self._pool.write_lane is not None else None
+        return TimedCursor(self._raw.cursor(*args, **kwargs), hook)
+
+    def _enter_write(self, query):
+        # 쓰기 트랜잭션이 시작되기 직전에 차례를 받고, 커밋/롤백/반납 때 넘김
+        if self._holds_lane or self._raw.in_transaction:
+            return
+        if not query.lstrip()[:7].upper().startswith(SQLITE_WRITE_STATEMENTS):
+            return
+        self._pool.acquire_write_lane()
+        object.__setattr__(self, '_holds_lane', True)
+
+    def _leave_write(self):
+        if self._holds_lane:
+            object.__setattr__(self, '_holds_lane', False)
+            self._pool.release_write_lane()
+
+    def commit(self):
+        try:
+            self._raw.commit()
+        finally:
+            self._leave_write()
+
+    def rollback(self):
+        try:
+            self._raw.rollback()
+        finally:
+            self._leave_write()
+
+    def close(self):
+        if self._released:
+            return
+        object.__setattr__(self, '_released', True)
+        try:
+            self._pool.release(self._raw)
+        finally:
+            self._leave_write()
+
+
+class ConnectionPool:
+    def __init__(self, connect, engine, minsize=DB_POOL_MIN, maxsize=DB_POOL_MAX,
+                 timeout=DB_POOL_TIMEOUT, recycle=DB_POOL_RECYCLE, write_lane=False, role='primary'):
+        self._connect = connect
+        self.engine = engine
+        self.role = role   # 'primary' | 'replica'
+        self.minsize = max(0, min(minsize, maxsize))
+        self.maxsize = max(1, maxsize)
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pid = os.getpid()
+        self._idle = []   # [(raw_conn, last_used)]
+        self._size = 0    # 열려 있는 전체 연결 수 (유휴 + 사용 중)
+        self._cond = threading.Condition()
+        self._stats = {'checkouts': 0, 'timeouts': 0, 'created': 0, 'discarded': 0,
+                       'health_checks': 0, 'wait_seconds_total': 0.0, 'max_wait_seconds': 0.0}
+        # SQLite tuned 모드: 워커 안의 쓰기 트랜잭션을 한 줄로 세움
+        self.write_lane = threading.Lock() if write_lane else None
+        if write_lane:
+            self._stats.update({'write_lane_waits': 0, 'write_lane_wait_seconds_total': 0.0, 'write_lane_timeouts': 0})
+        for _ in range(self.minsize):
+            try:
+                raw = self._connect()
+            except Exception as e:
+                print('커넥션 풀 초기 연결 실패:', e)
+                break
+            self._size += 1
+            self._stats['created'] += 1
+            self._idle.append((raw, time.monotonic()))
+
+    def _is_healthy(self, raw):
+        self._stats['health_checks'] += 1
+        try:
+            if getattr(raw, 'closed', 0):
+                return False
+            cur = raw.cursor()
+            cur.execute('SELECT 1')
+            cur.fetchone()
+            cur.close()
+            raw.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _discard(self, raw):
+        self._stats['discarded'] += 1
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def acquire(self):
+        started = time.monotonic()
+        deadline = started + self.timeout
+        raw = None
+        last_used = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    raw, last_used = self._idle.pop()
+                    break
+                if self._size < self.maxsize:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f'DB 연결 대기 시간 초과 ({self.timeout}초, 최대 {self.maxsize}개 사용 중)')
+                self._cond.wait(remaining)
+
+        # 오래 유휴 상태였거나 끊어진 연결은 상태를 확인하고 필요하면 새로 연결
+        if raw is not None and (getattr(raw, 'closed', 0) or time.monotonic() - last_used > self.recycle):
+            if not self._is_healthy(raw):
+                self._discard(raw)
+                raw = None
+        if raw is None:
+            try:
+                raw = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            self._stats['created'] += 1
+
+        waited = time.monotonic() - started
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['wait_seconds_total'] += waited
+            self._stats['max_wait_seconds'] = max(self._stats['max_wait_seconds'], waited)
+        return PooledConnection(self, raw)
+
+    def acquire_write_lane(self):
+        started = time.perf_counter()
+        if not self.write_lane.acquire(timeout=SQLITE_BUSY_TIMEOUT):
+            with self._cond:
+                self._stats['write_lane_timeouts'] += 1
+            raise sqlite3.OperationalError(f'database is locked (쓰기 차례 대기 시간 초과, {SQLITE_BUSY_TIMEOUT}초)')
+        waited = time.perf_counter() - started
+        metrics.observe('booth_db_write_lane_wait_seconds', (), waited)
+        with self._cond:
+            self._stats['write_lane_waits'] += 1
+            self._stats['write_lane_wait_seconds_total'] += waited
+
+    def release_write_lane(self):
+        self.write_lane.release()
+
+    def release(self, raw):
+        # 열린 트랜잭션은 되돌린 뒤 반납 (커밋되지 않은 변경이 다음 요청으로 새지 않도록)
+        ok = not getattr(raw, 'closed', 0)
+        if ok:
+            try:
+                raw.rollback()
+                if self.engine == 'sqlite':
+                    raw.row_factory = None
+            except Exception:
+                ok = False
+        with self._cond:
+            if ok and os.getpid() == self.pid:
+                self._idle.append((raw, time.monotonic()))
+            else:
+                self._size -= 1
+                self._discard(raw)
+            self._cond.notify()
+
+    def snapshot(self):
+        with self._cond:
+            data = dict(self._stats)
+            data.update({
+                'engine': self.engine,
+                'role': self.role,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'min': self.minsize,
+                'max': self.maxsize,
+                'timeout': self.timeout,
+            })
+            if self.engine == 'sqlite' and self.role == 'primary':
+                data['sqlite_mode'] = SQLITE_MODE
+        data['avg_wait_seconds'] = data['wait_seconds_total'] / data['checkouts'] if data['checkouts'] else 0.0
+        return data
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+psycopg2_extras = None   # postgres 풀을 처음 만들 때 import (SQLite만 쓰면 불러오지 않음)
+
+
+def pool_key(role='primary'):
+    if role == 'replica':
+        return (os.getpid(), role, DATABASE_READ_URL)
+    db_url = os.getenv('DATABASE_URL')
+    return (os.getpid(), role, db_url if db_url and db_url.startswith('postgres') else DB_PATH)
+
+
+def get_pool(role='primary'):
+    """현재 프로세스의 커넥션 풀을 반환합니다 (없으면 생성). role='replica'는 DATABASE_READ_URL 풀.
+    gunicorn --preload 등으로 fork된 경우 부모의 연결을 공유하지 않도록 pid별로 분리합니다."""
+    global psycopg2_extras
+    key = pool_key(role)
+    pool = _pools.get(key)
+    if pool is not None:
+        return pool
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            db_url = key[2]
+            if db_url.startswith('postgres'):
+                import psycopg2.extras
+                psycopg2_extras = psycopg2.extras
+
+                def connect():
+                    import psycopg2
+                    # psycopg2가 설치되어야 함 (requirements.txt에 포함)
+                    return psycopg2.connect(db_url, sslmode='require')
+                pool = ConnectionPool(connect, 'postgres', role=role)
+            elif role == 'replica':
+                # sqlite:///경로: 읽기 전용으로 여는 SQLite 파일 (복제본 대신 쓰는 스냅샷)
+                path = db_url[len('sqlite:///'):] if db_url.startswith('sqlite:///') else db_url
+                uri = 'file:' + urllib.parse.quote(os.path.abspath(path)) + '?mode=ro'
+
+                def connect():
+                    return sqlite3.connect(uri, uri=True, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT)
+                pool = ConnectionPool(connect, 'sqlite', role=role)
+            elif SQLITE_MODE == 'tuned':
+                def connect():
+                    # 쓰기(INSERT/UPDATE/DELETE)는 BEGIN IMMEDIATE로 시작: 읽다가 쓰기로 올릴 때의 즉시 locked 오류 방지
+                    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT,
+                                           isolation_level='IMMEDIATE', cached_statements=SQLITE_CACHED_STATEMENTS)
+                    conn.execute('PRAGMA journal_mode=WAL')       # 읽기와 쓰기가 서로 막지 않음 (DB 파일에 유지됨)
+                    conn.execute('PRAGMA synchronous=NORMAL')     # WAL에서는 체크포인트 때만 fsync
+                    conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+                    conn.execute('PRAGMA cache_size=-16000')      # 연결당 페이지 캐시 약 16MB
+                    conn.execute('PRAGMA temp_store=MEMORY')
+                    return conn
+                pool = ConnectionPool(connect, 'sqlite', write_lane=True)
+            else:
+                def connect():
+                    # 풀의 연결은 여러 스레드에서 번갈아 쓰일 수 있으므로 check_same_thread 해제
+                    return sqlite3.connect(DB_PATH, check_same_thread=False)
+                pool = ConnectionPool(connect, 'sqlite')
+            _pools[key] = pool
+    return pool
+
+
+def get_conn(track_request=True, role='primary'):
+    """지원 DB에 따라 sqlite 또는 postgres 연결을 반환합니다. 반환값: (conn, engine)
+    engine: 'sqlite' or 'postgres'
+    연결은 풀에서 빌려오며 conn.close()는 풀에 반납합니다. 요청 중 반납되지 않은 연결은
+    요청 종료 시 자동으로 반납됩니다 (스트리밍 응답처럼 요청보다 오래 쓰는 경우 track_request=False)."""
+    pool = get_pool(role)
+    started = time.perf_counter()
+    conn = pool.acquire()
+    waited = time.perf_counter() - started
+    metrics.observe('booth_db_conn_acquire_seconds', (), waited)
+    m = request_metrics()
+    if m is not None:
+        m['acquire'] += waited
+    if track_request and has_app_context():
+        g.setdefault('_db_conns', []).append(conn)
+    return conn, pool.engine
+
+
+# --- 쿼리 헬퍼 ---
+def adapt_sql(engine, query):
+    """sqlite 형식(?) 플레이스홀더를 postgres(%s) 형식으로 바꿉니다."""
+    return query if engine == 'sqlite' else query.replace('?', '%s')
+
+
+def dict_cursor(conn, engine):
+    """컬럼 이름으로 접근할 수 있는 커서를 반환합니다 (sqlite3.Row / RealDictCursor)."""
+    if engine == 'sqlite':
+        conn.row_factory = sqlite3.Row
+        return conn.cursor()
+    return conn.cursor(cursor_factory=psycopg2_extras.RealDictCursor)
+
+
+def execute_many(cursor, engine, query, params_list):
+    """sqlite 형식 쿼리를 여러 파라미터로 실행합니다. postgres는 execute_batch로 왕복 횟수를 줄입니다."""
+    if not params_list:
+        return
+    if engine == 'sqlite':
+        cursor.executemany(query, params_list)
+    else:
+        psycopg2_extras.execute_batch(cursor, adapt_sql(engine, query), params_list, page_size=100)
+
+
+def select_in(cursor, engine, query, values, chunk_size=500):
+    """query의 {marks} 자리에 IN 목록을 넣어 나눠 조회하고 모든 행을 반환합니다."""
+    rows = []
+    values = list(values)
+    for i in range(0, len(values), chunk_size):
+        chunk = values[i:i + chunk_size]
+        cursor.execute(adapt_sql(engine, query.format(marks=', '.join('?' * len(chunk)))), chunk)
+        rows.extend(cursor.fetchall())
+    return rows
+
+
+def int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,195 @@
+"""쓰기 지연(write-behind) 저널 (WRITE_BEHIND=1일 때만 app.py가 import)."""
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+
+from booth_db import adapt_sql, dict_cursor, execute_many, get_conn, select_in
+from booth_tickets import publish_ticket_changes, ticket_cache
+
+
+# --- 쓰기 지연(write-behind) 저널 ---
+# WRITE_BEHIND=1이면 save-student는 검증한 주문을 로컬 SQLite 저널(WAL, synchronous=FULL)에 기록하고
+# 티켓 번호와 함께 바로 202로 응답합니다. 백그라운드 스레드가 저널을 순서대로 묶어 students에 반영합니다.
+# 같은 서버의 워커들은 저널 파일을 공유하고, 파일 잠금을 잡은 워커 하나만 반영 작업을 합니다.
+# 서버가 죽으면 잠금이 풀리고, 다음에 잠금을 잡은 워커가 남은 주문부터 이어서 반영합니다 (재시작 시 복구).
+# 반영한 티켓은 같은 트랜잭션에서 write_behind_applied에 기록하므로, 커밋 직후 죽어도 두 번 반영되지 않습니다.
+WRITE_BEHIND_BATCH = int(os.getenv('WRITE_BEHIND_BATCH', '200'))        # 한 트랜잭션에 반영할 최대 주문 수
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', '0.2'))  # 저널이 비었을 때 확인 주기(초)
+WRITE_BEHIND_RETENTION = 3600   # 반영 완료 기록 보관 시간(초)
+
+
+class WriteBehindJournal:
+    """apply_orders(cursor, engine, orders): 저널 순서의 주문 목록을 반영하고 {student_number: (student_id, merged)} 반환 (커밋은 저널)."""
+
+    def __init__(self, path, apply_orders):
+        self._new_ticket = uuid.uuid4
+        self._apply_orders = apply_orders
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._drainer = False
+        self._batches = 0
+        self._stats = {'enqueued': 0, 'applied': 0, 'batches': 0, 'errors': 0, 'last_error': None, 'last_drain_at': None}
+        conn = self._conn()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                ticket TEXT NOT NULL UNIQUE,
+                student_number TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                student_id INTEGER,
+                created_at REAL NOT NULL,
+                applied_at REAL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_journal_status ON journal (status, seq)')
+
+    def _conn(self):
+        # 스레드별 연결 (fork 후에는 새로 엶)
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')   # 커밋마다 fsync: 응답한 주문은 서버가 죽어도 남음
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def append(self, order):
+        """검증된 주문을 저널에 기록하고 티켓 번호를 반환합니다."""
+        ticket = self._new_ticket().hex
+        self._conn().execute(
+            "INSERT INTO journal (ticket, student_number, payload, created_at) VALUES (?, ?, ?, ?)",
+            (ticket, order['student_number'], json.dumps(order, ensure_ascii=False), time.time()))
+        self._count('enqueued')
+        self.start()
+        return ticket
+
+    def start(self):
+        """이 프로세스의 반영 스레드를 시작합니다 (gunicorn fork 후에도 워커마다 한 번)."""
+        pid = os.getpid()
+        if self._pid == pid and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == pid and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = pid
+            self._drainer = False
+            self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+            self._thread.start()
+
+    def _acquire_drain_lock(self):
+        """반영 작업 잠금을 잡을 때까지 기다립니다 (워커가 죽으면 OS가 잠금을 풀어줌)."""
+        if fcntl is None:
+            return None   # fcntl이 없는 환경(Windows 개발 서버)은 단일 프로세스로 가정
+        lock_file = open(self.path + '.lock', 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    def _run(self):
+        self._lock_file = self._acquire_drain_lock()   # 프로세스가 끝날 때까지 유지
+        self._drainer = True
+        depth = self.status()['depth']
+        if depth:
+            print(f'쓰기 지연 저널: 반영되지 않은 주문 {depth}건을 이어서 반영합니다.')
+        while True:
+            try:
+                drained = self.drain_once()
+            except Exception as e:
+                print('쓰기 지연 저널 반영 오류:', e)
+                with self._lock:
+                    self._stats['errors'] += 1
+                    self._stats['last_error'] = str(e)
+                drained = 0
+                time.sleep(1)
+            if drained < WRITE_BEHIND_BATCH:
+                time.sleep(WRITE_BEHIND_INTERVAL)
+
+    def drain_once(self):
+        """대기 중인 주문을 최대 WRITE_BEHIND_BATCH건 한 트랜잭션으로 반영합니다. 반환: 처리한 저널 항목 수"""
+        jconn = self._conn()
+        rows = jconn.execute(
+            "SELECT seq, ticket, student_number, payload FROM journal WHERE status = 'pending' ORDER BY seq LIMIT ?",
+            (WRITE_BEHIND_BATCH,)).fetchall()
+        if not rows:
+            return 0
+
+        conn, engine = get_conn(track_request=False)
+        try:
+            cursor = dict_cursor(conn, engine)
+            # 이전 반영이 커밋된 뒤 저널 표시 전에 중단된 경우: 이미 반영된 티켓은 건너뜀
+            done = {row['ticket']: row['student_id'] for row in select_in(
+                cursor, engine, 'SELECT ticket, student_id FROM write_behind_applied WHERE ticket IN ({marks})', [r[1] for r in rows])}
+            orders = []
+            fresh = []
+            for seq, ticket, sn, payload in rows:
+                if ticket in done:
+                    continue
+                fresh.append((ticket, sn))
+                orders.append(json.loads(payload))
+            applied = self._apply_orders(cursor, engine, orders) if orders else {}
+            now = time.time()
+            for ticket, sn in fresh:
+                done[ticket] = applied[sn][0]
+            execute_many(cursor, engine, 'INSERT INTO write_behind_applied (ticket, student_id, applied_at) VALUES (?, ?, ?)',
+                         [(ticket, done[ticket], now) for ticket, sn in fresh])
+            if applied:
+                publish_ticket_changes(cursor, engine, list(applied))
+            self._batches += 1
+            if self._batches % 100 == 0:
+                cursor.execute(adapt_sql(engine, 'DELETE FROM write_behind_applied WHERE applied_at < ?'), (now - WRITE_BEHIND_RETENTION,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        for sn in applied:
+            ticket_cache.invalidate(sn)
+
+        jconn.execute('BEGIN IMMEDIATE')
+        jconn.executemany("UPDATE journal SET status = 'done', student_id = ?, applied_at = ? WHERE seq = ?",
+                          [(done[r[1]], now, r[0]) for r in rows])
+        if self._batches % 100 == 0:
+            jconn.execute("DELETE FROM journal WHERE status = 'done' AND applied_at < ?", (now - WRITE_BEHIND_RETENTION,))
+        jconn.execute('COMMIT')
+        with self._lock:
+            self._stats['applied'] += len(rows)
+            self._stats['batches'] += 1
+            self._stats['last_drain_at'] = now
+        return len(rows)
+
+    def lookup(self, ticket):
+        """티켓 하나의 처리 상태 (없으면 None)."""
+        row = self._conn().execute('SELECT status, student_number, student_id, created_at, applied_at FROM journal WHERE ticket = ?', (ticket,)).fetchone()
+        if row is None:
+            return None
+        return {'ticket': ticket, 'status': row[0], 'student_number': row[1], 'id': row[2], 'created_at': row[3], 'applied_at': row[4]}
+
+    def status(self):
+        depth, oldest = self._conn().execute("SELECT COUNT(*), MIN(created_at) FROM journal WHERE status = 'pending'").fetchone()
+        with self._lock:
+            data = dict(self._stats)
+        data.update({
+            'enabled': True,
+            'depth': depth,
+            'lag_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+            'drainer': self._drainer,
+            'pid': os.getpid(),
+        })
+        return data
@@ -0,0 +1,168 @@
+"""이용권 원장 (append-only 이벤트)과 원장 재생."""
+import time
+
+from flask import has_request_context, request
+
+from booth_db import adapt_sql, execute_many
+from booth_tickets import publish_ticket_changes, ticket_cache
+
+
+# --- 이용권 원장 (append-only) ---
+# 등록·사용(차감)·조정·결제를 모두 이벤트로 남깁니다. 현재 잔액(student_booths.remaining/issued,
+# students.total_price)은 원장을 합산한 스냅샷이며 같은 트랜잭션에서 함께 갱신됩니다.
+# kind: order(등록: 부스별 delta 행 + 금액 amount 행), redeem(차감), adjust(증가 조정), payment(결제 추가),
+#       opening/opening_used(원장 도입 시점의 기존 잔액), merge/merge_used(dedupe-students로 합친 중복 레코드의 잔액),
+#       delete(레코드 삭제 표시)
+# 재계산 규칙: remaining = SUM(delta), issued = order/opening/merge 행의 SUM(delta), total_price = SUM(amount)
+LEDGER_ISSUE_KINDS = ('order', 'opening', 'merge')
+LEDGER_LIMIT_DEFAULT = 100
+LEDGER_LIMIT_MAX = 1000
+LEDGER_COLUMNS = 'student_id, student_number, booth_number, kind, delta, amount, actor, created_at'
+
+
+def init_ledger(conn, cursor, engine):
+    """원장 테이블/인덱스를 만들고, 처음 만들 때 기존 잔액을 opening 이벤트로 남깁니다."""
+    if engine == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'booth_ledger'")
+    else:
+        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_name = 'booth_ledger'")
+    exists = cursor.fetchone() is not None
+
+    id_column = 'INTEGER PRIMARY KEY AUTOINCREMENT' if engine == 'sqlite' else 'BIGSERIAL PRIMARY KEY'
+    real = 'REAL' if engine == 'sqlite' else 'DOUBLE PRECISION'
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS booth_ledger (
+            id {id_column},
+            student_id INTEGER NOT NULL,
+            student_number TEXT,
+            booth_number INTEGER,
+            kind TEXT NOT NULL,
+            delta INTEGER NOT NULL DEFAULT 0,
+            amount INTEGER NOT NULL DEFAULT 0,
+            actor TEXT,
+            created_at {real} NOT NULL
+        )
+    ''')
+    # 학생별 재생, 부스별 최근 사용 내역, 기간 조회
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_booth_ledger_student ON booth_ledger (student_id, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_booth_ledger_booth ON booth_ledger (booth_number, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_booth_ledger_created_at ON booth_ledger (created_at)')
+
+    if not exists:
+        now = time.time()
+        cursor.execute(adapt_sql(engine, f'''
+            INSERT INTO booth_ledger ({LEDGER_COLUMNS})
+            SELECT b.student_id, s.student_number, b.booth_number, 'opening', b.issued, 0, 'system', ?
+            FROM student_booths b JOIN students s ON s.id = b.student_id
+        '''), (now,))
+        cursor.execute(adapt_sql(engine, f'''
+            INSERT INTO booth_ledger ({LEDGER_COLUMNS})
+            SELECT b.student_id, s.student_number, b.booth_number, 'opening_used', b.remaining - b.issued, 0, 'system', ?
+            FROM student_booths b JOIN students s ON s.id = b.student_id WHERE b.remaining <> b.issued
+        '''), (now,))
+        cursor.execute(adapt_sql(engine, f'''
+            INSERT INTO booth_ledger ({LEDGER_COLUMNS})
+            SELECT id, student_number, NULL, 'opening', 0, total_price, 'system', ? FROM students
+        '''), (now,))
+    conn.commit()
+
+
+def current_actor(default):
+    """이벤트를 남긴 주체: X-Actor 헤더(운영자 이름 등) 또는 기본값 + 요청 IP."""
+    if not has_request_context():
+        return default
+    name = (request.headers.get('X-Actor') or default).strip()[:64]
+    return f'{name}@{request.remote_addr}' if request.remote_addr else name
+
+
+def record_ledger(cursor, engine, events):
+    """원장 이벤트 (student_id, student_number, booth_number, kind, delta, amount, actor) 목록을 추가합니다 (커밋은 호출자)."""
+    now = time.time()
+    execute_many(cursor, engine, f'INSERT INTO booth_ledger ({LEDGER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                 [(*event, now) for event in events])
+
+
+def order_ledger_events(student_id, order):
+    """주문 하나의 원장 이벤트: 부스별 이용 횟수 + 결제 금액."""
+    sn, actor = order['student_number'], order.get('actor')
+    events = [(student_id, sn, int(b['number']), 'order', int(b.get('remaining', 0) or 0), 0, actor) for b in order['booths']]
+    events.append((student_id, sn, None, 'order', 0, order['total_price'], actor))
+    return events
+
+
+def ledger_row_to_dict(row):
+    return {
+        'id': row['id'],
+        'student_id': row['student_id'],
+        'student_number': row['student_number'],
+        'booth_number': row['booth_number'],
+        'kind': row['kind'],
+        'delta': row['delta'],
+        'amount': row['amount'],
+        'actor': row['actor'],
+        'created_at': row['created_at'],
+    }
+
+
+def replay_ledger(conn, cursor, engine, student_ids=None, apply=True):
+    """원장을 합산한 잔액을 스냅샷과 비교하고, apply면 다른 값을 원장 기준으로 고칩니다 (dict_cursor 필요).
+    student_ids가 없으면 전체. 반환: 차이 목록"""
+    if student_ids is None:
+        where, student_where, booth_where, params = '', '', ' WHERE booth_number IS NOT NULL', []
+    else:
+        if not student_ids:
+            return []
+        marks = ', '.join('?' * len(student_ids))
+        where = f' WHERE student_id IN ({marks})'
+        student_where = f' WHERE id IN ({marks})'
+        booth_where = where + ' AND booth_number IS NOT NULL'
+        params = list(student_ids)
+    issue_kinds = ', '.join(f"'{k}'" for k in LEDGER_ISSUE_KINDS)
+
+    cursor.execute(adapt_sql(engine, 'SELECT id, student_number, total_price FROM students' + student_where), params)
+    students = {row['id']: row for row in cursor.fetchall()}
+    cursor.execute(adapt_sql(engine, f'''
+        SELECT student_id, booth_number, SUM(delta) AS remaining,
+               SUM(CASE WHEN kind IN ({issue_kinds}) THEN delta ELSE 0 END) AS issued
+        FROM booth_ledger{booth_where}
+        GROUP BY student_id, booth_number
+    '''), params)
+    ledger_booths = {(row['student_id'], row['booth_number']): (row['remaining'], row['issued']) for row in cursor.fetchall()}
+    cursor.execute(adapt_sql(engine, f'SELECT student_id, SUM(amount) AS total FROM booth_ledger{where} GROUP BY student_id'), params)
+    ledger_totals = {row['student_id']: row['total'] for row in cursor.fetchall()}
+    cursor.execute(adapt_sql(engine, 'SELECT student_id, booth_number, remaining, issued FROM student_booths' + where), params)
+    snapshot = {(row['student_id'], row['booth_number']): (row['remaining'], row['issued']) for row in cursor.fetchall()}
+
+    diffs = []
+    for key in sorted(set(ledger_booths) | set(snapshot)):
+        if key[0] not in students:
+            continue   # 삭제된 학생의 원장 기록
+        expected = ledger_booths.get(key, (0, 0))
+        actual = snapshot.get(key)
+        if actual != expected:
+            diffs.append({'student_id': key[0], 'booth_number': key[1],
+                          'snapshot': None if actual is None else {'remaining': actual[0], 'issued': actual[1]},
+                          'ledger': {'remaining': expected[0], 'issued': expected[1]}})
+    for sid, row in students.items():
+        expected = ledger_totals.get(sid, 0)
+        if row['total_price'] != expected:
+            diffs.append({'student_id': sid, 'booth_number': None,
+                          'snapshot': {'total_price': row['total_price']}, 'ledger': {'total_price': expected}})
+
+    if apply and diffs:
+        # 스냅샷에 없는 부스(이름/가격 정보가 없음)는 차이로만 보고
+        fixable = [d for d in diffs if d['snapshot'] is not None]
+        execute_many(cursor, engine, 'UPDATE student_booths SET remaining = ?, issued = ? WHERE student_id = ? AND booth_number = ?',
+                     [(d['ledger']['remaining'], d['ledger']['issued'], d['student_id'], d['booth_number'])
+                      for d in fixable if d['booth_number'] is not None])
+        execute_many(cursor, engine, 'UPDATE students SET total_price = ? WHERE id = ?',
+                     [(d['ledger']['total_price'], d['student_id']) for d in fixable if d['booth_number'] is None])
+        changed = sorted({d['student_id'] for d in fixable})
+        execute_many(cursor, engine, 'UPDATE students SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                     [(sid,) for sid in changed])
+        numbers = [students[sid]['student_number'] for sid in changed]
+        publish_ticket_changes(cursor, engine, numbers)
+        conn.commit()
+        for sn in numbers:
+            ticket_cache.invalidate(sn)
+    return diffs
@@ -0,0 +1,275 @@
+"""요청 메트릭 레지스트리와 DB 커서/JSON 직렬화 시간 측정 (요청 훅은 app.py)."""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import g, has_app_context
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:
+    DefaultJSONProvider = None   # Flask 2.2 미만: 직렬화 시간은 측정하지 않음
+
+
+# --- 메트릭 (Prometheus 텍스트 형식) ---
+# /api/* 요청마다 요청 수, 지연시간, DB 시간, 직렬화 시간, 연결 대기 시간, 반환 행 수를 기록합니다.
+# gunicorn 워커별 값은 METRICS_DIR/metrics-<pid>.json에 주기적으로 기록되고 /metrics에서 합산됩니다.
+# (배포 시작 시 METRICS_DIR을 비워야 이전 실행의 값이 섞이지 않습니다.)
+# 끝난 워커의 파일은 gunicorn child_exit가 metrics-retired.json에 합쳐 지우고, 남아 있더라도 살아 있지 않은 pid는 건너뜁니다.
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'info_booth_metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', '1'))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+HISTOGRAM_BUCKETS = {
+    'booth_http_request_duration_seconds': LATENCY_BUCKETS,
+    'booth_request_db_seconds': LATENCY_BUCKETS,
+    'booth_request_serialize_seconds': LATENCY_BUCKETS,
+    'booth_db_conn_acquire_seconds': LATENCY_BUCKETS,
+    'booth_db_write_lane_wait_seconds': LATENCY_BUCKETS,
+    'booth_worker_startup_seconds': LATENCY_BUCKETS,
+    'booth_admission_wait_seconds': LATENCY_BUCKETS,
+    'booth_request_rows': ROWS_BUCKETS,
+}
+METRIC_HELP = {
+    'booth_http_requests_total': ('counter', 'API 요청 수'),
+    'booth_http_request_duration_seconds': ('histogram', 'API 요청 처리 시간'),
+    'booth_request_db_seconds': ('histogram', '요청당 DB 쿼리 실행/페치 시간'),
+    'booth_request_serialize_seconds': ('histogram', '요청당 JSON 직렬화 시간'),
+    'booth_db_conn_acquire_seconds': ('histogram', 'get_conn 커넥션 풀 대기 시간'),
+    'booth_worker_startup_seconds': ('histogram', '워커 시작(import + 스키마 확인) 시간'),
+    'booth_db_write_lane_wait_seconds': ('histogram', 'SQLite 쓰기 트랜잭션 시작 전 워커 내 차례 대기 시간'),
+    'booth_admission_wait_seconds': ('histogram', '수락 제어에서 동시 처리 자리를 기다린 시간'),
+    'booth_admission_inflight': ('gauge', '부류별 처리 중인 요청 수'),
+    'booth_admission_shed_total': ('counter', '수락 제어로 거절한 요청 수 (rate_limited=429, overloaded=503)'),
+    'booth_db_replica_lag_seconds': ('gauge', '읽기 복제본 지연 (워커별 마지막 측정값의 합)'),
+    'booth_db_reads_total': ('counter', '읽기 전용 요청의 연결 대상 (replica/primary)과 주 DB로 읽은 이유'),
+    'booth_request_rows': ('histogram', '요청당 DB에서 읽은 행 수'),
+    'booth_profiler_captures_total': ('counter', '프로파일러가 링 버퍼에 기록한 요청 수 (sampled/slow)'),
+    'booth_db_rows_total': ('counter', 'DB에서 읽은 전체 행 수'),
+}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts..., sum, count]
+        self._last_flush = 0.0
+        self.gauges = None      # 워커별 현재 상태 값을 돌려주는 함수 (app.worker_gauges)
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, tuple(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAM_BUCKETS[name]
+        key = (name, tuple(labels))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    h[i] += 1
+                    break
+            h[-2] += value
+            h[-1] += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'counters': [[name, [list(l) for l in labels], v] for (name, labels), v in self._counters.items()],
+                'histograms': [[name, [list(l) for l in labels], list(h)] for (name, labels), h in self._histograms.items()],
+            }
+
+    def flush(self, force=False):
+        """이 워커의 값을 METRICS_DIR에 기록합니다 (METRICS_FLUSH_INTERVAL마다 한 번)."""
+        now = time.monotonic()
+        if not force and now - self._last_flush < METRICS_FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        try:
+            data = self.to_dict()
+            data['gauges'] = self.gauges() if self.gauges is not None else []
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = os.path.join(METRICS_DIR, f'metrics-{os.getpid()}.json')
+            tmp = path + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp, path)
+        except Exception as e:
+            print('메트릭 기록 오류:', e)
+
+
+metrics = MetricsRegistry()
+
+
+def request_metrics():
+    """현재 요청의 DB/직렬화 누적값 (요청 밖이면 None)."""
+    if not has_app_context():
+        return None
+    m = g.get('_metrics')
+    if m is None:
+        m = g._metrics = {'db': 0.0, 'rows': 0, 'acquire': 0.0, 'serialize': 0.0}
+    return m
+
+
+class TimedCursor:
+    """DB 커서 프록시: execute/fetch 시간과 읽은 행 수를 요청 메트릭에 더합니다.
+    before_execute가 있으면 execute/executemany 전에 쿼리 문자열로 호출합니다 (SQLite 쓰기 차례 대기)."""
+
+    def __init__(self, cursor, before_execute=None):
+        object.__setattr__(self, '_cursor', cursor)
+        object.__setattr__(self, '_before_execute', before_execute)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        while True:
+            row = self.fetchone()
+            if row is None:
+                return
+            yield row
+
+    def _timed(self, method, *args, rows=None):
+        started = time.perf_counter()
+        result = getattr(self._cursor, method)(*args)
+        m = request_metrics()
+        if m is not None:
+            elapsed = time.perf_counter() - started
+            m['db'] += elapsed
+            if rows is not None:
+                m['rows'] += rows(result)
+            sql = m.get('sql')
+            if sql is not None:
+                # 프로파일러가 이 요청을 기록 중: 문장별 시간/행 수 (fetch는 직전 문장에 더함)
+                if rows is None:
+                    query = args[0].decode('utf-8', 'replace') if isinstance(args[0], bytes) else str(args[0])   # execute_batch는 bytes
+                    sql.append({'sql': ' '.join(query.split())[:500], 'ms': round(elapsed * 1000, 3), 'rows': 0,
+                                'batch': len(args[1]) if method == 'executemany' and hasattr(args[1], '__len__') else None})
+                elif sql:
+                    sql[-1]['ms'] = round(sql[-1]['ms'] + elapsed * 1000, 3)
+                    sql[-1]['rows'] += rows(result)
+        return result
+
+    def execute(self, *args):
+        if self._before_execute is not None:
+            self._before_execute(args[0])
+        self._timed('execute', *args)
+        return self
+
+    def executemany(self, *args):
+        if self._before_execute is not None:
+            self._before_execute(args[0])
+        self._timed('executemany', *args)
+        return self
+
+    def fetchone(self):
+        return self._timed('fetchone', rows=lambda r: 0 if r is None else 1)
+
+    def fetchmany(self, *args):
+        return self._timed('fetchmany', *args, rows=len)
+
+    def fetchall(self):
+        return self._timed('fetchall', rows=len)
+
+
+if DefaultJSONProvider is not None:
+    class TimedJSONProvider(DefaultJSONProvider):
+        """jsonify 직렬화 시간을 요청 메트릭에 더합니다."""
+
+        def dumps(self, obj, **kwargs):
+            started = time.perf_counter()
+            result = super().dumps(obj, **kwargs)
+            m = request_metrics()
+            if m is not None:
+                m['serialize'] += time.perf_counter() - started
+            return result
+else:
+    TimedJSONProvider = None
+
+
+def _format_labels(labels, extra=None):
+    items = [tuple(l) for l in labels] + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in items) + '}'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def render_metrics():
+    """모든 워커의 기록을 합산해 Prometheus 텍스트 형식으로 만듭니다."""
+    metrics.flush(force=True)
+    counters, histograms, gauges = {}, {}, {}
+    try:
+        names = os.listdir(METRICS_DIR)
+    except FileNotFoundError:
+        names = []
+    for fname in names:
+        if not (fname.startswith('metrics-') and fname.endswith('.json')):
+            continue
+        pid = fname[len('metrics-'):-len('.json')]
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            continue   # 비정상 종료 등으로 child_exit가 정리하지 못한 워커 (게이지가 계속 더해지지 않도록)
+        try:
+            with open(os.path.join(METRICS_DIR, fname)) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, labels, value in data.get('counters', []):
+            key = (name, tuple(tuple(l) for l in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in data.get('histograms', []):
+            key = (name, tuple(tuple(l) for l in labels))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], h)]
+            else:
+                histograms[key] = list(h)
+        for name, labels, value in data.get('gauges', []):
+            key = (name, tuple(tuple(l) for l in labels))
+            gauges[key] = gauges.get(key, 0) + value
+
+    lines = []
+    typed = set()
+
+    def type_line(name, default_type):
+        if name not in typed:
+            typed.add(name)
+            mtype, help_text = METRIC_HELP.get(name, (default_type, None))
+            if help_text:
+                lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {mtype}')
+
+    for (name, labels), value in sorted(counters.items()):
+        type_line(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+    for (name, labels), h in sorted(histograms.items()):
+        type_line(name, 'histogram')
+        cumulative = 0
+        for bound, count in zip(HISTOGRAM_BUCKETS[name], h[:-2]):
+            cumulative += count
+            lines.append(f'{name}_bucket{_format_labels(labels, ("le", bound))} {cumulative}')
+        lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {h[-1]}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {h[-2]}')
+        lines.append(f'{name}_count{_format_labels(labels)} {h[-1]}')
+    for (name, labels), value in sorted(gauges.items()):
+        type_line(name, 'counter' if name.endswith('_total') else 'gauge')
+        lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
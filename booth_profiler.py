@@ -0,0 +1,287 @@
+"""관리자가 켜고 끄는 요청 프로파일러 (PROFILER가 켜져 있을 때만 app.py가 import)."""
+import cProfile
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter, deque
+
+from flask import request
+
+from booth_metrics import METRICS_DIR, METRICS_FLUSH_INTERVAL, request_metrics
+
+
+# --- 요청 프로파일러 (관리자가 켜고 끔) ---
+# 설정은 METRICS_DIR/profiler.json에 두고 워커들이 PROFILER_CONFIG_CHECK_INTERVAL마다 수정 시각을 확인합니다.
+# - sample_rate / route: 해당 요청을 cProfile(mode=cprofile) 또는 스택 샘플링(mode=sample)으로 기록
+# - slow_ms: 모든 /api 요청의 SQL을 모아 두고 스택을 샘플링하다가, 이 시간을 넘긴 요청만 기록
+# 기록은 워커별 링 버퍼(PROFILER_BUFFER_SIZE개)에 남고 METRICS_DIR/profiles-<pid>.json으로 합쳐 내려받습니다.
+# 꺼져 있으면 요청마다 설정 확인(시각 비교) 한 번만 합니다. 켠 설정은 expires_at이 지나면 자동으로 꺼집니다.
+PROFILER_BUFFER_SIZE = int(os.getenv('PROFILER_BUFFER_SIZE', '50'))
+PROFILER_SLOW_MS = float(os.getenv('PROFILER_SLOW_MS', '0'))           # 배포 시 기본으로 켜 둘 느린 요청 기준 (0이면 끔)
+PROFILER_SAMPLE_INTERVAL = float(os.getenv('PROFILER_SAMPLE_INTERVAL', '0.005'))   # 스택 샘플링 간격(초)
+PROFILER_MAX_DURATION = 3600            # 한 번 켤 때 최대 유지 시간(초)
+PROFILER_CONFIG_CHECK_INTERVAL = 1.0
+PROFILER_MAX_SQL = 200                  # 요청당 기록할 SQL 문 수
+PROFILER_TOP_FUNCTIONS = 40
+PROFILER_TOP_STACKS = 30
+PROFILER_STACK_DEPTH = 40
+PROFILER_CONFIG_PATH = os.path.join(METRICS_DIR, 'profiler.json')
+
+
+class RequestProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()   # cProfile은 워커에서 한 번에 한 요청만
+        self.buffer = deque(maxlen=PROFILER_BUFFER_SIZE)
+        self.config = self.default_config()
+        self._config_mtime = None
+        self._checked = 0.0
+        self._active = {}                       # 스레드 id -> 스택 샘플 Counter
+        self._sampler = None
+        self._dirty = False
+        self._last_flush = 0.0
+        self._seq = 0
+        self.captured = 0
+
+    @staticmethod
+    def default_config():
+        return {'mode': 'cprofile', 'sample_rate': 0.0, 'route': None, 'slow_ms': PROFILER_SLOW_MS, 'expires_at': None}
+
+    def current(self):
+        """현재 설정 (꺼져 있거나 만료됐으면 None)."""
+        now = time.monotonic()
+        if now - self._checked >= PROFILER_CONFIG_CHECK_INTERVAL:
+            self._checked = now
+            self._reload()
+        config = self.config
+        if not (config['sample_rate'] or config['route'] or config['slow_ms']):
+            return None
+        if config['expires_at'] is not None and time.time() > config['expires_at']:
+            return None
+        return config
+
+    def _reload(self):
+        try:
+            mtime = os.path.getmtime(PROFILER_CONFIG_PATH)
+        except OSError:
+            mtime = None
+        if mtime == self._config_mtime:
+            return
+        config = self.default_config()
+        if mtime is not None:
+            try:
+                with open(PROFILER_CONFIG_PATH) as f:
+                    config.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print('프로파일러 설정 읽기 오류:', e)
+                return
+        self._config_mtime = mtime
+        self.config = config
+
+    def configure(self, data):
+        """관리자 요청 값으로 설정을 저장합니다 (모든 워커에 적용). 잘못된 값이면 ValueError."""
+        config = self.default_config()
+        config['slow_ms'] = 0.0
+        if data.get('enabled', True):
+            mode = data.get('mode', 'cprofile')
+            if mode not in ('cprofile', 'sample'):
+                raise ValueError('mode는 cprofile 또는 sample입니다.')
+            sample_rate = float(data.get('sample_rate', 0))
+            slow_ms = float(data.get('slow_ms', 0))
+            duration = float(data.get('duration', 300))
+            if not 0 <= sample_rate <= 1 or slow_ms < 0 or not 0 < duration <= PROFILER_MAX_DURATION:
+                raise ValueError(f'sample_rate는 0~1, slow_ms는 0 이상, duration은 1~{PROFILER_MAX_DURATION}초입니다.')
+            config.update(mode=mode, sample_rate=sample_rate, route=data.get('route') or None,
+                          slow_ms=slow_ms, expires_at=time.time() + duration)
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        tmp = f'{PROFILER_CONFIG_PATH}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(config, f)
+        os.replace(tmp, PROFILER_CONFIG_PATH)
+        self._checked = 0.0
+        return config
+
+    # --- 요청 단위 ---
+    def start(self, config, rule):
+        """이 요청을 기록할지 정하고 준비합니다. 반환: 요청 상태 dict 또는 None"""
+        targeted = (config['route'] is not None and config['route'] == rule) or \
+            (config['sample_rate'] and random.random() < config['sample_rate'])
+        if not targeted and not config['slow_ms']:
+            return None
+        state = {'reason': 'sampled' if targeted else None, 'slow_ms': config['slow_ms'], 'thread': threading.get_ident(),
+                 'profile': None, 'profiling': False, 'samples': None}
+        request_metrics()['sql'] = []
+        if targeted and config['mode'] == 'cprofile' and self._profile_lock.acquire(blocking=False):
+            try:
+                state['profile'] = cProfile.Profile()
+                state['profile'].enable()
+                state['profiling'] = True
+            except ValueError:
+                # 다른 프로파일링 도구가 이미 켜져 있음 (Python 3.12+): 스택 샘플링으로 대신함
+                state['profile'] = None
+                self._profile_lock.release()
+        if state['profile'] is None:
+            state['samples'] = Counter()
+            self._active[state['thread']] = state['samples']
+            self._ensure_sampler()
+        return state
+
+    def stop_profile(self, state):
+        if state['profiling']:
+            state['profile'].disable()
+            state['profiling'] = False
+            self._profile_lock.release()
+
+    def finish(self, state, duration, status):
+        self.stop_profile(state)
+        self._active.pop(state['thread'], None)
+        reason = state['reason']
+        if state['slow_ms'] and duration * 1000 >= state['slow_ms']:
+            reason = 'slow'
+        if reason is None:
+            return
+        m = request_metrics()
+        sql = m.get('sql') or []
+        args = [(k, v) for k, v in request.args.items(multi=True) if k != 'admin_password']
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        record = {
+            'id': f'{os.getpid()}-{seq}',
+            'pid': os.getpid(),
+            'at': time.time(),
+            'reason': reason,
+            'method': request.method,
+            'path': request.path + ('?' + urllib.parse.urlencode(args) if args else ''),
+            'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+            'status': status,
+            'duration_ms': round(duration * 1000, 2),
+            'db_ms': round(m['db'] * 1000, 2),
+            'rows': m['rows'],
+            'serialize_ms': round(m['serialize'] * 1000, 2),
+            'sql': sql[:PROFILER_MAX_SQL],
+            'sql_count': len(sql),
+        }
+        if state['profile'] is not None:
+            record['profile'] = self._profile_rows(state['profile'])
+        if state['samples'] is not None:
+            # flamegraph.pl / speedscope에서 읽을 수 있는 접힌 스택 형식 (바깥;...;안쪽 → 샘플 수)
+            record['sample_interval_ms'] = PROFILER_SAMPLE_INTERVAL * 1000
+            record['stacks'] = [{'stack': s, 'samples': n} for s, n in state['samples'].most_common(PROFILER_TOP_STACKS)]
+        with self._lock:
+            self.buffer.append(record)
+            self.captured += 1
+            self._dirty = True
+        print(f'프로파일 기록 ({reason}): {request.method} {record["path"]} {record["duration_ms"]}ms, SQL {len(sql)}개')
+
+    @staticmethod
+    def _profile_rows(profile):
+        stats = pstats.Stats(profile)
+        rows = []
+        for (filename, line, func), (cc, ncalls, tottime, cumtime, _) in stats.stats.items():
+            rows.append({'function': f'{os.path.basename(filename)}:{line}({func})', 'ncalls': ncalls,
+                         'tottime_ms': round(tottime * 1000, 3), 'cumtime_ms': round(cumtime * 1000, 3)})
+        rows.sort(key=lambda r: r['cumtime_ms'], reverse=True)
+        return rows[:PROFILER_TOP_FUNCTIONS]
+
+    # --- 스택 샘플러 ---
+    def _ensure_sampler(self):
+        if self._sampler is not None and self._sampler.is_alive():
+            return
+        with self._lock:
+            if self._sampler is None or not self._sampler.is_alive():
+                self._sampler = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                self._sampler.start()
+
+    def _sample_loop(self):
+        # 기록 중인 요청이 없으면 잠시 기다렸다 끝냄 (다음 요청이 다시 시작)
+        idle_since = None
+        while True:
+            time.sleep(PROFILER_SAMPLE_INTERVAL)
+            active = list(self._active.items())
+            if not active:
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since > 5:
+                    with self._lock:
+                        self._sampler = None
+                    return
+                continue
+            idle_since = None
+            for samples, stack in self._sample_stacks(active):
+                samples[stack] += 1
+
+    @staticmethod
+    def _sample_stacks(active):
+        # 프레임 객체는 이 함수 안에서만 잡고 있음: 잠든 동안 쥐고 있으면 끝난 요청의 지역 변수(DB 커서 등)가
+        # 샘플러 스레드에서 해제되어, 그 연결을 이어 쓰는 다른 요청과 충돌함
+        frames = sys._current_frames()
+        stacks = []
+        for ident, samples in active:
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None and len(stack) < PROFILER_STACK_DEPTH:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if stack:
+                stacks.append((samples, ';'.join(reversed(stack))))
+        return stacks
+
+    # --- 링 버퍼 기록/조회 ---
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not self._dirty or (not force and now - self._last_flush < METRICS_FLUSH_INTERVAL):
+            return
+        self._last_flush = now
+        with self._lock:
+            records = list(self.buffer)
+            self._dirty = False
+        try:
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            path = os.path.join(METRICS_DIR, f'profiles-{os.getpid()}.json')
+            with open(path + '.tmp', 'w') as f:
+                json.dump(records, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+        except Exception as e:
+            print('프로파일 기록 오류:', e)
+
+    def records(self):
+        """모든 워커의 기록 (최신 순)."""
+        self.flush(force=True)
+        records = []
+        try:
+            names = os.listdir(METRICS_DIR)
+        except FileNotFoundError:
+            names = []
+        for fname in names:
+            if fname.startswith('profiles-') and fname.endswith('.json'):
+                try:
+                    with open(os.path.join(METRICS_DIR, fname)) as f:
+                        records.extend(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        records.sort(key=lambda r: r['at'], reverse=True)
+        return records
+
+    def clear(self):
+        with self._lock:
+            self.buffer.clear()
+            self._dirty = False
+        for fname in os.listdir(METRICS_DIR) if os.path.isdir(METRICS_DIR) else []:
+            if fname.startswith('profiles-') and fname.endswith('.json'):
+                try:
+                    os.remove(os.path.join(METRICS_DIR, fname))
+                except OSError:
+                    pass
+
+    def snapshot(self):
+        config = self.current()
+        with self._lock:
+            buffered = len(self.buffer)
+        return {'enabled': config is not None, 'config': self.config, 'buffered': buffered,
+                'buffer_size': PROFILER_BUFFER_SIZE, 'active': len(self._active)}
@@ -0,0 +1,75 @@
+"""QR 이용권 토큰 서명/검증."""
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+
+
+# --- QR 이용권 토큰 ---
+# 마이티켓 화면의 QR에 "학생 id.버전.남은 횟수가 있는 부스 번호들.서명"을 담습니다 (예: 123.4.1-3.Xb9...).
+# 부스 스캐너는 /api/redeem 한 번으로 차감합니다. 서명은 메모리에서 검증하고, 버전이 DB와 같을 때만
+# 차감하므로 사용/변경 후의 옛 QR(스크린샷 등)은 거절됩니다. 마이티켓은 SSE로 새 QR을 바로 받습니다.
+QR_TOKEN_SECRET = os.getenv('QR_TOKEN_SECRET') or os.getenv('SECRET_KEY')
+QR_TOKEN_PLACEHOLDER_SECRETS = ('change_me', 'your_secret')   # .env.example / README_RENDER.md의 예시 값
+# 비밀 키가 없을 때 만들어 두는 키 파일. 기본 위치는 정적 파일 디렉터리 밖인 instance/ (Flask app.instance_path와 같은 곳)
+QR_TOKEN_KEY_PATH = os.getenv('QR_TOKEN_KEY_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'qr_token.key')
+QR_TOKEN_SIG_BYTES = 12   # HMAC-SHA256 앞 96비트 (QR을 작게 유지)
+_qr_key = None
+_qr_key_lock = threading.Lock()
+
+
+def qr_key():
+    """서명 키. QR_TOKEN_SECRET/SECRET_KEY가 없거나 예시 값이면 키 파일을 한 번 만들어 같은 서버의 워커가 함께 씁니다."""
+    global _qr_key
+    if _qr_key is not None:
+        return _qr_key
+    with _qr_key_lock:
+        if _qr_key is not None:
+            return _qr_key
+        if QR_TOKEN_SECRET and QR_TOKEN_SECRET not in QR_TOKEN_PLACEHOLDER_SECRETS:
+            _qr_key = QR_TOKEN_SECRET.encode()
+        else:
+            if QR_TOKEN_SECRET:
+                # 공개된 예시 값으로 서명하면 누구나 이용권을 위조할 수 있음
+                print(f'경고: QR_TOKEN_SECRET/SECRET_KEY가 예시 값이라 쓰지 않고 {QR_TOKEN_KEY_PATH} 키 파일로 서명합니다.')
+            if not os.path.exists(QR_TOKEN_KEY_PATH):
+                os.makedirs(os.path.dirname(os.path.abspath(QR_TOKEN_KEY_PATH)), exist_ok=True)
+                tmp = f'{QR_TOKEN_KEY_PATH}.{os.getpid()}.tmp'
+                with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                    f.write(secrets.token_hex(32))
+                try:
+                    os.link(tmp, QR_TOKEN_KEY_PATH)   # 이미 있으면(다른 워커가 먼저 만듦) 실패하고 그 키를 씀
+                except FileExistsError:
+                    pass
+                finally:
+                    os.remove(tmp)
+            with open(QR_TOKEN_KEY_PATH) as f:
+                _qr_key = f.read().strip().encode()
+    return _qr_key
+
+
+def _qr_signature(payload):
+    digest = hmac.new(qr_key(), payload.encode(), hashlib.sha256).digest()[:QR_TOKEN_SIG_BYTES]
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def sign_qr_token(student_id, version, booth_numbers):
+    payload = f"{student_id}.{version}.{'-'.join(str(n) for n in sorted(booth_numbers))}"
+    return payload + '.' + _qr_signature(payload)
+
+
+def qr_token(student_id, version, booths):
+    """API 형식 부스 목록 중 남은 횟수가 있는 부스로 QR 토큰을 만듭니다."""
+    return sign_qr_token(student_id, version, [b['number'] for b in booths if (b.get('remaining') or 0) > 0])
+
+
+def parse_qr_token(token):
+    """서명을 검증한 토큰의 (student_id, version, 부스 번호 set). 형식이나 서명이 틀리면 ValueError."""
+    parts = token.strip().split('.')
+    if len(parts) != 4:
+        raise ValueError('형식 오류')
+    if not hmac.compare_digest(parts[3], _qr_signature('.'.join(parts[:3]))):
+        raise ValueError('서명 불일치')
+    return int(parts[0]), int(parts[1]), {int(n) for n in parts[2].split('-') if n}
@@ -0,0 +1,118 @@
+"""읽기 복제본 상태 추적 (DATABASE_READ_URL이 있을 때만 app.py가 import)."""
+import os
+import threading
+import time
+
+from flask import has_request_context, request
+
+from booth_db import _pools, get_conn, pool_key
+
+
+# --- 읽기 복제본 라우팅 ---
+# 조회/검색/내보내기처럼 읽기만 하는 요청은 get_read_conn()으로 DATABASE_READ_URL에서 읽습니다.
+# 다음 경우에는 주 DB에서 읽습니다.
+# - 이 클라이언트가 READ_YOUR_WRITES_SECONDS 안에 쓰기 요청을 보냄 (쿠키로 고정, 방금 쓴 내용이 바로 보이도록)
+# - 복제본 연결이 실패함 (READ_REPLICA_RETRY초 동안 제외)
+# - 복제본이 READ_REPLICA_MAX_LAG초보다 뒤처짐 (두 DB의 마지막 원장 이벤트 시각 차이로 측정)
+# 지연은 워커별 백그라운드 스레드(replica-lag)가 READ_REPLICA_LAG_INTERVAL마다 재고, 요청은 마지막 측정값만 읽습니다.
+READ_REPLICA_MAX_LAG = float(os.getenv('READ_REPLICA_MAX_LAG', '2'))
+READ_REPLICA_LAG_INTERVAL = float(os.getenv('READ_REPLICA_LAG_INTERVAL', '1'))   # 지연 측정 주기(초)
+READ_REPLICA_RETRY = float(os.getenv('READ_REPLICA_RETRY', '30'))
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+READ_PIN_COOKIE = 'booth_primary_until'
+
+
+class ReadReplica:
+    """이 워커가 본 복제본 상태 (장애 여부, 마지막으로 측정한 지연)와 읽기 라우팅 통계."""
+
+    def __init__(self, url):
+        self.url = url
+        self.down_until = 0.0
+        self.lag = None           # 초, 아직 측정 전이거나 측정 실패면 None
+        self.last_error = None
+        self._lag_checked = 0.0
+        self._thread = None
+        self._thread_pid = None   # fork된 워커에서는 스레드를 새로 시작
+        self._lock = threading.Lock()
+        self._stats = {}          # (대상, 이유) -> 읽기 수
+
+    def mark_down(self, error):
+        self.down_until = time.monotonic() + READ_REPLICA_RETRY
+        self.lag = None
+        self.last_error = str(error)
+        print(f'읽기 복제본을 {READ_REPLICA_RETRY:g}초 동안 쓰지 않고 주 DB에서 읽습니다:', error)
+
+    def _measure_lag(self):
+        """두 DB의 마지막 원장 이벤트 시각 차이(초). 쓰기가 없으면 0."""
+        latest = []
+        for role in ('primary', 'replica'):
+            conn, _ = get_conn(track_request=False, role=role)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('SELECT MAX(created_at) FROM booth_ledger')
+                latest.append(cursor.fetchone()[0] or 0.0)
+            finally:
+                conn.close()
+        return max(0.0, latest[0] - latest[1])
+
+    def start(self):
+        """지연 측정 스레드를 시작합니다 (이 프로세스에서 이미 돌고 있으면 그대로)."""
+        if self._thread_pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='replica-lag', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            if time.monotonic() >= self.down_until:
+                try:
+                    self.lag = self._measure_lag()
+                    self._lag_checked = time.monotonic()
+                except Exception as e:
+                    self.mark_down(e)
+            time.sleep(READ_REPLICA_LAG_INTERVAL)
+
+    def current_lag(self):
+        """마지막 측정값 (요청 중에는 DB에 묻지 않음). 측정이 오래 멈춰 있으면 알 수 없음(None)."""
+        self.start()
+        if time.monotonic() - self._lag_checked > max(READ_REPLICA_LAG_INTERVAL * 5, 5):
+            return None
+        return self.lag
+
+    def unusable_reason(self):
+        """복제본에서 읽으면 안 되는 이유 (읽어도 되면 None)."""
+        if has_request_context():
+            try:
+                if float(request.cookies.get(READ_PIN_COOKIE) or 0) > time.time():
+                    return 'pinned'
+            except ValueError:
+                pass
+        if time.monotonic() < self.down_until:
+            return 'down'
+        lag = self.current_lag()
+        if lag is None:
+            return 'down'
+        if lag > READ_REPLICA_MAX_LAG:
+            return 'lagging'
+        return None
+
+    def count(self, target, reason):
+        with self._lock:
+            self._stats[(target, reason)] = self._stats.get((target, reason), 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            reads = [{'target': t, 'reason': r, 'count': n} for (t, r), n in sorted(self._stats.items())]
+        pool = _pools.get(pool_key('replica'))
+        return {
+            'lag_seconds': self.lag,
+            'max_lag_seconds': READ_REPLICA_MAX_LAG,
+            'down_for_seconds': max(0.0, self.down_until - time.monotonic()),
+            'last_error': self.last_error,
+            'reads': reads,
+            'pool': pool.snapshot() if pool is not None else None,
+        }
@@ -0,0 +1,222 @@
+"""관리자 대시보드 집계 테이블 (트리거로 갱신, 조회는 부스 수에 비례)."""
+from booth_db import adapt_sql
+
+
+# --- 관리자 대시보드 집계 ---
+# 총매출/학생 수(stats_totals), 부스별 발급·남은 횟수·골든/파생 이용권 수(stats_booths), 분 단위 신규 등록 수(stats_signups)를
+# students/student_booths 트리거로 쓰기와 같은 트랜잭션에서 갱신합니다. 조회는 부스 수에만 비례합니다.
+# 신규 등록 수는 레코드가 처음 생길 때만 더하고 삭제해도 빼지 않습니다 (재계산 시에는 현재 레코드의 created_at 기준).
+# 동시에 들어온 주문/차감이 한 행의 잠금을 기다리지 않도록 값은 학생 id % STATS_SHARDS 행에 나눠 더하고 읽을 때 합칩니다.
+STATS_SHARDS = 16
+SIGNUP_BUCKET_SQL = {
+    'sqlite': "strftime('%Y-%m-%d %H:%M', {})",
+    'postgres': "to_char({}, 'YYYY-MM-DD HH24:MI')",
+}
+
+
+def init_stats(conn, cursor, engine):
+    """집계 테이블과 트리거를 만들고, 처음 만들 때 기존 데이터로 채웁니다."""
+    if engine == 'sqlite':
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'stats_booths'")
+    else:
+        cursor.execute("SELECT 1 FROM information_schema.tables WHERE table_name = 'stats_booths'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_totals (
+            name TEXT NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            value BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, shard)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_booths (
+            booth_number INTEGER NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            holders INTEGER NOT NULL DEFAULT 0,
+            issued BIGINT NOT NULL DEFAULT 0,
+            remaining BIGINT NOT NULL DEFAULT 0,
+            golden INTEGER NOT NULL DEFAULT 0,
+            derived INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (booth_number, shard)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stats_signups (
+            bucket TEXT NOT NULL,
+            shard INTEGER NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket, shard)
+        )
+    ''')
+
+    if engine == 'sqlite':
+        # INSERT OR IGNORE는 바깥 문장(upsert)의 충돌 처리 방식으로 덮어써지므로 NOT EXISTS로 행을 준비
+        booth_delta = '''
+            INSERT INTO stats_booths (booth_number, shard) SELECT {r}.booth_number, {r}.student_id % {n}
+            WHERE NOT EXISTS (SELECT 1 FROM stats_booths WHERE booth_number = {r}.booth_number AND shard = {r}.student_id % {n});
+            UPDATE stats_booths SET holders = holders {op} 1, issued = issued {op} {r}.issued,
+                remaining = remaining {op} {r}.remaining,
+                golden = golden {op} COALESCE({r}.is_golden, 0), derived = derived {op} COALESCE({r}.derived, 0)
+            WHERE booth_number = {r}.booth_number AND shard = {r}.student_id % {n};
+        '''
+        add = booth_delta.format(r='new', op='+', n=STATS_SHARDS)
+        sub = booth_delta.format(r='old', op='-', n=STATS_SHARDS)
+        bucket = SIGNUP_BUCKET_SQL['sqlite'].format('new.created_at')
+        shard, old_shard = f'new.id % {STATS_SHARDS}', f'old.id % {STATS_SHARDS}'
+        for name, body in (
+            ('stats_booths_ai AFTER INSERT ON student_booths', add),
+            ('stats_booths_ad AFTER DELETE ON student_booths', sub),
+            ('stats_booths_au AFTER UPDATE ON student_booths', sub + add),
+            ('stats_students_ai AFTER INSERT ON students', f'''
+                INSERT INTO stats_totals (name, shard) SELECT 'revenue', {shard} WHERE NOT EXISTS (SELECT 1 FROM stats_totals WHERE name = 'revenue' AND shard = {shard});
+                INSERT INTO stats_totals (name, shard) SELECT 'students', {shard} WHERE NOT EXISTS (SELECT 1 FROM stats_totals WHERE name = 'students' AND shard = {shard});
+                UPDATE stats_totals SET value = value + new.total_price WHERE name = 'revenue' AND shard = {shard};
+                UPDATE stats_totals SET value = value + 1 WHERE name = 'students' AND shard = {shard};
+                INSERT INTO stats_signups (bucket, shard) SELECT {bucket}, {shard} WHERE NOT EXISTS (SELECT 1 FROM stats_signups WHERE bucket = {bucket} AND shard = {shard});
+                UPDATE stats_signups SET count = count + 1 WHERE bucket = {bucket} AND shard = {shard};
+            '''),
+            ('stats_students_au AFTER UPDATE OF total_price ON students', f'''
+                UPDATE stats_totals SET value = value + new.total_price - old.total_price WHERE name = 'revenue' AND shard = {shard};
+            '''),
+            ('stats_students_ad AFTER DELETE ON students', f'''
+                UPDATE stats_totals SET value = value - old.total_price WHERE name = 'revenue' AND shard = {old_shard};
+                UPDATE stats_totals SET value = value - 1 WHERE name = 'students' AND shard = {old_shard};
+            '''),
+        ):
+            cursor.execute(f'CREATE TRIGGER IF NOT EXISTS {name} BEGIN {body} END')
+    else:
+        booth_delta = '''
+            INSERT INTO stats_booths (booth_number, shard) VALUES ({r}.booth_number, {r}.student_id % {n}) ON CONFLICT DO NOTHING;
+            UPDATE stats_booths SET holders = holders {op} 1, issued = issued {op} {r}.issued,
+                remaining = remaining {op} {r}.remaining,
+                golden = golden {op} ({r}.is_golden IS TRUE)::int, derived = derived {op} ({r}.derived IS TRUE)::int
+            WHERE booth_number = {r}.booth_number AND shard = {r}.student_id % {n};
+        '''
+        bucket = SIGNUP_BUCKET_SQL['postgres'].format('NEW.created_at')
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION stats_student_booths_trg() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN {booth_delta.format(r='OLD', op='-', n=STATS_SHARDS)} END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN {booth_delta.format(r='NEW', op='+', n=STATS_SHARDS)} END IF;
+                RETURN NULL;
+            END $$
+        ''')
+        cursor.execute(f'''
+            CREATE OR REPLACE FUNCTION stats_students_trg() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    INSERT INTO stats_totals (name, shard, value)
+                    VALUES ('revenue', NEW.id % {STATS_SHARDS}, NEW.total_price), ('students', NEW.id % {STATS_SHARDS}, 1)
+                    ON CONFLICT (name, shard) DO UPDATE SET value = stats_totals.value + excluded.value;
+                    INSERT INTO stats_signups (bucket, shard, count) VALUES ({bucket}, NEW.id % {STATS_SHARDS}, 1)
+                    ON CONFLICT (bucket, shard) DO UPDATE SET count = stats_signups.count + 1;
+                ELSIF TG_OP = 'UPDATE' THEN
+                    UPDATE stats_totals SET value = value + NEW.total_price - OLD.total_price
+                    WHERE name = 'revenue' AND shard = NEW.id % {STATS_SHARDS};
+                ELSE
+                    UPDATE stats_totals SET value = value - OLD.total_price WHERE name = 'revenue' AND shard = OLD.id % {STATS_SHARDS};
+                    UPDATE stats_totals SET value = value - 1 WHERE name = 'students' AND shard = OLD.id % {STATS_SHARDS};
+                END IF;
+                RETURN NULL;
+            END $$
+        ''')
+        for name, ddl in (
+            ('stats_student_booths', 'AFTER INSERT OR UPDATE OR DELETE ON student_booths FOR EACH ROW EXECUTE FUNCTION stats_student_booths_trg()'),
+            ('stats_students', 'AFTER INSERT OR UPDATE OF total_price OR DELETE ON students FOR EACH ROW EXECUTE FUNCTION stats_students_trg()'),
+        ):
+            cursor.execute('SELECT 1 FROM pg_trigger WHERE tgname = %s', (name,))
+            if not cursor.fetchone():
+                cursor.execute(f'CREATE TRIGGER {name} {ddl}')
+    conn.commit()
+    if not exists:
+        rebuild_stats(conn, cursor, engine)
+
+
+def shard_stats(conn, cursor, engine):
+    """버전 8의 집계 형식(값마다 한 행)을 shard 열로 나눈 형식으로 바꾸고 다시 계산합니다."""
+    if engine == 'sqlite':
+        cursor.execute('PRAGMA table_info(stats_booths)')
+        columns = [row[1] for row in cursor.fetchall()]
+    else:
+        cursor.execute("SELECT column_name FROM information_schema.columns WHERE table_name = 'stats_booths'")
+        columns = [row[0] for row in cursor.fetchall()]
+    if 'shard' in columns:
+        return
+    if engine == 'sqlite':
+        for name in ('stats_booths_ai', 'stats_booths_ad', 'stats_booths_au', 'stats_students_ai', 'stats_students_au', 'stats_students_ad'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+    else:
+        cursor.execute('DROP TRIGGER IF EXISTS stats_student_booths ON student_booths')
+        cursor.execute('DROP TRIGGER IF EXISTS stats_students ON students')
+    for table in ('stats_totals', 'stats_booths', 'stats_signups'):
+        cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    conn.commit()
+    init_stats(conn, cursor, engine)
+
+
+def rebuild_stats(conn, cursor, engine):
+    """집계 테이블을 students/student_booths에서 처음부터 다시 계산합니다."""
+    if engine == 'postgres':
+        # 재계산 중 다른 쓰기(트리거)가 끼어들지 않도록 잠시 쓰기를 막음
+        cursor.execute('LOCK TABLE students, student_booths IN SHARE MODE')
+        golden, derived = '(is_golden IS TRUE)::int', '(derived IS TRUE)::int'
+    else:
+        golden, derived = 'COALESCE(is_golden, 0)', 'COALESCE(derived, 0)'
+    cursor.execute('DELETE FROM stats_totals')
+    cursor.execute('DELETE FROM stats_booths')
+    cursor.execute('DELETE FROM stats_signups')
+    cursor.execute(f'''
+        INSERT INTO stats_totals (name, shard, value)
+        SELECT 'revenue', id % {STATS_SHARDS}, SUM(total_price) FROM students GROUP BY id % {STATS_SHARDS}
+        UNION ALL SELECT 'students', id % {STATS_SHARDS}, COUNT(*) FROM students GROUP BY id % {STATS_SHARDS}
+    ''')
+    cursor.execute(f'''
+        INSERT INTO stats_booths (booth_number, shard, holders, issued, remaining, golden, derived)
+        SELECT booth_number, student_id % {STATS_SHARDS}, COUNT(*), SUM(issued), SUM(remaining), SUM({golden}), SUM({derived})
+        FROM student_booths GROUP BY booth_number, student_id % {STATS_SHARDS}
+    ''')
+    bucket = SIGNUP_BUCKET_SQL[engine].format('created_at')
+    cursor.execute(f'''
+        INSERT INTO stats_signups (bucket, shard, count)
+        SELECT {bucket}, id % {STATS_SHARDS}, COUNT(*) FROM students WHERE created_at IS NOT NULL
+        GROUP BY {bucket}, id % {STATS_SHARDS}
+    ''')
+    conn.commit()
+    print('대시보드 집계 재계산 완료')
+
+
+def read_stats(cursor, engine, since=None):
+    """집계 테이블만 읽어 대시보드 데이터를 만듭니다 (dict_cursor 필요)."""
+    cursor.execute('SELECT name, CAST(SUM(value) AS BIGINT) AS value FROM stats_totals GROUP BY name')
+    totals = {row['name']: row['value'] for row in cursor.fetchall()}
+    cursor.execute('''
+        SELECT booth_number, CAST(SUM(holders) AS BIGINT) AS holders, CAST(SUM(issued) AS BIGINT) AS issued,
+            CAST(SUM(remaining) AS BIGINT) AS remaining, CAST(SUM(golden) AS BIGINT) AS golden,
+            CAST(SUM(derived) AS BIGINT) AS derived
+        FROM stats_booths GROUP BY booth_number HAVING SUM(holders) > 0 ORDER BY booth_number
+    ''')
+    booths = [{
+        'number': row['booth_number'],
+        'holders': row['holders'],
+        'issued': row['issued'],
+        'remaining': row['remaining'],
+        'redeemed': row['issued'] - row['remaining'],
+        'golden': row['golden'],
+        'derived': row['derived'],
+    } for row in cursor.fetchall()]
+    if since:
+        cursor.execute(adapt_sql(engine, '''
+            SELECT bucket, CAST(SUM(count) AS BIGINT) AS count FROM stats_signups
+            WHERE bucket >= ? GROUP BY bucket ORDER BY bucket
+        '''), (since,))
+    else:
+        cursor.execute('SELECT bucket, CAST(SUM(count) AS BIGINT) AS count FROM stats_signups GROUP BY bucket ORDER BY bucket')
+    signups = [{'minute': row['bucket'], 'count': row['count']} for row in cursor.fetchall()]
+    return {
+        'revenue': totals.get('revenue', 0),
+        'students': totals.get('students', 0),
+        'booths': booths,
+        'signups_per_minute': signups,
+    }
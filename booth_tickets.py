@@ -0,0 +1,218 @@
+"""티켓 변경 이벤트(ticket_events)와 공개 티켓 조회 캐시 (SSE 스트림은 app.py의 TicketBroker)."""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from booth_db import adapt_sql, execute_many
+
+
+# --- 티켓 변경 이벤트 ---
+# 티켓을 바꾸는 쓰기는 같은 트랜잭션에서 학번을 기록하고, TicketBroker가 이 테이블을 폴링합니다.
+SSE_EVENT_RETENTION = 120     # 이보다 오래된 이벤트는 정리
+_ticket_events_published = 0
+
+
+def init_ticket_events(conn, cursor, engine):
+    if engine == 'sqlite':
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticket_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                student_number TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+    else:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ticket_events (
+                id SERIAL PRIMARY KEY,
+                student_number TEXT NOT NULL,
+                created_at DOUBLE PRECISION NOT NULL
+            )
+        ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ticket_events_created_at ON ticket_events (created_at)')
+    conn.commit()
+
+
+def publish_ticket_changes(cursor, engine, student_numbers=(), student_id=None):
+    """티켓 변경 이벤트를 기록합니다 (호출한 쪽의 트랜잭션과 함께 커밋)."""
+    global _ticket_events_published
+    now = time.time()
+    if student_id is not None:
+        cursor.execute(adapt_sql(engine, 'INSERT INTO ticket_events (student_number, created_at) SELECT student_number, ? FROM students WHERE id = ?'),
+                       (now, student_id))
+    if student_numbers:
+        execute_many(cursor, engine, 'INSERT INTO ticket_events (student_number, created_at) VALUES (?, ?)',
+                     [(sn, now) for sn in student_numbers])
+    _ticket_events_published += 1
+    if _ticket_events_published % 200 == 0:
+        cursor.execute(adapt_sql(engine, 'DELETE FROM ticket_events WHERE created_at < ?'), (now - SSE_EVENT_RETENTION,))
+
+
+# --- 공개 티켓 조회 캐시 ---
+# myticket.js의 학번 조회 결과(JSON)를 학번 단위로 캐시합니다. 쓰기 API가 커밋 직후(응답 전) 해당 학번을 무효화합니다.
+# sqlite(기본): 같은 서버의 모든 워커가 공유하는 파일이라 쓰기 응답을 받은 뒤의 조회는 어느 워커에서든 새 값을 봅니다.
+# memory: 워커별 LRU. 쓰기를 처리한 워커만 바로 지워지고, 다른 워커는 ticket_events 폴링으로 지워집니다.
+# 오래된 값이 보일 수 있는 시간의 상한은 TTL이 아니라 SSE_POLL_INTERVAL(기본 0.5초) + 폴링 쿼리 시간입니다:
+#   memory 캐시의 다른 워커, 여러 서버(인스턴스)로 실행할 때 다른 서버의 쓰기, 그리고 쓰기 직전에 DB에서 읽은 조회가
+#   무효화 뒤에 캐시에 넣는 드문 경합은 모두 폴링(TicketBroker.watch_cache)이 지웁니다.
+# QR 이용권에 관련된 읽기는 캐시를 거치지 않습니다: 실시간 갱신(SSE)은 load_ticket(replica=False)로 주 DB에서 읽고,
+# /api/redeem은 캐시 없이 DB의 버전으로 확인하므로 오래된 조회 결과의 QR은 409로 거절될 뿐 잘못 차감되지 않습니다.
+TICKET_CACHE_BACKEND = os.getenv('TICKET_CACHE_BACKEND', 'sqlite')  # sqlite | memory | off
+TICKET_CACHE_TTL = float(os.getenv('TICKET_CACHE_TTL', '5'))
+TICKET_CACHE_SIZE = int(os.getenv('TICKET_CACHE_SIZE', '2048'))
+TICKET_CACHE_PATH = os.getenv('TICKET_CACHE_PATH', 'ticket_cache.db')
+
+
+class MemoryCacheBackend:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.time() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteCacheBackend:
+    """여러 gunicorn 워커가 공유하는 파일 기반 캐시 (같은 서버 내 워커 간 무효화가 즉시 반영됨)."""
+
+    def __init__(self, path, maxsize):
+        self.path = path
+        self.maxsize = maxsize
+        self._local = threading.local()
+        self._sets = 0
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS ticket_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute('SELECT value, expires_at FROM ticket_cache WHERE key = ?', (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key, value, ttl):
+        conn = self._conn()
+        conn.execute('INSERT OR REPLACE INTO ticket_cache (key, value, expires_at) VALUES (?, ?, ?)', (key, value, time.time() + ttl))
+        self._sets += 1
+        if self._sets % 200 == 0:
+            # 만료 항목 정리 및 크기 제한 (만료가 가까운 것부터 제거)
+            conn.execute('DELETE FROM ticket_cache WHERE expires_at < ?', (time.time(),))
+            conn.execute('DELETE FROM ticket_cache WHERE key IN (SELECT key FROM ticket_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?)', (self.maxsize,))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM ticket_cache WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM ticket_cache').fetchone()[0]
+
+
+class TicketCache:
+    def __init__(self, backend, ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0, 'errors': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, student_number):
+        if self.backend is None:
+            return None
+        try:
+            value = self.backend.get(str(student_number))
+        except Exception as e:
+            print('티켓 캐시 조회 오류:', e)
+            self._count('errors')
+            return None
+        self._count('hits' if value is not None else 'misses')
+        return value
+
+    def set(self, student_number, value):
+        if self.backend is None:
+            return
+        try:
+            self.backend.set(str(student_number), value, self.ttl)
+            self._count('sets')
+        except Exception as e:
+            print('티켓 캐시 저장 오류:', e)
+            self._count('errors')
+
+    def invalidate(self, student_number):
+        if self.backend is None or not student_number:
+            return
+        try:
+            self.backend.delete(str(student_number))
+            self._count('invalidations')
+        except Exception as e:
+            print('티켓 캐시 무효화 오류:', e)
+            self._count('errors')
+
+    def snapshot(self):
+        with self._lock:
+            data = dict(self._stats)
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = data['hits'] / lookups if lookups else 0.0
+        data['backend'] = TICKET_CACHE_BACKEND if self.backend is not None else 'off'
+        data['ttl'] = self.ttl
+        try:
+            data['entries'] = len(self.backend) if self.backend is not None else 0
+        except Exception:
+            data['entries'] = None
+        return data
+
+
+def create_ticket_cache():
+    if TICKET_CACHE_BACKEND == 'off' or TICKET_CACHE_TTL <= 0:
+        return TicketCache(None, 0)
+    if TICKET_CACHE_BACKEND == 'sqlite':
+        try:
+            return TicketCache(SQLiteCacheBackend(TICKET_CACHE_PATH, TICKET_CACHE_SIZE), TICKET_CACHE_TTL)
+        except Exception as e:
+            print('공유 티켓 캐시를 열 수 없어 메모리 캐시를 사용합니다:', e)
+    return TicketCache(MemoryCacheBackend(TICKET_CACHE_SIZE), TICKET_CACHE_TTL)
+
+
+ticket_cache = create_ticket_cache()
+
+
+def invalidate_ticket_by_id(cursor, engine, student_id):
+    """학생 id로 학번을 찾아 티켓 캐시를 무효화합니다 (dict_cursor 필요)."""
+    cursor.execute(adapt_sql(engine, 'SELECT student_number FROM students WHERE id = ?'), (student_id,))
+    row = cursor.fetchone()
+    if row:
+        ticket_cache.invalidate(row['student_number'])
@@ -0,0 +1,78 @@
+"""gunicorn 설정 (Procfile / Render Start Command: gunicorn -c gunicorn.conf.py app:app)
+
+마스터 프로세스가 시작될 때(on_starting) 한 번만:
+- 이전 실행의 워커별 메트릭/프로파일 파일(METRICS_DIR/metrics-*.json, profiles-*.json)과 프로파일러 설정을 지웁니다.
+- `python app.py migrate`로 스키마 마이그레이션을 적용합니다. 실패하면 워커를 띄우지 않습니다.
+워커가 끝날 때(child_exit, 재시작 포함) 그 워커의 metrics-<pid>.json을 지우고 누적 카운터/히스토그램만
+metrics-retired.json에 더해 둡니다 (현재 값 게이지가 죽은 워커 몫까지 합산되지 않도록).
+워커는 app을 import한 뒤(post_worker_init) app.start_worker()에서 스키마 버전만 확인하므로 DDL 없이 바로 요청을 받습니다.
+(마스터에서 app을 import하지 않는 이유: fork 전에 DB 연결/스레드를 만들지 않기 위해)
+"""
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+bind = '0.0.0.0:' + os.getenv('PORT', '8000')
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'info_booth_metrics'))
+
+
+def on_starting(server):
+    paths = glob.glob(os.path.join(METRICS_DIR, 'metrics-*.json')) + glob.glob(os.path.join(METRICS_DIR, 'profiles-*.json'))
+    for path in paths + [os.path.join(METRICS_DIR, 'profiler.json')]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    result = subprocess.run([sys.executable, APP_PATH, 'migrate'], cwd=os.path.dirname(APP_PATH))
+    if result.returncode != 0:
+        raise RuntimeError(f'스키마 마이그레이션 실패 (종료 코드 {result.returncode})')
+
+
+def post_worker_init(worker):
+    from app import start_worker
+    start_worker()
+
+
+def child_exit(server, worker):
+    path = os.path.join(METRICS_DIR, f'metrics-{worker.pid}.json')
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return
+    retired_path = os.path.join(METRICS_DIR, 'metrics-retired.json')
+    try:
+        with open(retired_path) as f:
+            retired = json.load(f)
+    except (OSError, ValueError):
+        retired = {}
+    # 같은 (이름, 라벨)끼리 더함. 게이지는 이름이 _total로 끝나는 누적 값만 남김
+    for kind in ('counters', 'histograms', 'gauges'):
+        merged = {(name, json.dumps(labels)): value for name, labels, value in retired.get(kind, [])}
+        for name, labels, value in data.get(kind, []):
+            if kind == 'gauges' and not name.endswith('_total'):
+                continue
+            key = (name, json.dumps(labels))
+            if key not in merged:
+                merged[key] = value
+            elif kind == 'histograms':
+                merged[key] = [a + b for a, b in zip(merged[key], value)]
+            else:
+                merged[key] += value
+        retired[kind] = [[name, json.loads(labels), value] for (name, labels), value in merged.items()]
+    try:
+        tmp = retired_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(retired, f)
+        os.replace(tmp, retired_path)
+        os.remove(path)
+    except OSError as e:
+        print('종료된 워커 메트릭 정리 오류:', e)
@@ -1,68 +1,359 @@
 """
-간단한 마이그레이션 스크립트
-- 목적: 로컬 `student.db`(SQLite)에 있는 students 테이블을 PostgreSQL의 `students` 테이블로 복사
+SQLite → PostgreSQL 마이그레이션 스크립트
+- 목적: 로컬 `student.db`(SQLite)의 students / student_booths / booth_ledger(원장) 테이블을 PostgreSQL로 복사
+- 동작:
+  * SQLite를 id 순서로 CHUNK 단위로 읽어(전체를 메모리에 올리지 않음) Postgres COPY로 씁니다.
+    COPY는 임시 테이블로 받은 뒤 INSERT ... ON CONFLICT DO NOTHING으로 옮기므로
+    같은 청크를 다시 실행해도 중복되지 않습니다. (--method values: execute_values 사용)
+  * 원본 id를 그대로 유지하고, 끝나면 SERIAL 시퀀스를 MAX(id)로 맞춥니다.
+  * 청크마다 커밋하고 진행 위치를 체크포인트 파일에 기록하므로, 중단되면 다시 실행해서 이어 갈 수 있습니다.
+  * 진행 상황과 초당 처리 행 수(rows/s)를 출력합니다.
+  * 복사 전에 대상에 원본과 충돌하는 행(같은 id인데 값이 다른 행, 다른 id로 같은 학번을 가진 학생)이 있는지 확인하고,
+    있으면 목록을 출력한 뒤 아무것도 복사하지 않고 끝냅니다. (ON CONFLICT로 학생만 건너뛰고 그 학생의 이용권/원장을
+    복사하다 외래 키 오류가 나거나 다른 학생에게 붙는 일을 막음)
+  * --verify: 원본과 대상의 테이블별 행 수와 체크섬을 비교하고, 대상에 없거나 값이 다른(건너뛴) 원본 행을 알려 줍니다 (복사하지 않음).
 - 사용법:
   1) PostgreSQL 연결 문자열을 환경변수 `DATABASE_URL`에 설정
-  2) python migrate_sqlite_to_postgres.py
+  2) python migrate_sqlite_to_postgres.py [--chunk 5000] [--method copy|values] [--reset]
+  3) python migrate_sqlite_to_postgres.py --verify
 
-주의: 덮어쓰기 위험이 있으므로 대상 DB에 중요한 데이터가 있으면 먼저 백업하세요.
+주의:
+- 원본 SQLite는 현재 버전의 앱으로 한 번 실행해 최신 스키마(student_booths, booth_ledger 테이블)로 올려 두세요.
+  (예: SQLITE_PATH=student.db python app.py migrate)
+- 대상 스키마는 app.py의 마이그레이션(`python app.py migrate`, DATABASE_URL 대상)으로 만듭니다.
+  앱을 이 프로세스에 import하지 않으므로 서버 시작 작업(쓰기 지연 저널 반영 등)은 실행되지 않습니다.
+  대상에 이미 데이터가 있으면 위의 충돌 확인에서 중단될 수 있으니, 중요한 데이터가 있다면 먼저 백업하세요.
 """
+import argparse
+import hashlib
+import io
+import json
 import os
 import sqlite3
-import json
+import subprocess
+import sys
+import time
 
 DATABASE_URL = os.getenv('DATABASE_URL')
 SQLITE_PATH = os.getenv('SQLITE_PATH', 'student.db')
+CHECKPOINT_PATH = os.getenv('MIGRATE_CHECKPOINT', 'migrate_checkpoint.json')
+
+VERIFY_LIST_LIMIT = 20   # --verify에서 건너뛴 행 id를 이만큼까지 출력
+
+# 옮길 테이블: (이름, 컬럼, 컬럼 종류) — 종류는 비교/변환용 (json, bool, timestamp)
+TABLES = [
+    ('students',
+     ['id', 'student_number', 'phone', 'name', 'booths', 'total_price', 'created_at', 'updated_at', 'version'],
+     {'booths': 'json', 'created_at': 'timestamp', 'updated_at': 'timestamp'}),
+    ('student_booths',
+     ['id', 'student_id', 'booth_number', 'name', 'price', 'remaining', 'issued',
+      'is_golden', 'golden_from', 'derived', 'derived_from'],
+     {'is_golden': 'bool', 'derived': 'bool'}),
+    ('booth_ledger',
+     ['id', 'student_id', 'student_number', 'booth_number', 'kind', 'delta', 'amount', 'actor', 'created_at'],
+     {}),
+]
+
+
+def read_chunks(s_conn, table, columns, after_id, chunk):
+    """SQLite 테이블을 id 순서로 chunk개씩 읽는 제너레이터."""
+    cursor = s_conn.cursor()
+    query = f'SELECT {", ".join(columns)} FROM {table} WHERE id > ? ORDER BY id LIMIT ?'
+    while True:
+        cursor.execute(query, (after_id, chunk))
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        yield rows
+        after_id = rows[-1][0]
+
+
+def to_target(rows, columns, kinds):
+    """SQLite 값을 Postgres 타입에 맞게 변환 (0/1 → bool)."""
+    bool_idx = [i for i, c in enumerate(columns) if kinds.get(c) == 'bool']
+    if not bool_idx:
+        return rows
+    converted = []
+    for row in rows:
+        row = list(row)
+        for i in bool_idx:
+            if row[i] is not None:
+                row[i] = bool(row[i])
+        converted.append(row)
+    return converted
+
+
+def copy_text(value):
+    """COPY ... FROM STDIN (text 형식) 필드 인코딩."""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def write_copy(p_cursor, table, columns, rows):
+    """임시 테이블로 COPY 후 대상 테이블에 ON CONFLICT DO NOTHING으로 옮김. 삽입된 행 수 반환."""
+    staging = f'_migrate_{table}'
+    col_list = ', '.join(columns)
+    p_cursor.execute(f'CREATE TEMP TABLE IF NOT EXISTS {staging} (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS')
+    buf = io.StringIO()
+    for row in rows:
+        buf.write('\t'.join(copy_text(v) for v in row))
+        buf.write('\n')
+    buf.seek(0)
+    p_cursor.copy_expert(f'COPY {staging} ({col_list}) FROM STDIN', buf)
+    p_cursor.execute(f'INSERT INTO {table} ({col_list}) SELECT {col_list} FROM {staging} ON CONFLICT DO NOTHING')
+    return p_cursor.rowcount
+
+
+def write_values(p_cursor, table, columns, rows):
+    """execute_values 배치 INSERT. 삽입된 행 수 반환."""
+    import psycopg2.extras
+    query = f'INSERT INTO {table} ({", ".join(columns)}) VALUES %s ON CONFLICT DO NOTHING RETURNING id'
+    inserted = psycopg2.extras.execute_values(p_cursor, query, rows, page_size=len(rows), fetch=True)
+    return len(inserted)
+
+
+def reset_sequence(p_cursor, table):
+    p_cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+        f"COALESCE((SELECT MAX(id) FROM {table}), 1), (SELECT MAX(id) IS NOT NULL FROM {table}))"
+    )
+
+
+def load_checkpoint(reset):
+    if reset or not os.path.exists(CHECKPOINT_PATH):
+        return {}
+    with open(CHECKPOINT_PATH) as f:
+        data = json.load(f)
+    if data.get('source') != os.path.abspath(SQLITE_PATH):
+        print(f'체크포인트({CHECKPOINT_PATH})가 다른 원본 DB의 것이라 무시합니다.')
+        return {}
+    return data.get('tables', {})
+
+
+def save_checkpoint(progress):
+    tmp = CHECKPOINT_PATH + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump({'source': os.path.abspath(SQLITE_PATH), 'tables': progress}, f)
+    os.replace(tmp, CHECKPOINT_PATH)
+
+
+def migrate(s_conn, p_conn, chunk, method, reset):
+    write = write_copy if method == 'copy' else write_values
+    progress = load_checkpoint(reset)
+    p_cursor = p_conn.cursor()
+    for table, columns, kinds in TABLES:
+        after_id = progress.get(table, 0)
+        total = s_conn.execute(f'SELECT COUNT(*) FROM {table} WHERE id > ?', (after_id,)).fetchone()[0]
+        if after_id:
+            print(f'[{table}] id {after_id} 이후부터 이어서 복사 (남은 {total}행)')
+        started = time.monotonic()
+        read = inserted = 0
+        for rows in read_chunks(s_conn, table, columns, after_id, chunk):
+            inserted += write(p_cursor, table, columns, to_target(rows, columns, kinds))
+            p_conn.commit()
+            read += len(rows)
+            progress[table] = rows[-1][0]
+            save_checkpoint(progress)
+            elapsed = time.monotonic() - started
+            print(f'[{table}] {read}/{total}행  {read / elapsed if elapsed else 0:,.0f} rows/s', end='\r', flush=True)
+        reset_sequence(p_cursor, table)
+        p_conn.commit()
+        elapsed = time.monotonic() - started
+        skipped = read - inserted
+        print(f'[{table}] 복사 완료: {inserted}행 삽입'
+              + (f', 이미 있던 {skipped}행 건너뜀' if skipped else '')
+              + f' ({elapsed:.1f}초, {read / elapsed if elapsed else 0:,.0f} rows/s)' + ' ' * 10)
+    p_cursor.close()
 
-if not DATABASE_URL:
-    print('ERROR: DATABASE_URL 환경변수를 설정하세요 (Postgres).')
-    exit(1)
-
-import psycopg2
-import psycopg2.extras
-
-# 소스 읽기
-s_conn = sqlite3.connect(SQLITE_PATH)
-s_cursor = s_conn.cursor()
-s_cursor.execute('SELECT id, student_number, phone, name, booths, total_price, created_at FROM students')
-rows = s_cursor.fetchall()
-print(f'로컬 SQLite에서 {len(rows)} 레코드 발견')
-
-# 대상에 삽입
-p_conn = psycopg2.connect(DATABASE_URL, sslmode='require')
-p_cursor = p_conn.cursor()
-# 테이블이 없으면 생성
-p_cursor.execute('''
-CREATE TABLE IF NOT EXISTS students (
-    id SERIAL PRIMARY KEY,
-    student_number TEXT,
-    phone TEXT NOT NULL,
-    name TEXT NOT NULL,
-    booths JSONB NOT NULL,
-    total_price INTEGER NOT NULL,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-)
-''')
-p_conn.commit()
-
-count = 0
-for r in rows:
-    sid, student_number, phone, name, booths, total_price, created_at = r
+
+def normalize(value, kind):
+    """원본/대상 값을 같은 표현으로 맞춤 (체크섬 비교용)."""
+    if value is None:
+        return None
+    if kind == 'json':
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except ValueError:
+                return value
+        return json.dumps(value, sort_keys=True, ensure_ascii=False)
+    if kind == 'bool':
+        return bool(value)
+    if kind == 'timestamp':
+        text = str(value).replace('T', ' ')
+        return text.rstrip('0').rstrip('.') if '.' in text else text
+    return value
+
+
+def table_digest(rows_iter, columns, kinds):
+    digest = hashlib.sha256()
+    count = 0
+    kinds_by_idx = [kinds.get(c) for c in columns]
+    for rows in rows_iter:
+        for row in rows:
+            values = [normalize(v, k) for v, k in zip(row, kinds_by_idx)]
+            digest.update(json.dumps(values, ensure_ascii=False, default=str).encode('utf-8'))
+            count += 1
+    return count, digest.hexdigest()
+
+
+def compare_chunk(p_cursor, table, columns, kinds, rows):
+    """원본 청크의 행을 대상의 같은 id 행과 비교합니다. 반환: (대상에 없는 id 목록, 값이 다른 id 목록)"""
+    p_cursor.execute(f'SELECT {", ".join(columns)} FROM {table} WHERE id = ANY(%s)', ([row[0] for row in rows],))
+    target = {row[0]: row for row in p_cursor.fetchall()}
+    kinds_by_idx = [kinds.get(c) for c in columns]
+    missing, different = [], []
+    for row in rows:
+        other = target.get(row[0])
+        if other is None:
+            missing.append(row[0])
+        elif [normalize(v, k) for v, k in zip(row, kinds_by_idx)] != [normalize(v, k) for v, k in zip(other, kinds_by_idx)]:
+            different.append(row[0])
+    return missing, different
+
+
+def find_conflicts(s_conn, p_conn, chunk):
+    """복사하면 건너뛰게 될 원본 행 목록. 반환: [(테이블, 원본 id, 설명)]
+    이미 같은 값으로 복사된 행(중단 후 다시 실행)은 충돌이 아닙니다."""
+    conflicts = []
+    conflicting_students = set()
+    p_cursor = p_conn.cursor()
+    for table, columns, kinds in TABLES:
+        for rows in read_chunks(s_conn, table, columns, 0, chunk):
+            _missing, different = compare_chunk(p_cursor, table, columns, kinds, rows)
+            conflicts += [(table, row_id, '대상에 같은 id의 다른 행이 있음') for row_id in different]
+            if table == 'students':
+                conflicting_students.update(different)
+                numbers = {row[1]: row[0] for row in rows if row[1] is not None}
+                p_cursor.execute('SELECT id, student_number FROM students WHERE student_number = ANY(%s)', (list(numbers),))
+                for target_id, student_number in p_cursor.fetchall():
+                    if numbers[student_number] != target_id:
+                        conflicts.append(('students', numbers[student_number], f'학번 {student_number}이(가) 대상에 id {target_id}로 있음'))
+                        conflicting_students.add(numbers[student_number])
+    p_conn.rollback()
+    p_cursor.close()
+    # 충돌한 학생에 딸린 이용권/원장 행도 옮길 수 없음 (외래 키 오류 또는 다른 학생에게 붙음)
+    ids = sorted(conflicting_students)
+    for start in range(0, len(ids), 500):
+        batch = ids[start:start + 500]
+        marks = ', '.join('?' * len(batch))
+        for table in ('student_booths', 'booth_ledger'):
+            for row_id, student_id in s_conn.execute(f'SELECT id, student_id FROM {table} WHERE student_id IN ({marks}) ORDER BY id', batch):
+                conflicts.append((table, row_id, f'학생 id {student_id}이(가) 충돌함'))
+    return conflicts
+
+
+def read_target_chunks(p_conn, table, columns, chunk):
+    # 서버 측(named) 커서로 대상 테이블도 나눠서 읽음
+    cursor = p_conn.cursor(name=f'verify_{table}')
+    cursor.itersize = chunk
+    cursor.execute(f'SELECT {", ".join(columns)} FROM {table} ORDER BY id')
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk)
+            if not rows:
+                return
+            yield rows
+    finally:
+        cursor.close()
+
+
+def verify(s_conn, p_conn, chunk):
+    ok = True
+    p_cursor = p_conn.cursor()
+    for table, columns, kinds in TABLES:
+        started = time.monotonic()
+        s_count, s_sum = table_digest(read_chunks(s_conn, table, columns, 0, chunk), columns, kinds)
+        p_count, p_sum = table_digest(read_target_chunks(p_conn, table, columns, chunk), columns, kinds)
+        missing, different = [], []
+        for rows in read_chunks(s_conn, table, columns, 0, chunk):
+            chunk_missing, chunk_different = compare_chunk(p_cursor, table, columns, kinds, rows)
+            missing += chunk_missing
+            different += chunk_different
+        p_conn.rollback()
+        same = s_count == p_count and s_sum == p_sum
+        ok = ok and same
+        print(f'[{table}] {"일치" if same else "불일치"}  원본 {s_count}행 / 대상 {p_count}행  '
+              f'체크섬 {s_sum[:12]} / {p_sum[:12]}  ({time.monotonic() - started:.1f}초)')
+        for label, ids in (('대상에 없는(건너뛴) 원본 행', missing), ('대상과 값이 다른 원본 행', different)):
+            if ids:
+                shown = ', '.join(str(i) for i in ids[:VERIFY_LIST_LIMIT]) + (' ...' if len(ids) > VERIFY_LIST_LIMIT else '')
+                print(f'  {label} {len(ids)}개: id {shown}')
+        extra = p_count - (s_count - len(missing))
+        if extra:
+            print(f'  대상에만 있는 행 {extra}개')
+    p_cursor.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite → PostgreSQL 마이그레이션')
+    parser.add_argument('--chunk', type=int, default=5000, help='한 번에 읽고 쓸 행 수')
+    parser.add_argument('--method', choices=('copy', 'values'), default='copy', help='쓰기 방식 (COPY 또는 execute_values)')
+    parser.add_argument('--reset', action='store_true', help='체크포인트를 무시하고 처음부터 복사')
+    parser.add_argument('--verify', action='store_true', help='복사하지 않고 원본/대상의 행 수와 체크섬만 비교')
+    args = parser.parse_args()
+
+    if not DATABASE_URL:
+        print('ERROR: DATABASE_URL 환경변수를 설정하세요 (Postgres).')
+        sys.exit(1)
+    if not os.path.exists(SQLITE_PATH):
+        print(f'ERROR: 원본 SQLite 파일이 없습니다: {SQLITE_PATH}')
+        sys.exit(1)
+
+    # 원본은 읽기 전용으로 열기
+    s_conn = sqlite3.connect(f'file:{SQLITE_PATH}?mode=ro', uri=True)
+    tables = {r[0] for r in s_conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    missing = [t for t, _columns, _kinds in TABLES if t not in tables]
+    if missing:
+        print(f'ERROR: 원본 DB에 {", ".join(missing)} 테이블이 없습니다. 현재 버전의 앱으로 한 번 실행해 스키마를 올린 뒤 다시 시도하세요.')
+        print(f'  예: SQLITE_PATH={SQLITE_PATH} python app.py migrate')
+        sys.exit(1)
+
+    import psycopg2
+
+    if args.verify:
+        p_conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+        ok = verify(s_conn, p_conn, args.chunk)
+        p_conn.close()
+        s_conn.close()
+        sys.exit(0 if ok else 2)
+
+    # 대상 스키마(테이블/인덱스)는 앱의 마이그레이션으로 생성 (DATABASE_URL 대상으로 실행됨)
+    # gunicorn.conf.py와 같이 별도 프로세스로 실행: 마이그레이션 명령만 돌고 서버 시작 작업은 하지 않음
+    app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+    result = subprocess.run([sys.executable, app_path, 'migrate'], cwd=os.path.dirname(app_path))
+    if result.returncode != 0:
+        print(f'ERROR: 대상 스키마 마이그레이션 실패 (종료 코드 {result.returncode})')
+        sys.exit(1)
+
+    p_conn = psycopg2.connect(DATABASE_URL, sslmode='require')
+    conflicts = find_conflicts(s_conn, p_conn, args.chunk)
+    if conflicts:
+        for table, row_id, reason in conflicts:
+            print(f'[{table}] id {row_id}: {reason}')
+        print(f'ERROR: 대상 DB에 원본과 충돌하는 행이 {len(conflicts)}개 있어 복사하지 않았습니다. '
+              '대상의 해당 행을 정리하거나(백업 후) 비어 있는 DB로 다시 실행하세요.')
+        p_conn.close()
+        s_conn.close()
+        sys.exit(1)
     try:
-        # booths는 문자열인 경우가 대부분
-        if isinstance(booths, str):
-            booths_json = json.loads(booths)
-        else:
-            booths_json = booths
-    except Exception:
-        booths_json = []
-    p_cursor.execute('INSERT INTO students (student_number, phone, name, booths, total_price, created_at) VALUES (%s,%s,%s,%s,%s,%s)',
-                     (student_number, phone, name, json.dumps(booths_json, ensure_ascii=False), total_price, created_at))
-    count += 1
-
-p_conn.commit()
-print(f'복사 완료: {count} 레코드')
-
-s_conn.close()
-p_cursor.close()
-p_conn.close()
+        migrate(s_conn, p_conn, args.chunk, args.method, args.reset)
+    except KeyboardInterrupt:
+        p_conn.rollback()
+        print(f'\n중단됨: 다시 실행하면 체크포인트({CHECKPOINT_PATH})부터 이어서 복사합니다.')
+        sys.exit(1)
+    finally:
+        p_conn.close()
+        s_conn.close()
+    print('마이그레이션 완료. 확인: python migrate_sqlite_to_postgres.py --verify')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+// qr.js: 마이티켓 QR 생성기 (바이트 모드, 오류 정정 M, 버전 1~10). 외부 라이브러리 없이 SVG 문자열을 만듦
+// 사용: element.innerHTML = QR.svg('토큰 문자열');
+(function () {
+  const EC_PER_BLOCK = [0, 10, 16, 26, 18, 24, 16, 18, 22, 22, 26];   // 버전별 블록당 오류 정정 코드워드 (M)
+  const NUM_BLOCKS = [0, 1, 1, 1, 2, 2, 4, 4, 4, 5, 5];
+  const MAX_VERSION = 10;
+  const QUIET_ZONE = 4;
+
+  const bit = (value, i) => ((value >>> i) & 1) !== 0;
+
+  function rawModules(ver) {
+    let result = (16 * ver + 128) * ver + 64;
+    if (ver >= 2) {
+      const numAlign = Math.floor(ver / 7) + 2;
+      result -= (25 * numAlign - 10) * numAlign - 55;
+      if (ver >= 7) result -= 36;
+    }
+    return result;
+  }
+
+  function dataCodewords(ver) {
+    return Math.floor(rawModules(ver) / 8) - EC_PER_BLOCK[ver] * NUM_BLOCKS[ver];
+  }
+
+  function alignmentPositions(ver) {
+    if (ver === 1) return [];
+    const numAlign = Math.floor(ver / 7) + 2;
+    const step = Math.ceil((ver * 4 + 4) / (numAlign * 2 - 2)) * 2;
+    const result = [6];
+    for (let pos = ver * 4 + 10; result.length < numAlign; pos -= step) result.splice(1, 0, pos);
+    return result;
+  }
+
+  // --- Reed-Solomon (GF(256), 다항식 0x11D) ---
+  function gfMul(x, y) {
+    let z = 0;
+    for (let i = 7; i >= 0; i--) {
+      z = (z << 1) ^ ((z >>> 7) * 0x11D);
+      z ^= ((y >>> i) & 1) * x;
+    }
+    return z;
+  }
+
+  function rsDivisor(degree) {
+    const result = new Array(degree).fill(0);
+    result[degree - 1] = 1;
+    let root = 1;
+    for (let i = 0; i < degree; i++) {
+      for (let j = 0; j < degree; j++) {
+        result[j] = gfMul(result[j], root);
+        if (j + 1 < degree) result[j] ^= result[j + 1];
+      }
+      root = gfMul(root, 0x02);
+    }
+    return result;
+  }
+
+  function rsRemainder(data, divisor) {
+    const result = divisor.map(() => 0);
+    data.forEach(b => {
+      const factor = b ^ result.shift();
+      result.push(0);
+      divisor.forEach((coef, i) => { result[i] ^= gfMul(coef, factor); });
+    });
+    return result;
+  }
+
+  // --- 데이터 코드워드 ---
+  function encodeData(bytes) {
+    let ver = 1;
+    while (ver <= MAX_VERSION && 4 + (ver <= 9 ? 8 : 16) + bytes.length * 8 > dataCodewords(ver) * 8) ver++;
+    if (ver > MAX_VERSION) throw new Error('QR에 담기에는 데이터가 너무 깁니다.');
+    const capacity = dataCodewords(ver) * 8;
+    const bits = [];
+    const push = (value, len) => { for (let i = len - 1; i >= 0; i--) bits.push((value >>> i) & 1); };
+    push(0x4, 4);                                   // 바이트 모드
+    push(bytes.length, ver <= 9 ? 8 : 16);
+    bytes.forEach(b => push(b, 8));
+    push(0, Math.min(4, capacity - bits.length));   // 종료 패턴
+    push(0, (8 - bits.length % 8) % 8);
+    for (let pad = 0xEC; bits.length < capacity; pad ^= 0xEC ^ 0x11) push(pad, 8);
+    const data = [];
+    for (let i = 0; i < bits.length; i += 8) data.push(bits.slice(i, i + 8).reduce((acc, b) => (acc << 1) | b, 0));
+    return { ver, data };
+  }
+
+  function addEcAndInterleave(ver, data) {
+    const numBlocks = NUM_BLOCKS[ver];
+    const ecLen = EC_PER_BLOCK[ver];
+    const rawCodewords = Math.floor(rawModules(ver) / 8);
+    const numShortBlocks = numBlocks - rawCodewords % numBlocks;
+    const shortBlockLen = Math.floor(rawCodewords / numBlocks);
+    const divisor = rsDivisor(ecLen);
+    const blocks = [];
+    for (let i = 0, k = 0; i < numBlocks; i++) {
+      const dat = data.slice(k, k + shortBlockLen - ecLen + (i < numShortBlocks ? 0 : 1));
+      k += dat.length;
+      const ecc = rsRemainder(dat, divisor);
+      if (i < numShortBlocks) dat.push(0);
+      blocks.push(dat.concat(ecc));
+    }
+    const result = [];
+    for (let i = 0; i < blocks[0].length; i++) {
+      blocks.forEach((block, j) => {
+        if (i !== shortBlockLen - ecLen || j >= numShortBlocks) result.push(block[i]);
+      });
+    }
+    return result;
+  }
+
+  // --- 모듈 배치 ---
+  const MASKS = [
+    (x, y) => (x + y) % 2 === 0,
+    (x, y) => y % 2 === 0,
+    (x, y) => x % 3 === 0,
+    (x, y) => (x + y) % 3 === 0,
+    (x, y) => (Math.floor(x / 3) + Math.floor(y / 2)) % 2 === 0,
+    (x, y) => x * y % 2 + x * y % 3 === 0,
+    (x, y) => (x * y % 2 + x * y % 3) % 2 === 0,
+    (x, y) => ((x + y) % 2 + x * y % 3) % 2 === 0,
+  ];
+
+  function penalty(modules) {
+    const size = modules.length;
+    let score = 0;
+    let dark = 0;
+    const lines = [];
+    for (let y = 0; y < size; y++) {
+      lines.push(modules[y].map(m => (m ? 1 : 0)).join(''));
+      lines.push(modules.map(row => (row[y] ? 1 : 0)).join(''));
+    }
+    lines.forEach(line => {
+      (line.match(/0{5,}|1{5,}/g) || []).forEach(run => { score += run.length - 2; });
+      score += 40 * (('0000' + line + '0000').match(/(?=00001011101|10111010000)/g) || []).length;
+    });
+    for (let y = 0; y < size; y++) {
+      for (let x = 0; x < size; x++) {
+        if (modules[y][x]) dark++;
+        if (x + 1 < size && y + 1 < size) {
+          const c = modules[y][x];
+          if (c === modules[y][x + 1] && c === modules[y + 1][x] && c === modules[y + 1][x + 1]) score += 3;
+        }
+      }
+    }
+    const total = size * size;
+    score += (Math.ceil(Math.abs(dark * 20 - total * 10) / total) - 1) * 10;
+    return score;
+  }
+
+  function encode(text) {
+    const { ver, data } = encodeData(Array.from(new TextEncoder().encode(text)));
+    const codewords = addEcAndInterleave(ver, data);
+    const size = ver * 4 + 17;
+    const modules = [];
+    const isFunction = [];
+    for (let i = 0; i < size; i++) {
+      modules.push(new Array(size).fill(false));
+      isFunction.push(new Array(size).fill(false));
+    }
+    const set = (x, y, dark) => { modules[y][x] = dark; isFunction[y][x] = true; };
+
+    for (let i = 0; i < size; i++) {   // 타이밍 패턴
+      set(6, i, i % 2 === 0);
+      set(i, 6, i % 2 === 0);
+    }
+    [[3, 3], [size - 4, 3], [3, size - 4]].forEach(([cx, cy]) => {   // 위치 찾기 패턴 + 분리 영역
+      for (let dy = -4; dy <= 4; dy++) {
+        for (let dx = -4; dx <= 4; dx++) {
+          const dist = Math.max(Math.abs(dx), Math.abs(dy));
+          const x = cx + dx;
+          const y = cy + dy;
+          if (x >= 0 && x < size && y >= 0 && y < size) set(x, y, dist !== 2 && dist !== 4);
+        }
+      }
+    });
+    const align = alignmentPositions(ver);
+    align.forEach((ax, i) => {
+      align.forEach((ay, j) => {
+        if ((i === 0 && j === 0) || (i === 0 && j === align.length - 1) || (i === align.length - 1 && j === 0)) return;
+        for (let dy = -2; dy <= 2; dy++) {
+          for (let dx = -2; dx <= 2; dx++) set(ax + dx, ay + dy, Math.max(Math.abs(dx), Math.abs(dy)) !== 1);
+        }
+      });
+    });
+
+    const drawFormat = (mask) => {
+      const value = mask;   // 오류 정정 M = 00
+      let rem = value;
+      for (let i = 0; i < 10; i++) rem = (rem << 1) ^ ((rem >>> 9) * 0x537);
+      const bits = ((value << 10) | rem) ^ 0x5412;
+      for (let i = 0; i <= 5; i++) set(8, i, bit(bits, i));
+      set(8, 7, bit(bits, 6));
+      set(8, 8, bit(bits, 7));
+      set(7, 8, bit(bits, 8));
+      for (let i = 9; i < 15; i++) set(14 - i, 8, bit(bits, i));
+      for (let i = 0; i < 8; i++) set(size - 1 - i, 8, bit(bits, i));
+      for (let i = 8; i < 15; i++) set(8, size - 15 + i, bit(bits, i));
+      set(8, size - 8, true);
+    };
+    drawFormat(0);   // 자리 예약
+
+    if (ver >= 7) {
+      let rem = ver;
+      for (let i = 0; i < 12; i++) rem = (rem << 1) ^ ((rem >>> 11) * 0x1F25);
+      const bits = (ver << 12) | rem;
+      for (let i = 0; i < 18; i++) {
+        const a = size - 11 + i % 3;
+        const b = Math.floor(i / 3);
+        set(a, b, bit(bits, i));
+        set(b, a, bit(bits, i));
+      }
+    }
+
+    // 데이터: 오른쪽 아래부터 두 열씩 지그재그
+    let i = 0;
+    for (let right = size - 1; right >= 1; right -= 2) {
+      if (right === 6) right = 5;
+      const upward = ((right + 1) & 2) === 0;
+      for (let vert = 0; vert < size; vert++) {
+        const y = upward ? size - 1 - vert : vert;
+        for (let j = 0; j < 2; j++) {
+          const x = right - j;
+          if (!isFunction[y][x] && i < codewords.length * 8) {
+            modules[y][x] = bit(codewords[i >>> 3], 7 - (i & 7));
+            i++;
+          }
+        }
+      }
+    }
+
+    const applyMask = (mask) => {
+      for (let y = 0; y < size; y++) {
+        for (let x = 0; x < size; x++) {
+          if (!isFunction[y][x] && MASKS[mask](x, y)) modules[y][x] = !modules[y][x];
+        }
+      }
+    };
+    let best = 0;
+    let bestScore = Infinity;
+    for (let mask = 0; mask < 8; mask++) {
+      applyMask(mask);
+      drawFormat(mask);
+      const score = penalty(modules);
+      if (score < bestScore) { best = mask; bestScore = score; }
+      applyMask(mask);   // XOR이므로 한 번 더 적용하면 원래대로
+    }
+    applyMask(best);
+    drawFormat(best);
+    return modules;
+  }
+
+  function svg(text) {
+    const modules = encode(text);
+    const full = modules.length + QUIET_ZONE * 2;
+    let path = '';
+    modules.forEach((row, y) => {
+      row.forEach((dark, x) => { if (dark) path += `M${x + QUIET_ZONE},${y + QUIET_ZONE}h1v1h-1z`; });
+    });
+    return `<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 ${full} ${full}" shape-rendering="crispEdges">`
+      + `<rect width="${full}" height="${full}" fill="#fff"/><path d="${path}" fill="#000"/></svg>`;
+  }
+
+  window.QR = { encode, svg };
+})();
@@ -1,20 +1,32 @@
 let currentStep = 1;
 let formData = { phone: '', name: '', booths: [] };
 
-// 부스 목록 (실제 부스명으로 변경 가능)
-const booths = [
+// 부스 목록: 서버 카탈로그(/api/booths)를 불러와 교체. 불러오지 못하면 아래 기본값 사용
+// includes: 패스에 포함된 부스 번호, golden: 포함 부스를 황금(우선 이용)으로 표시
+let booths = [
   { number: 1, name: '인포이즘 (INFOISM) [1인]', price: 2000 },
   { number: 2, name: '인포픽 (INFOPICK) [2회]', price: 1000 },
   { number: 3, name: '미니 게임 테라피 (MINI GAME THERAPY) [3회]', price: 2000 },
   { number: 4, name: '타자 게임 (TYPING GAME) [1회]', price: 1000 },
-  { number: 5, name: 'INFOISM SUPERPASS (인포이즘 우선 이용권) [1인]', price: 4000 },
-  { number: 6, name: 'INFOPASS (인포 모든 부스 이용권) + (1구 키캡 키링 증정) [1인]', price: 6000 },
-  { number: 7, name: 'SUPER INFOPASS (인포 모든 부스 우선 이용권) + (1구 키캡 키링 증정) [1인]', price: 8000 }
+  { number: 5, name: 'INFOISM SUPERPASS (인포이즘 우선 이용권) [1인]', price: 4000, includes: [1], golden: true },
+  { number: 6, name: 'INFOPASS (인포 모든 부스 이용권) + (1구 키캡 키링 증정) [1인]', price: 6000, includes: [1,2,3,4], golden: false },
+  { number: 7, name: 'SUPER INFOPASS (인포 모든 부스 우선 이용권) + (1구 키캡 키링 증정) [1인]', price: 8000, includes: [1,2,3,4], golden: true }
 ];
 
 // Optional API base: set window.API_BASE = 'https://api.midnightsky.kro.kr' in index.html to use a hosted API
 const API_BASE = (window.API_BASE || '').replace(/\/$/, '');
 
+async function loadBoothCatalog() {
+  try {
+    const res = await fetch(`${API_BASE || ''}/api/booths`);
+    const j = await res.json();
+    if (j.success && j.data.length > 0) {
+      booths = j.data.map(b => ({ number: b.number, name: b.name, price: b.price, includes: b.includes, golden: b.golden }));
+      if (currentStep === 3) createBoothCards();
+    }
+  } catch (err) { console.error('부스 목록을 불러오지 못해 기본 목록을 사용합니다:', err); }
+}
+
 // 숫자에 천단위 콤마 추가
 function formatPrice(price) {
   return price.toString().replace(/\B(?=(\d{3})+(?!\d))/g, ',');
@@ -86,68 +98,34 @@ function toggleBooth(booth, cardElement) {
 
   if (isAdding) {
     // 선택되지 않은 경우 - 추가 (원본 객체을 복사해서 사용)
-    formData.booths.push({ ...booth });
+    formData.booths.push({ number: booth.number, name: booth.name, price: booth.price });
     cardElement.classList.add('selected');
 
-    // 6번: INFOPASS → 1,2,3,4 포함 (non-golden)
-    if (booth.number === 6) {
-      [1,2,3,4].forEach(n => {
-        if (!formData.booths.some(b => b.number === n)) {
-          const base = booths.find(b => b.number === n);
-          if (base) formData.booths.push({ ...base, price: 0, derived: true, derivedFrom: 6 });
-        }
-      });
-    }
-
-    // 7번: SUPER INFOPASS → 1,2,3,4 포함 + 황금 표시
-    if (booth.number === 7) {
-      [1,2,3,4].forEach(n => {
-        const existing = formData.booths.find(b => b.number === n);
-        if (existing) {
-          existing.isGolden = true;
-          existing.goldenFrom = 7;
-        } else {
-          const base = booths.find(b => b.number === n);
-          if (base) formData.booths.push({ ...base, price: 0, derived: true, derivedFrom: 7, isGolden: true, goldenFrom: 7 });
-        }
-      });
-    }
-
-    // 5번: INFOISM SUPERPASS → 인포이즘(1번)을 황금으로 표시
-    if (booth.number === 5) {
-      const existing = formData.booths.find(b => b.number === 1);
+    // 패스(예: 5 SUPERPASS → 1번 황금, 6 INFOPASS → 1~4, 7 SUPER INFOPASS → 1~4 황금)
+    // 포함 부스가 이미 있으면 golden일 때 황금 표시만, 없으면 가격 0의 파생 항목으로 추가
+    (booth.includes || []).forEach(n => {
+      const existing = formData.booths.find(b => b.number === n);
       if (existing) {
-        existing.isGolden = true;
-        existing.goldenFrom = 5;
+        if (booth.golden) { existing.isGolden = true; existing.goldenFrom = booth.number; }
       } else {
-        const base = booths.find(b => b.number === 1);
-        if (base) formData.booths.push({ ...base, price: 0, derived: true, derivedFrom: 5, isGolden: true, goldenFrom: 5 });
+        const base = booths.find(b => b.number === n);
+        if (!base) return;
+        const derived = { number: base.number, name: base.name, price: 0, derived: true, derivedFrom: booth.number };
+        if (booth.golden) { derived.isGolden = true; derived.goldenFrom = booth.number; }
+        formData.booths.push(derived);
       }
-    }
+    });
 
   } else {
     // 이미 선택된 경우 - 제거
     formData.booths.splice(index, 1);
     cardElement.classList.remove('selected');
 
-    // 6번 제거: 파생 항목 제거
-    if (booth.number === 6) {
-      formData.booths = formData.booths.filter(b => b.derivedFrom !== 6);
-    }
-
-    // 7번 제거: 파생 제거 및 7로 표시한 황금 표식 제거
-    if (booth.number === 7) {
-      formData.booths = formData.booths.filter(b => b.derivedFrom !== 7);
+    // 패스 제거: 이 패스로 추가된 파생 항목과 황금 표식 제거
+    if ((booth.includes || []).length > 0) {
+      formData.booths = formData.booths.filter(b => b.derivedFrom !== booth.number);
       formData.booths.forEach(b => {
-        if (b.goldenFrom === 7) { delete b.isGolden; delete b.goldenFrom; }
-      });
-    }
-
-    // 5번 제거: 5로 인해 추가/표시된 항목 제거
-    if (booth.number === 5) {
-      formData.booths = formData.booths.filter(b => b.derivedFrom !== 5);
-      formData.booths.forEach(b => {
-        if (b.goldenFrom === 5) { delete b.isGolden; delete b.goldenFrom; }
+        if (b.goldenFrom === booth.number) { delete b.isGolden; delete b.goldenFrom; }
       });
     }
   }
@@ -258,13 +236,12 @@ async function submitForm() {
 
   // Python 서버로 데이터 전송
   try {
-    const response = await fetch(`${API_BASE || ''}/api/save-student`, {
-      method: 'POST',
-      headers: { 'Content-Type': 'application/json', },
-      body: JSON.stringify({ phone: formData.phone, name: formData.name, student_number: formData.student_number, booths: formData.booths, totalPrice: totalPrice })
-    });
+    const response = await postJsonWithRetry(`${API_BASE || ''}/api/save-student`,
+      { phone: formData.phone, name: formData.name, student_number: formData.student_number, booths: formData.booths, totalPrice: totalPrice });
     const result = await response.json();
     if (result.success) {
+      // 총액은 서버 카탈로그 기준으로 계산된 값 사용
+      if (result.total_price !== undefined) totalPrice = result.total_price;
       console.log('데이터 저장 성공:', result);
       // 티켓 정보 로컬에 저장하고 성공 화면으로 이동
       const ticket = {
@@ -304,4 +281,5 @@ function resetForm() {
 
 // 초기화
 createBoothCards();
+loadBoothCatalog();
 
@@ -0,0 +1,61 @@
+"""테스트용 설정: 임시 디렉터리의 SQLite DB로 app을 import하고 워커 시작 작업을 한 번 실행합니다."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix='booth_test_')
+
+# app은 import할 때 환경변수를 읽으므로 import 전에 설정 (저장소 디렉터리에 DB/키 파일을 만들지 않음)
+os.environ.update({
+    'SQLITE_PATH': os.path.join(TMP, 'student.db'),
+    'METRICS_DIR': os.path.join(TMP, 'metrics'),
+    'TICKET_CACHE_PATH': os.path.join(TMP, 'ticket_cache.db'),
+    'WRITE_BEHIND_PATH': os.path.join(TMP, 'write_behind.db'),
+    'BOOTH_CATALOG_PATH': os.path.join(ROOT, 'booths.json'),
+    'QR_TOKEN_SECRET': 'test-secret',
+    'ADMISSION_CONTROL': 'False',   # 스레드 테스트가 수락 제어/요청 한도에 걸리지 않도록
+    'RATE_LIMIT': 'False',
+    'WRITE_BEHIND': 'False',
+})
+os.environ.pop('ADMIN_PASSWORD', None)
+os.environ.pop('DATABASE_URL', None)
+os.environ.pop('DATABASE_READ_URL', None)
+sys.path.insert(0, ROOT)
+
+import app as booth  # noqa: E402
+
+booth.start_worker()
+
+
+@pytest.fixture
+def client():
+    return booth.app.test_client()
+
+
+_next_number = [20000]
+
+
+@pytest.fixture
+def student(client):
+    """부스 1(1회), 2(2회)를 산 새 학생. 반환: save-student 응답 + student_number"""
+    _next_number[0] += 1
+    student_number = str(_next_number[0])
+    resp = client.post('/api/save-student', json={
+        'student_number': student_number, 'name': '테스트', 'phone': '01012345678',
+        'booths': [{'number': 1}, {'number': 2}], 'totalPrice': 3000,
+    })
+    assert resp.status_code == 200, resp.get_json()
+    return dict(resp.get_json(), student_number=student_number)
+
+
+def lookup(client, student_number):
+    resp = client.get(f'/api/students?student_number={student_number}')
+    assert resp.status_code == 200
+    return resp.get_json()['data'][0]
+
+
+def remaining(client, student_number, booth_number):
+    return next(b['remaining'] for b in lookup(client, student_number)['booths'] if b['number'] == booth_number)
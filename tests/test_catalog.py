@@ -0,0 +1,60 @@
+"""booths.json 카탈로그 기준 주문 계산 (패스/골든 부스 펼치기)."""
+import os
+
+import pytest
+
+from booth_catalog import BoothCatalog, OrderError, expand_catalog_order
+from conftest import ROOT
+
+
+@pytest.fixture(scope='module')
+def catalog():
+    catalog = BoothCatalog(os.path.join(ROOT, 'booths.json'))
+    catalog.load()
+    return catalog.get()
+
+
+def summary(result):
+    return [(b['number'], b['price'], b['remaining'], b.get('derivedFrom'), b.get('goldenFrom')) for b in result]
+
+
+def test_single_booths(catalog):
+    result, total = expand_catalog_order(catalog, [{'number': 1}, {'number': 3}, {'number': 3}])
+    assert total == 6000
+    assert summary(result) == [(1, 2000, 1, None, None), (3, 2000, 6, None, None)]
+
+
+def test_pass_adds_included_booths(catalog):
+    result, total = expand_catalog_order(catalog, [{'number': 6}])
+    assert total == 6000
+    assert summary(result) == [
+        (6, 6000, 1, None, None),
+        (1, 0, 1, 6, None), (2, 0, 2, 6, None), (3, 0, 3, 6, None), (4, 0, 1, 6, None),
+    ]
+    assert all(b['derived'] and not b.get('isGolden') for b in result[1:])
+
+
+def test_golden_pass_marks_included_booths(catalog):
+    result, total = expand_catalog_order(catalog, [{'number': 7}])
+    assert total == 8000
+    assert [b['number'] for b in result if b.get('isGolden')] == [1, 2, 3, 4]
+    assert {b['goldenFrom'] for b in result if b.get('isGolden')} == {7}
+
+
+def test_golden_pass_marks_booth_bought_separately(catalog):
+    result, total = expand_catalog_order(catalog, [{'number': 1}, {'number': 5}])
+    assert total == 6000
+    assert summary(result) == [(1, 2000, 1, None, 5), (5, 4000, 1, None, None)]
+    assert result[0]['isGolden'] and not result[0].get('derived')
+
+
+def test_client_derived_items_are_recomputed(catalog):
+    client_booths = [{'number': 6}, {'number': 2, 'price': 0, 'remaining': 99, 'derived': True}]
+    assert expand_catalog_order(catalog, client_booths) == expand_catalog_order(catalog, [{'number': 6}])
+
+
+def test_invalid_orders(catalog):
+    with pytest.raises(OrderError):
+        expand_catalog_order(catalog, [{'number': 42}])
+    with pytest.raises(OrderError):
+        expand_catalog_order(catalog, [{'number': 2, 'derived': True}])
@@ -0,0 +1,69 @@
+"""스키마 마이그레이션과 원장 재생."""
+import json
+import os
+import sqlite3
+
+import booth_db
+from conftest import TMP, booth
+
+
+def test_migrate_from_baseline_schema_is_idempotent(monkeypatch):
+    path = os.path.join(TMP, 'baseline.db')
+    conn = sqlite3.connect(path)
+    # 첫 배포의 스키마: 부스는 students.booths JSON에 저장
+    conn.execute('''
+        CREATE TABLE students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_number TEXT,
+            phone TEXT NOT NULL,
+            name TEXT NOT NULL,
+            booths TEXT NOT NULL,
+            total_price INTEGER NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    booths = [{'number': 1, 'name': '인포이즘 (INFOISM) [1인]', 'price': 2000, 'remaining': 1},
+              {'number': 3, 'name': '미니 게임 테라피 (MINI GAME THERAPY) [3회]', 'price': 2000, 'remaining': 2}]
+    conn.execute('INSERT INTO students (student_number, phone, name, booths, total_price) VALUES (?, ?, ?, ?, ?)',
+                 ('10101', '01012345678', '홍길동', json.dumps(booths, ensure_ascii=False), 4000))
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(booth_db, 'DB_PATH', path)
+    monkeypatch.setattr(booth, 'DB_PATH', path)
+    assert booth.migrate() == booth.SCHEMA_VERSION
+    assert booth.migrate() == 0
+
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()[0] == booth.SCHEMA_VERSION
+        assert conn.execute('SELECT booths, version FROM students').fetchone() == ('[]', 1)
+        rows = conn.execute('SELECT booth_number, remaining FROM student_booths ORDER BY booth_number').fetchall()
+        assert rows == [(1, 1), (3, 2)]
+    finally:
+        conn.close()
+
+
+def replay(apply):
+    conn, engine = booth.get_conn(track_request=False)
+    try:
+        return booth.replay_ledger(conn, booth.dict_cursor(conn, engine), engine, apply=apply)
+    finally:
+        conn.close()
+
+
+def test_replay_ledger_matches_student_booths(client, student):
+    assert client.post(f'/api/students/{student["id"]}/adjust', json={'booth_number': 2, 'delta': -1}).status_code == 200
+    assert client.post(f'/api/students/{student["id"]}/add-payment', json={'amount': 500}).status_code == 200
+    assert replay(apply=False) == []
+
+    # 스냅샷이 원장과 어긋나면 차이를 보고하고, apply면 원장 기준으로 고침
+    conn, engine = booth.get_conn(track_request=False)
+    cursor = conn.cursor()
+    cursor.execute('UPDATE student_booths SET remaining = 7 WHERE student_id = ? AND booth_number = 2', (student['id'],))
+    conn.commit()
+    conn.close()
+    diffs = replay(apply=True)
+    assert [(d['student_id'], d['booth_number'], d['snapshot']['remaining'], d['ledger']['remaining']) for d in diffs] == \
+        [(student['id'], 2, 7, 1)]
+    assert replay(apply=False) == []
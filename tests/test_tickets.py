@@ -0,0 +1,78 @@
+"""티켓 쓰기 API: 조건부 차감, Idempotency-Key 재사용, 조회 캐시 무효화, QR 버전 검사."""
+import threading
+
+from conftest import booth, lookup, remaining
+
+
+def adjust(client, student_id, booth_number, delta, **kwargs):
+    return client.post(f'/api/students/{student_id}/adjust', json={'booth_number': booth_number, 'delta': delta}, **kwargs)
+
+
+def test_adjust_rejects_negative_remaining(client, student):
+    resp = adjust(client, student['id'], 2, -3)
+    assert resp.status_code == 409
+    assert resp.get_json()['remaining'] == 2
+    assert remaining(client, student['student_number'], 2) == 2
+
+
+def test_adjust_unknown_booth_or_student(client, student):
+    assert adjust(client, student['id'], 99, -1).status_code == 404
+    assert adjust(client, 999999, 1, -1).status_code == 404
+
+
+def test_concurrent_adjust_has_no_lost_updates(client, student):
+    assert adjust(client, student['id'], 2, 8).status_code == 200   # 남은 횟수 10
+    statuses = []
+    lock = threading.Lock()
+
+    def worker():
+        status = adjust(booth.app.test_client(), student['id'], 2, -1).status_code
+        with lock:
+            statuses.append(status)
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sorted(statuses) == [200] * 10 + [409] * 6
+    assert remaining(client, student['student_number'], 2) == 0
+
+
+def test_idempotent_replay_returns_first_response(client, student):
+    headers = {'Idempotency-Key': f'adjust-{student["id"]}'}
+    first = adjust(client, student['id'], 2, -1, headers=headers)
+    second = adjust(client, student['id'], 2, -1, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert second.headers.get('Idempotent-Replayed') == 'true'
+    assert second.get_json() == first.get_json()
+    assert remaining(client, student['student_number'], 2) == 1   # 한 번만 차감
+
+
+def test_ticket_cache_invalidated_after_write(client, student):
+    student_number = student['student_number']
+    lookup(client, student_number)
+    hits = booth.ticket_cache.snapshot()['hits']
+    assert remaining(client, student_number, 2) == 2
+    assert booth.ticket_cache.snapshot()['hits'] == hits + 1   # 두 번째 조회는 캐시에서
+    assert adjust(client, student['id'], 2, -1).status_code == 200
+    assert remaining(client, student_number, 2) == 1
+
+
+def test_redeem_rejects_stale_token(client, student):
+    token = lookup(client, student['student_number'])['qr_token']
+    resp = client.post('/api/redeem', json={'token': token, 'booth_number': 2})
+    assert resp.status_code == 200
+    assert resp.get_json()['data']['remaining'] == 1
+    # 같은 QR을 다시 쓰면 버전이 달라 거절
+    resp = client.post('/api/redeem', json={'token': token, 'booth_number': 2})
+    assert resp.status_code == 409
+    assert remaining(client, student['student_number'], 2) == 1
+
+
+def test_redeem_rejects_token_after_other_write(client, student):
+    token = lookup(client, student['student_number'])['qr_token']
+    assert adjust(client, student['id'], 1, 1).status_code == 200
+    resp = client.post('/api/redeem', json={'token': token, 'booth_number': 2})
+    assert resp.status_code == 409
+    assert remaining(client, student['student_number'], 2) == 2